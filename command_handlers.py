@@ -1,20 +1,23 @@
 import configparser
 import logging
-import random
-import time
 
 from meshtastic import BROADCAST_NUM
 
 from db_operations import (
     add_bulletin, add_mail, delete_mail,
     get_bulletin_content, get_bulletins,
-    get_mail, get_mail_content,
-    add_channel, get_channels, get_sender_id_by_mail_id
+    get_mail, get_mail_content, count_mail,
+    add_channel, get_channels, get_channel, remove_channel,
+    get_sender_id_by_mail_id
 )
+from fortunes import FortuneLibrary
+from node_directory import get_node_directory
+from node_stats import get_node_stats
+from telemetry_store import get_telemetry_history
 from utils import (
     get_node_id_from_num, get_node_info,
     get_node_short_name, send_message,
-    update_user_state
+    update_user_state, ReplyBuilder
 )
 
 # Read the configuration for menu options
@@ -25,6 +28,8 @@ main_menu_items = config['menu']['main_menu_items'].split(',')
 bbs_menu_items = config['menu']['bbs_menu_items'].split(',')
 utilities_menu_items = config['menu']['utilities_menu_items'].split(',')
 
+fortunes = FortuneLibrary.from_config(config)
+
 
 def build_menu(items, menu_name):
     menu_str = f"{menu_name}\n"
@@ -52,6 +57,26 @@ def build_menu(items, menu_name):
     return menu_str
 
 
+def page_navigation(page):
+    options = []
+    if page.has_prev:
+        options.append("[P]rev")
+    if page.has_next:
+        options.append("[N]ext")
+    return "  ".join(options)
+
+
+def page_state(page):
+    return {'first_id': page.rows[0][0], 'last_id': page.rows[-1][0]}
+
+
+def page_cursor(state, choice):
+    """Keyset arguments for the page after ('n') or before ('p') the one in `state`."""
+    if choice == 'n':
+        return {'after_id': state['last_id']}
+    return {'before_id': state['first_id']}
+
+
 def handle_help_command(sender_id, interface, menu_name=None):
     if menu_name:
         update_user_state(sender_id, {'command': 'MENU', 'menu': menu_name, 'step': 1})
@@ -66,7 +91,7 @@ def handle_help_command(sender_id, interface, menu_name=None):
 
 
 def get_node_name(node_id, interface):
-    node_info = interface.nodes.get(node_id)
+    node_info = get_node_directory(interface).get(node_id)
     if node_info:
         return node_info['user']['longName']
     return f"Node {node_id}"
@@ -98,12 +123,10 @@ def handle_stats_command(sender_id, interface):
 
 def handle_fortune_command(sender_id, interface):
     try:
-        with open('fortunes.txt', 'r') as file:
-            fortunes = file.readlines()
-        if not fortunes:
+        fortune = fortunes.choice()
+        if not fortune:
             send_message("No fortunes available.", sender_id, interface)
             return
-        fortune = random.choice(fortunes).strip()
         decorated_fortune = f"🔮 {fortune} 🔮"
         send_message(decorated_fortune, sender_id, interface)
     except Exception as e:
@@ -121,41 +144,22 @@ def handle_stats_steps(sender_id, message, step, interface):
             handle_help_command(sender_id, interface)
             return
         elif choice == 'n':
-            current_time = int(time.time())
-            timeframes = {
-                "All time": None,
-                "Last 24 hours": 86400,
-                "Last 8 hours": 28800,
-                "Last hour": 3600
-            }
-            total_nodes_summary = []
-
-            for period, seconds in timeframes.items():
-                if seconds is None:
-                    total_nodes = len(interface.nodes)
-                else:
-                    time_limit = current_time - seconds
-                    total_nodes = sum(1 for node in interface.nodes.values() if node.get('lastHeard', 0) >= time_limit)
-                total_nodes_summary.append(f"- {period}: {total_nodes}")
-
-            response = "Total nodes seen:\n" + "\n".join(total_nodes_summary)
-            send_message(response, sender_id, interface)
+            reply = ReplyBuilder(sender_id, interface)
+            reply.add("Total nodes seen:")
+            reply.extend([f"- {period}: {total_nodes}" for period, total_nodes in get_node_stats(interface).heard_counts()])
+            reply.flush()
             handle_stats_command(sender_id, interface)
         elif choice == 'h':
-            hw_models = {}
-            for node in interface.nodes.values():
-                hw_model = node['user'].get('hwModel', 'Unknown')
-                hw_models[hw_model] = hw_models.get(hw_model, 0) + 1
-            response = "Hardware Models:\n" + "\n".join([f"{model}: {count}" for model, count in hw_models.items()])
-            send_message(response, sender_id, interface)
+            reply = ReplyBuilder(sender_id, interface)
+            reply.add("Hardware Models:")
+            reply.extend([f"{model}: {count}" for model, count in get_node_stats(interface).hardware_models()])
+            reply.flush()
             handle_stats_command(sender_id, interface)
         elif choice == 'r':
-            roles = {}
-            for node in interface.nodes.values():
-                role = node['user'].get('role', 'Unknown')
-                roles[role] = roles.get(role, 0) + 1
-            response = "Roles:\n" + "\n".join([f"{role}: {count}" for role, count in roles.items()])
-            send_message(response, sender_id, interface)
+            reply = ReplyBuilder(sender_id, interface)
+            reply.add("Roles:")
+            reply.extend([f"{role}: {count}" for role, count in get_node_stats(interface).role_counts()])
+            reply.flush()
             handle_stats_command(sender_id, interface)
 
 
@@ -173,13 +177,7 @@ def handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes):
     elif step == 2:
         board_name = state['board']
         if message.lower() == 'r':
-            bulletins = get_bulletins(board_name)
-            if bulletins:
-                send_message(f"Select a bulletin number to view from {board_name}:", sender_id, interface)
-                for bulletin in bulletins:
-                    send_message(f"[{bulletin[0]}] {bulletin[1]}", sender_id, interface)
-                update_user_state(sender_id, {'command': 'BULLETIN_READ', 'step': 3, 'board': board_name})
-            else:
+            if not list_board_bulletins(sender_id, interface, board_name):
                 send_message(f"No bulletins in {board_name}.", sender_id, interface)
                 handle_bb_steps(sender_id, 'e', 1, state, interface, bbs_nodes)
         elif message.lower() == 'p':
@@ -195,6 +193,11 @@ def handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes):
             update_user_state(sender_id, {'command': 'BULLETIN_POST', 'step': 4, 'board': board_name})
 
     elif step == 3:
+        choice = message.lower().strip()
+        if choice in ('n', 'p'):
+            if not list_board_bulletins(sender_id, interface, state['board'], **page_cursor(state, choice)):
+                send_message("No more bulletins.", sender_id, interface)
+            return
         bulletin_id = int(message)
         sender_short_name, date, subject, content, unique_id = get_bulletin_content(bulletin_id)
         send_message(f"From: {sender_short_name}\nDate: {date}\nSubject: {subject}\n- - - - - - -\n{content}", sender_id, interface)
@@ -212,7 +215,7 @@ def handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes):
             subject = state['subject']
             content = state['content']
             node_id = get_node_id_from_num(sender_id, interface)
-            node_info = interface.nodes.get(node_id)
+            node_info = get_node_directory(interface).get(node_id)
             if node_info is None:
                 send_message("Error: Unable to retrieve your node information.", sender_id, interface)
                 update_user_state(sender_id, None)
@@ -227,6 +230,45 @@ def handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes):
 
 
 
+def list_board_bulletins(sender_id, interface, board_name, after_id=None, before_id=None):
+    page = get_bulletins(board_name, after_id=after_id, before_id=before_id)
+    if not page.rows:
+        return False
+    reply = ReplyBuilder(sender_id, interface)
+    reply.add(f"Select a bulletin number to view from {board_name}:")
+    for bulletin in page.rows:
+        reply.add(f"[{bulletin[0]}] {bulletin[1]}")
+    navigation = page_navigation(page)
+    if navigation:
+        reply.add(navigation)
+    reply.flush()
+    update_user_state(sender_id, {'command': 'BULLETIN_READ', 'step': 3, 'board': board_name, **page_state(page)})
+    return True
+
+
+def list_mailbox(sender_id, interface, recipient_id, after_id=None, before_id=None):
+    page = get_mail(recipient_id, after_id=after_id, before_id=before_id)
+    if not page.rows:
+        return False
+    reply = ReplyBuilder(sender_id, interface)
+    reply.add(f"You have {count_mail(recipient_id)} mail messages. Select a message number to read:")
+    for msg in page.rows:
+        reply.add(f"-{msg[0]}-\nDate: {msg[3]}\nFrom: {msg[1]}\nSubject: {msg[2]}")
+    navigation = page_navigation(page)
+    if navigation:
+        reply.add(navigation)
+    reply.flush()
+    update_user_state(sender_id, {'command': 'MAIL', 'step': 2, **page_state(page)})
+    return True
+
+
+def start_mail_reply(sender_id, state, interface):
+    sender_node_id = get_node_id_from_num(sender_id, interface)
+    sender, date, subject, content, unique_id = get_mail_content(state['mail_id'], sender_node_id)
+    send_message(f"Send your reply to {sender} now, followed by a message with END", sender_id, interface)
+    update_user_state(sender_id, {'command': 'MAIL', 'step': 7, 'reply_to_mail_id': state['mail_id'], 'subject': f"Re: {subject}", 'content': ''})
+
+
 def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
     message = message.lower().strip()
     
@@ -234,13 +276,7 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
         choice = message
         if choice == 'r':
             sender_node_id = get_node_id_from_num(sender_id, interface)
-            mail = get_mail(sender_node_id)
-            if mail:
-                send_message(f"You have {len(mail)} mail messages. Select a message number to read:", sender_id, interface)
-                for msg in mail:
-                    send_message(f"-{msg[0]}-\nDate: {msg[3]}\nFrom: {msg[1]}\nSubject: {msg[2]}", sender_id, interface)
-                update_user_state(sender_id, {'command': 'MAIL', 'step': 2})
-            else:
+            if not list_mailbox(sender_id, interface, sender_node_id):
                 send_message("There are no messages in your mailbox.📭", sender_id, interface)
                 update_user_state(sender_id, None)
         elif choice == 's':
@@ -250,17 +286,22 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
             handle_help_command(sender_id, interface)
 
     elif step == 2:
+        if message in ('n', 'p'):
+            sender_node_id = get_node_id_from_num(sender_id, interface)
+            if not list_mailbox(sender_id, interface, sender_node_id, **page_cursor(state, message)):
+                send_message("No more messages.", sender_id, interface)
+            return
         try:
             mail_id = int(message)
             sender_node_id = get_node_id_from_num(sender_id, interface)
             sender, date, subject, content, unique_id = get_mail_content(mail_id, sender_node_id)
             send_message(f"Date: {date}\nFrom: {sender}\nSubject: {subject}\n{content}", sender_id, interface)
             send_message("What would you like to do with this message?\n[K]eep  [D]elete  [R]eply", sender_id, interface)
-            update_user_state(sender_id, {'command': 'MAIL', 'step': 4, 'mail_id': mail_id, 'unique_id': unique_id, 'sender': sender, 'subject': subject, 'content': content})
+            update_user_state(sender_id, {'command': 'MAIL', 'step': 4, 'mail_id': mail_id, 'unique_id': unique_id})
         except ValueError:
             send_message("Invalid input. Please enter a valid message number.", sender_id, interface)
-            # Optionally keep the user in the same state to try again
-            update_user_state(sender_id, {'command': 'MAIL', 'step': 2})
+            # Keep the user on the same page to try again
+            update_user_state(sender_id, state)
 
     elif step == 3:
         short_name = message.lower()
@@ -274,10 +315,12 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
             send_message(f"What is the subject of your message to {recipient_name}?\nKeep it short.", sender_id, interface)
             update_user_state(sender_id, {'command': 'MAIL', 'step': 5, 'recipient_id': recipient_id})
         else:
-            send_message("There are multiple nodes with that short name. Which one would you like to leave a message for?", sender_id, interface)
+            reply = ReplyBuilder(sender_id, interface)
+            reply.add("There are multiple nodes with that short name. Which one would you like to leave a message for?")
             for i, node in enumerate(nodes):
-                send_message(f"[{i}] {node['longName']}", sender_id, interface)
-            update_user_state(sender_id, {'command': 'MAIL', 'step': 6, 'nodes': nodes})
+                reply.add(f"[{i}] {node['longName']}")
+            reply.flush()
+            update_user_state(sender_id, {'command': 'MAIL', 'step': 6, 'node_nums': [node['num'] for node in nodes]})
 
     elif step == 4:
         if message.lower() == "d":
@@ -287,9 +330,7 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
             send_message("The message has been deleted 🗑️", sender_id, interface)
             update_user_state(sender_id, None)
         elif message.lower() == "r":
-            sender = state['sender']
-            send_message(f"Send your reply to {sender} now, followed by a message with END", sender_id, interface)
-            update_user_state(sender_id, {'command': 'MAIL', 'step': 7, 'reply_to_mail_id': state['mail_id'], 'subject': f"Re: {state['subject']}", 'content': ''})
+            start_mail_reply(sender_id, state, interface)
         else:
             send_message("The message has been kept in your inbox.✉️", sender_id, interface)
             update_user_state(sender_id, None)
@@ -301,8 +342,7 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
 
     elif step == 6:
         selected_node_index = int(message)
-        selected_node = state['nodes'][selected_node_index]
-        recipient_id = selected_node['num']
+        recipient_id = state['node_nums'][selected_node_index]
         recipient_name = get_node_name(recipient_id, interface)
         send_message(f"What is the subject of your message to {recipient_name}?\nKeep it short.", sender_id, interface)
         update_user_state(sender_id, {'command': 'MAIL', 'step': 5, 'recipient_id': recipient_id})
@@ -339,16 +379,19 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
 
 
 def handle_wall_of_shame_command(sender_id, interface):
-    response = "Devices with battery levels below 20%:\n"
-    for node_id, node in interface.nodes.items():
-        metrics = node.get('deviceMetrics', {})
-        battery_level = metrics.get('batteryLevel', 101)
-        if battery_level < 20:
-            long_name = node['user']['longName']
-            response += f"{long_name} - Battery {battery_level}%\n"
-    if response == "Devices with battery levels below 20%:\n":
-        response = "No devices with battery levels below 20% found."
-    send_message(response, sender_id, interface)
+    directory = get_node_directory(interface)
+    low_battery = []
+    for battery_level, node_id in get_telemetry_history(interface).low_battery(20):
+        node = directory.get(node_id)
+        long_name = node['user']['longName'] if node and 'user' in node else node_id
+        low_battery.append(f"{long_name} - Battery {battery_level}%")
+    if not low_battery:
+        send_message("No devices with battery levels below 20% found.", sender_id, interface)
+        return
+    reply = ReplyBuilder(sender_id, interface)
+    reply.add("Devices with battery levels below 20%:")
+    reply.extend(low_battery)
+    reply.flush()
 
 
 def handle_channel_directory_command(sender_id, interface):
@@ -357,6 +400,22 @@ def handle_channel_directory_command(sender_id, interface):
     update_user_state(sender_id, {'command': 'CHANNEL_DIRECTORY', 'step': 1})
 
 
+def list_channel_directory(sender_id, interface, action, step, after_id=None, before_id=None):
+    page = get_channels(after_id=after_id, before_id=before_id)
+    if not page.rows:
+        return False
+    reply = ReplyBuilder(sender_id, interface)
+    reply.add(f"Select a channel number to {action}:")
+    reply.extend([f"[{i}] {channel[1]}" for i, channel in enumerate(page.rows)])
+    navigation = page_navigation(page)
+    if navigation:
+        reply.add(navigation)
+    reply.flush()
+    update_user_state(sender_id, {'command': 'CHANNEL_DIRECTORY', 'step': step,
+                                  'channel_ids': [channel[0] for channel in page.rows], **page_state(page)})
+    return True
+
+
 def handle_channel_directory_steps(sender_id, message, step, state, interface):
     message = message.lower().strip()
     if len(message) == 2 and message[1] == 'x':
@@ -368,35 +427,29 @@ def handle_channel_directory_steps(sender_id, message, step, state, interface):
             handle_help_command(sender_id, interface)
             return
         elif choice == 'v':
-            channels = get_channels()
-            if channels:
-                response = "Select a channel number to view:\n" + "\n".join(
-                    [f"[{i}] {channel[0]}" for i, channel in enumerate(channels)])
-                send_message(response, sender_id, interface)
-                update_user_state(sender_id, {'command': 'CHANNEL_DIRECTORY', 'step': 2})
-            else:
+            if not list_channel_directory(sender_id, interface, 'view', 2):
                 send_message("No channels available in the directory.", sender_id, interface)
                 handle_channel_directory_command(sender_id, interface)
         elif choice == 'p':
             send_message("Name your channel for the directory:", sender_id, interface)
             update_user_state(sender_id, {'command': 'CHANNEL_DIRECTORY', 'step': 3})
         elif choice == 'r':
-            channels = get_channels()
-            if channels:
-                response = "Select a channel number to remove:\n" + "\n".join(
-                    [f"[{i}] {channel[0]}" for i, channel in enumerate(channels)])
-                send_message(response, sender_id, interface)
-                update_user_state(sender_id, {'command': 'CHANNEL_DIRECTORY', 'step': 5})
-            else:
+            if not list_channel_directory(sender_id, interface, 'remove', 5):
                 send_message("No channels available in the directory.", sender_id, interface)
                 handle_channel_directory_command(sender_id, interface)
 
     elif step == 2:
+        if message in ('n', 'p'):
+            if not list_channel_directory(sender_id, interface, 'view', 2, **page_cursor(state, message)):
+                send_message("No more channels.", sender_id, interface)
+            return
         channel_index = int(message)
-        channels = get_channels()
-        if 0 <= channel_index < len(channels):
-            channel_name, channel_url = channels[channel_index]
-            send_message(f"Channel Name: {channel_name}\nChannel URL:\n{channel_url}", sender_id, interface)
+        channel_ids = state['channel_ids']
+        if 0 <= channel_index < len(channel_ids):
+            channel = get_channel(channel_ids[channel_index])
+            if channel:
+                channel_name, channel_url = channel
+                send_message(f"Channel Name: {channel_name}\nChannel URL:\n{channel_url}", sender_id, interface)
         handle_channel_directory_command(sender_id, interface)
 
     elif step == 3:
@@ -412,12 +465,18 @@ def handle_channel_directory_steps(sender_id, message, step, state, interface):
         handle_channel_directory_command(sender_id, interface)
 
     elif step == 5:
+        if message in ('n', 'p'):
+            if not list_channel_directory(sender_id, interface, 'remove', 5, **page_cursor(state, message)):
+                send_message("No more channels.", sender_id, interface)
+            return
         channel_index = int(message)
-        channels = get_channels()
-        if 0 <= channel_index < len(channels):
-            channel_name, _ = channels[channel_index]
-            remove_channel(channel_index)
-            send_message(f"Channel '{channel_name}' has been removed from the directory.", sender_id, interface)
+        channel_ids = state['channel_ids']
+        if 0 <= channel_index < len(channel_ids):
+            channel = get_channel(channel_ids[channel_index])
+            if channel:
+                channel_name, _ = channel
+                remove_channel(channel_ids[channel_index])
+                send_message(f"Channel '{channel_name}' has been removed from the directory.", sender_id, interface)
         handle_channel_directory_command(sender_id, interface)
 
 
@@ -454,21 +513,29 @@ def handle_send_mail_command(sender_id, message, interface, bbs_nodes):
         send_message("Error processing send mail command.", sender_id, interface)
 
 
-def handle_check_mail_command(sender_id, interface):
+def handle_check_mail_command(sender_id, interface, after_id=None, before_id=None):
     try:
         sender_node_id = get_node_id_from_num(sender_id, interface)
-        mail = get_mail(sender_node_id)
-        if not mail:
-            send_message("You have no new messages.", sender_id, interface)
+        page = get_mail(sender_node_id, after_id=after_id, before_id=before_id)
+        if not page.rows:
+            if after_id is None and before_id is None:
+                send_message("You have no new messages.", sender_id, interface)
+            else:
+                send_message("No more messages.", sender_id, interface)
             return
 
-        response = "📬 You have the following messages:\n"
-        for i, msg in enumerate(mail):
-            response += f"{i + 1:02d}. From: {msg[1]}, Subject: {msg[2]}\n"
-        response += "\nPlease reply with the number of the message you want to read."
-        send_message(response, sender_id, interface)
+        reply = ReplyBuilder(sender_id, interface)
+        reply.add("📬 You have the following messages:")
+        for i, msg in enumerate(page.rows):
+            reply.add(f"{i + 1:02d}. From: {msg[1]}, Subject: {msg[2]}")
+        navigation = page_navigation(page)
+        if navigation:
+            reply.add(navigation)
+        reply.add("\nPlease reply with the number of the message you want to read.")
+        reply.flush()
 
-        update_user_state(sender_id, {'command': 'CHECK_MAIL', 'step': 1, 'mail': mail})
+        update_user_state(sender_id, {'command': 'CHECK_MAIL', 'step': 1,
+                                      'mail_ids': [msg[0] for msg in page.rows], **page_state(page)})
 
     except Exception as e:
         logging.error(f"Error processing check mail command: {e}")
@@ -477,20 +544,25 @@ def handle_check_mail_command(sender_id, interface):
 
 def handle_read_mail_command(sender_id, message, state, interface):
     try:
-        mail = state.get('mail', [])
+        choice = message.lower().strip()
+        if choice in ('n', 'p'):
+            handle_check_mail_command(sender_id, interface, **page_cursor(state, choice))
+            return
+
+        mail_ids = state.get('mail_ids', [])
         message_number = int(message) - 1
 
-        if message_number < 0 or message_number >= len(mail):
+        if message_number < 0 or message_number >= len(mail_ids):
             send_message("Invalid message number. Please try again.", sender_id, interface)
             return
 
-        mail_id = mail[message_number][0]
+        mail_id = mail_ids[message_number]
         sender_node_id = get_node_id_from_num(sender_id, interface)
         sender, date, subject, content, unique_id = get_mail_content(mail_id, sender_node_id)
         response = f"Date: {date}\nFrom: {sender}\nSubject: {subject}\n\n{content}"
         send_message(response, sender_id, interface)
         send_message("What would you like to do with this message?\n[K]eep  [D]elete  [R]eply", sender_id, interface)
-        update_user_state(sender_id, {'command': 'CHECK_MAIL', 'step': 2, 'mail_id': mail_id, 'unique_id': unique_id, 'sender': sender, 'subject': subject, 'content': content})
+        update_user_state(sender_id, {'command': 'CHECK_MAIL', 'step': 2, 'mail_id': mail_id, 'unique_id': unique_id})
 
     except ValueError:
         send_message("Invalid input. Please enter a valid message number.", sender_id, interface)
@@ -512,9 +584,7 @@ def handle_delete_mail_confirmation(sender_id, message, state, interface, bbs_no
             send_message("The message has been deleted 🗑️", sender_id, interface)
             update_user_state(sender_id, None)
         elif choice == 'r':
-            sender = state['sender']
-            send_message(f"Send your reply to {sender} now, followed by a message with END", sender_id, interface)
-            update_user_state(sender_id, {'command': 'MAIL', 'step': 7, 'reply_to_mail_id': state['mail_id'], 'subject': f"Re: {state['subject']}", 'content': ''})
+            start_mail_reply(sender_id, state, interface)
         else:
             send_message("The message has been kept in your inbox.✉️", sender_id, interface)
             update_user_state(sender_id, None)
@@ -556,33 +626,49 @@ def handle_check_bulletin_command(sender_id, message, interface):
             return
 
         board_name = parts[1].strip()
-        bulletins = get_bulletins(board_name)
-        if not bulletins:
+        if not list_check_bulletins(sender_id, interface, board_name):
             send_message(f"No bulletins available on {board_name} board.", sender_id, interface)
-            return
-
-        response = f"📰 Bulletins on {board_name} board:\n"
-        for i, bulletin in enumerate(bulletins):
-            response += f"[{i+1:02d}] Subject: {bulletin[1]}, From: {bulletin[2]}, Date: {bulletin[3]}\n"
-        response += "\nPlease reply with the number of the bulletin you want to read."
-        send_message(response, sender_id, interface)
-
-        update_user_state(sender_id, {'command': 'CHECK_BULLETIN', 'step': 1, 'board_name': board_name, 'bulletins': bulletins})
 
     except Exception as e:
         logging.error(f"Error processing check bulletin command: {e}")
         send_message("Error processing check bulletin command.", sender_id, interface)
 
+def list_check_bulletins(sender_id, interface, board_name, after_id=None, before_id=None):
+    page = get_bulletins(board_name, after_id=after_id, before_id=before_id)
+    if not page.rows:
+        return False
+
+    reply = ReplyBuilder(sender_id, interface)
+    reply.add(f"📰 Bulletins on {board_name} board:")
+    for i, bulletin in enumerate(page.rows):
+        reply.add(f"[{i+1:02d}] Subject: {bulletin[1]}, From: {bulletin[2]}, Date: {bulletin[3]}")
+    navigation = page_navigation(page)
+    if navigation:
+        reply.add(navigation)
+    reply.add("\nPlease reply with the number of the bulletin you want to read.")
+    reply.flush()
+
+    update_user_state(sender_id, {'command': 'CHECK_BULLETIN', 'step': 1, 'board_name': board_name,
+                                  'bulletin_ids': [bulletin[0] for bulletin in page.rows], **page_state(page)})
+    return True
+
+
 def handle_read_bulletin_command(sender_id, message, state, interface):
     try:
-        bulletins = state.get('bulletins', [])
+        choice = message.lower().strip()
+        if choice in ('n', 'p'):
+            if not list_check_bulletins(sender_id, interface, state['board_name'], **page_cursor(state, choice)):
+                send_message("No more bulletins.", sender_id, interface)
+            return
+
+        bulletin_ids = state.get('bulletin_ids', [])
         message_number = int(message) - 1
 
-        if message_number < 0 or message_number >= len(bulletins):
+        if message_number < 0 or message_number >= len(bulletin_ids):
             send_message("Invalid bulletin number. Please try again.", sender_id, interface)
             return
 
-        bulletin_id = bulletins[message_number][0]
+        bulletin_id = bulletin_ids[message_number]
         sender, date, subject, content, unique_id = get_bulletin_content(bulletin_id)
         response = f"Date: {date}\nFrom: {sender}\nSubject: {subject}\n\n{content}"
         send_message(response, sender_id, interface)
@@ -613,20 +699,30 @@ def handle_post_channel_command(sender_id, message, interface):
         send_message("Error processing post channel command.", sender_id, interface)
 
 
+def list_channels_page(sender_id, interface, command, after_id=None, before_id=None):
+    page = get_channels(after_id=after_id, before_id=before_id)
+    if not page.rows:
+        return False
+
+    reply = ReplyBuilder(sender_id, interface)
+    reply.add("Available Channels:")
+    for i, channel in enumerate(page.rows):
+        reply.add(f"{i + 1:02d}. Name: {channel[1]}")
+    navigation = page_navigation(page)
+    if navigation:
+        reply.add(navigation)
+    reply.add("\nPlease reply with the number of the channel you want to view.")
+    reply.flush()
+
+    update_user_state(sender_id, {'command': command, 'step': 1,
+                                  'channel_ids': [channel[0] for channel in page.rows], **page_state(page)})
+    return True
+
+
 def handle_check_channel_command(sender_id, interface):
     try:
-        channels = get_channels()
-        if not channels:
+        if not list_channels_page(sender_id, interface, 'CHECK_CHANNEL'):
             send_message("No channels available in the directory.", sender_id, interface)
-            return
-
-        response = "Available Channels:\n"
-        for i, channel in enumerate(channels):
-            response += f"{i + 1:02d}. Name: {channel[0]}\n"
-        response += "\nPlease reply with the number of the channel you want to view."
-        send_message(response, sender_id, interface)
-
-        update_user_state(sender_id, {'command': 'CHECK_CHANNEL', 'step': 1, 'channels': channels})
 
     except Exception as e:
         logging.error(f"Error processing check channel command: {e}")
@@ -635,14 +731,20 @@ def handle_check_channel_command(sender_id, interface):
 
 def handle_read_channel_command(sender_id, message, state, interface):
     try:
-        channels = state.get('channels', [])
+        choice = message.lower().strip()
+        if choice in ('n', 'p'):
+            if not list_channels_page(sender_id, interface, state['command'], **page_cursor(state, choice)):
+                send_message("No more channels.", sender_id, interface)
+            return
+
+        channel_ids = state.get('channel_ids', [])
         message_number = int(message) - 1
 
-        if message_number < 0 or message_number >= len(channels):
+        if message_number < 0 or message_number >= len(channel_ids):
             send_message("Invalid channel number. Please try again.", sender_id, interface)
             return
 
-        channel_name, channel_url = channels[message_number]
+        channel_name, channel_url = get_channel(channel_ids[message_number])
         response = f"Channel Name: {channel_name}\nChannel URL: {channel_url}"
         send_message(response, sender_id, interface)
 
@@ -657,18 +759,8 @@ def handle_read_channel_command(sender_id, message, state, interface):
 
 def handle_list_channels_command(sender_id, interface):
     try:
-        channels = get_channels()
-        if not channels:
+        if not list_channels_page(sender_id, interface, 'LIST_CHANNELS'):
             send_message("No channels available in the directory.", sender_id, interface)
-            return
-
-        response = "Available Channels:\n"
-        for i, channel in enumerate(channels):
-            response += f"{i+1:02d}. Name: {channel[0]}\n"
-        response += "\nPlease reply with the number of the channel you want to view."
-        send_message(response, sender_id, interface)
-
-        update_user_state(sender_id, {'command': 'LIST_CHANNELS', 'step': 1, 'channels': channels})
 
     except Exception as e:
         logging.error(f"Error processing list channels command: {e}")
@@ -1,48 +1,27 @@
 import os
-import sqlite3
-import threading
+from datetime import datetime
+
+from db_connection import get_connection_manager
+from db_migrations import migrate, TOMBSTONE_SQL
 
-thread_local = threading.local()
 
 def get_db_connection():
-    if not hasattr(thread_local, 'connection'):
-        thread_local.connection = sqlite3.connect('bulletins.db')
-    return thread_local.connection
+    return get_connection_manager('bulletins.db').connection()
+
+# Deletions are tombstoned so reconciliation with peer BBS nodes does not restore them.
+def tombstone(c, table, row_id):
+    c.execute(TOMBSTONE_SQL.format(table=table, where='id = ?'),
+              (table, datetime.now().strftime('%Y-%m-%d %H:%M'), row_id))
 
 def initialize_database():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS bulletins (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    board TEXT NOT NULL,
-                    sender_short_name TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    subject TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    unique_id TEXT NOT NULL
-                )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS mail (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT NOT NULL,
-                    sender_short_name TEXT NOT NULL,
-                    recipient TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    subject TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    unique_id TEXT NOT NULL
-                );''')
-    c.execute('''CREATE TABLE IF NOT EXISTS channels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    url TEXT NOT NULL
-                );''')
-    conn.commit()
+    with get_db_connection() as conn:
+        migrate(conn)
 
 def list_bulletins():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, board, sender_short_name, date, subject, unique_id FROM bulletins")
-    bulletins = c.fetchall()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, board, sender_short_name, date, subject, unique_id FROM bulletins")
+        bulletins = c.fetchall()
     if bulletins:
         print_bold("Bulletins:")
         for bulletin in bulletins:
@@ -53,10 +32,10 @@ def list_bulletins():
     return bulletins
 
 def list_mail():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, sender, sender_short_name, recipient, date, subject, unique_id FROM mail")
-    mail = c.fetchall()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, sender, sender_short_name, recipient, date, subject, unique_id FROM mail")
+        mail = c.fetchall()
     if mail:
         print_bold("Mail:")
         for mail in mail:
@@ -67,10 +46,10 @@ def list_mail():
     return mail
 
 def list_channels():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, name, url FROM channels")
-    channels = c.fetchall()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, name, url FROM channels")
+        channels = c.fetchall()
     if channels:
         print_bold("Channels:")
         for channel in channels:
@@ -88,11 +67,12 @@ def delete_bulletin():
             print_bold("Deletion cancelled.")
             print_separator()
             return
-        conn = get_db_connection()
-        c = conn.cursor()
-        for bulletin_id in bulletin_ids:
-            c.execute("DELETE FROM bulletins WHERE id = ?", (bulletin_id.strip(),))
-        conn.commit()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            for bulletin_id in bulletin_ids:
+                tombstone(c, 'bulletins', bulletin_id.strip())
+                c.execute("DELETE FROM bulletins WHERE id = ?", (bulletin_id.strip(),))
+            conn.commit()
         print_bold(f"Bulletin(s) with ID(s) {', '.join(bulletin_ids)} deleted.")
         print_separator()
 
@@ -104,11 +84,12 @@ def delete_mail():
             print_bold("Deletion cancelled.")
             print_separator()
             return
-        conn = get_db_connection()
-        c = conn.cursor()
-        for mail_id in mail_ids:
-            c.execute("DELETE FROM mail WHERE id = ?", (mail_id.strip(),))
-        conn.commit()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            for mail_id in mail_ids:
+                tombstone(c, 'mail', mail_id.strip())
+                c.execute("DELETE FROM mail WHERE id = ?", (mail_id.strip(),))
+            conn.commit()
         print_bold(f"Mail with ID(s) {', '.join(mail_ids)} deleted.")
         print_separator()
 
@@ -120,11 +101,11 @@ def delete_channel():
             print_bold("Deletion cancelled.")
             print_separator()
             return
-        conn = get_db_connection()
-        c = conn.cursor()
-        for channel_id in channel_ids:
-            c.execute("DELETE FROM channels WHERE id = ?", (channel_id.strip(),))
-        conn.commit()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            for channel_id in channel_ids:
+                c.execute("DELETE FROM channels WHERE id = ?", (channel_id.strip(),))
+            conn.commit()
         print_bold(f"Channel(s) with ID(s) {', '.join(channel_ids)} deleted.")
         print_separator()
 
@@ -0,0 +1,219 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+managers = {}
+managers_lock = threading.Lock()
+
+
+class ConnectionManager:
+    """Bounded pool of SQLite connections to a single database file.
+
+    Connections run in WAL mode, so readers keep going while a writer holds
+    the lock, and are handed back to the pool after use, which keeps each
+    connection's prepared statement cache warm. At most `max_connections`
+    are open at once; further callers wait for one to be returned. A thread
+    that already holds a connection gets the same one back when it asks again.
+    """
+
+    def __init__(self, path, max_connections=4, busy_timeout=5000, cached_statements=128):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.idle = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        # NORMAL is durable across application crashes in WAL mode; only a power
+        # loss can roll back the most recent commits.
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self.local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+
+        self.slots.acquire()
+        try:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            self.slots.release()
+            raise
+
+        self.local.conn = conn
+        try:
+            yield conn
+        finally:
+            self.local.conn = None
+            if conn.in_transaction:
+                # Never hand uncommitted work to the next borrower.
+                conn.rollback()
+            with self.lock:
+                self.idle.append(conn)
+            self.slots.release()
+
+    def close(self):
+        with self.lock:
+            while self.idle:
+                self.idle.pop().close()
+
+
+class WriteBehindQueue:
+    """Applies queued writes in group commits from a background thread.
+
+    A batch is committed once it holds `max_batch` statements or its oldest
+    statement has waited `max_delay` seconds, whichever comes first, so a
+    queued write is committed within `max_delay` plus the time of one commit.
+    Committed is not durable across power loss: connections run with
+    `synchronous = NORMAL`, which in WAL mode does not sync on commit.
+    A statement that violates a constraint is logged and skipped without
+    affecting the rest of its batch. Any other failure rolls the batch back
+    and it is retried; after `max_retries` failed attempts its statements
+    are committed one at a time and those that still fail are dropped.
+    Either way the statement's `on_error` callback, if any, is called.
+    """
+
+    def __init__(self, manager, max_batch=50, max_delay=1.0, max_retries=3):
+        self.manager = manager
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.failures = 0
+        self.pending = deque()
+        self.committing = False
+        self.flushing = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """Commit whatever is still queued, then stop the worker."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def submit(self, sql, params=(), on_error=None):
+        """Queue a write; `on_error()` is called from the writer thread if it is dropped."""
+        if not self.running:
+            self.start()
+        with self.condition:
+            self.pending.append((sql, params, time.monotonic(), on_error))
+            if len(self.pending) == 1 or len(self.pending) >= self.max_batch:
+                self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every write submitted so far has been committed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            self.flushing += 1
+            self.condition.notify_all()
+            try:
+                while self.pending or self.committing:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self.condition.wait(remaining)
+            finally:
+                self.flushing -= 1
+        return True
+
+    def _due(self):
+        return self.flushing or len(self.pending) >= self.max_batch or \
+            time.monotonic() - self.pending[0][2] >= self.max_delay
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not (self.pending and self._due()):
+                    timeout = None
+                    if self.pending:
+                        timeout = max(self.pending[0][2] + self.max_delay - time.monotonic(), 0)
+                    self.condition.wait(timeout)
+                if not self.pending:
+                    return
+                batch = [self.pending.popleft() for _ in range(min(self.max_batch, len(self.pending)))]
+                self.committing = True
+
+            try:
+                self._commit(batch)
+                self.failures = 0
+            except sqlite3.Error as e:
+                self.failures += 1
+                if self.failures < self.max_retries:
+                    logging.error(f"Group commit of {len(batch)} writes failed, retrying: {e}")
+                    with self.condition:
+                        self.pending.extendleft(reversed(batch))
+                    time.sleep(self.max_delay)
+                else:
+                    logging.error(f"Group commit of {len(batch)} writes failed {self.failures} times, "
+                                  f"writing them one at a time: {e}")
+                    self.failures = 0
+                    self._commit_each(batch)
+            finally:
+                with self.condition:
+                    self.committing = False
+                    self.condition.notify_all()
+
+    def _commit(self, batch):
+        with self.manager.connection() as conn:
+            try:
+                conn.execute("BEGIN")
+                for sql, params, _, on_error in batch:
+                    try:
+                        conn.execute(sql, params)
+                    except sqlite3.IntegrityError as e:
+                        logging.warning(f"Skipping queued write that violates a constraint: {e}")
+                        if on_error is not None:
+                            on_error()
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+
+    def _commit_each(self, batch):
+        for entry in batch:
+            try:
+                self._commit([entry])
+            except sqlite3.Error as e:
+                logging.error(f"Dropping queued write that failed on its own: {e}: {entry[0]}")
+                if entry[3] is not None:
+                    entry[3]()
+
+
+def get_connection_manager(path):
+    with managers_lock:
+        manager = managers.get(path)
+        if manager is None:
+            manager = managers[path] = ConnectionManager(path)
+        return manager
+
+
+def close_all():
+    with managers_lock:
+        for manager in managers.values():
+            manager.close()
@@ -0,0 +1,124 @@
+import logging
+
+
+def create_base_tables(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS bulletins (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    board TEXT NOT NULL,
+                    sender_short_name TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    unique_id TEXT NOT NULL
+                )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS mail (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sender TEXT NOT NULL,
+                    sender_short_name TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    unique_id TEXT NOT NULL
+                );''')
+    c.execute('''CREATE TABLE IF NOT EXISTS channels (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    url TEXT NOT NULL
+                );''')
+
+
+def add_lookup_indexes(c):
+    # Databases created before this migration may already hold synced duplicates;
+    # keep the oldest copy so the unique indexes can be built.
+    c.execute("DELETE FROM bulletins WHERE id NOT IN (SELECT MIN(id) FROM bulletins GROUP BY unique_id)")
+    c.execute("DELETE FROM mail WHERE id NOT IN (SELECT MIN(id) FROM mail GROUP BY unique_id)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bulletins_unique_id ON bulletins (unique_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bulletins_board ON bulletins (board, id)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_mail_unique_id ON mail (unique_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mail_recipient ON mail (recipient, id)")
+
+
+def add_sync_tombstones(c):
+    # Deleted unique_ids are remembered so reconciliation with peers neither
+    # resurrects them nor keeps re-discovering the difference.
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_tombstones (
+                    table_name TEXT NOT NULL,
+                    unique_id TEXT NOT NULL,
+                    deleted_at TEXT NOT NULL,
+                    PRIMARY KEY (table_name, unique_id)
+                ) WITHOUT ROWID''')
+
+
+# Remembers a row's unique_id before it is deleted, so reconciliation does not bring it back.
+TOMBSTONE_SQL = ("INSERT OR IGNORE INTO sync_tombstones (table_name, unique_id, deleted_at) "
+                 "SELECT ?, unique_id, ? FROM {table} WHERE {where}")
+
+
+def add_sync_outbox(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    fields TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_cursors (
+                    node_id TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL
+                )''')
+
+
+def add_telemetry_samples(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS telemetry_samples (
+                    node_id TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    battery_level INTEGER,
+                    voltage REAL,
+                    channel_utilization REAL,
+                    PRIMARY KEY (node_id, bucket)
+                ) WITHOUT ROWID''')
+
+
+def add_user_sessions(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS user_sessions (
+                    user_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    last_seen REAL NOT NULL
+                )''')
+
+
+# Append only: a database at user_version N has had MIGRATIONS[:N] applied.
+MIGRATIONS = [
+    create_base_tables,
+    add_lookup_indexes,
+    add_sync_tombstones,
+    add_sync_outbox,
+    add_telemetry_samples,
+    add_user_sessions,
+]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's PRAGMA user_version.
+
+    Each migration runs in its own transaction together with the version bump,
+    so an interrupted upgrade resumes from the last completed step.
+    """
+    version = get_schema_version(conn)
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            conn.execute("BEGIN")
+            migration(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logging.error(f"Database migration {number} ({migration.__name__}) failed")
+            raise
+        logging.info(f"Applied database migration {number}: {migration.__name__}")
+    return get_schema_version(conn)
@@ -1,11 +1,13 @@
 import logging
-import sqlite3
-import threading
 import uuid
+from collections import namedtuple
 from datetime import datetime
 
 from meshtastic import BROADCAST_NUM
 
+from db_connection import get_connection_manager, WriteBehindQueue
+from db_migrations import migrate, TOMBSTONE_SQL
+from sync_outbox import record_operation
 from utils import (
     send_bulletin_to_bbs_nodes,
     send_delete_bulletin_to_bbs_nodes,
@@ -14,77 +16,105 @@ from utils import (
 )
 
 
-thread_local = threading.local()
+PAGE_SIZE = 10
+
+Page = namedtuple('Page', ['rows', 'has_prev', 'has_next'])
 
 def get_db_connection():
-    if not hasattr(thread_local, 'connection'):
-        thread_local.connection = sqlite3.connect('bulletins.db')
-    return thread_local.connection
+    return get_connection_manager('bulletins.db').connection()
+
+
+# Records received from peer BBS nodes are group-committed instead of one commit each.
+sync_writer = WriteBehindQueue(get_connection_manager('bulletins.db'))
+
+
+def fetch_page(conn, select, where='', params=(), after_id=None, before_id=None, page_size=PAGE_SIZE):
+    """Fetch one page of `select` ordered by id, using the id as a keyset cursor.
+
+    `select` must return the row id as its first column. Pass the last id of
+    the current page as `after_id` for the next page, or its first id as
+    `before_id` for the previous one; each page costs a single index range
+    scan no matter how deep into the table it is.
+    """
+    clauses = [where] if where else []
+    args = list(params)
+    if before_id is not None:
+        clauses.append("id < ?")
+        args.append(before_id)
+        order = "DESC"
+    else:
+        if after_id is not None:
+            clauses.append("id > ?")
+            args.append(after_id)
+        order = "ASC"
+    query = select
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += f" ORDER BY id {order} LIMIT ?"
+    args.append(page_size + 1)
 
-def initialize_database():
-    conn = get_db_connection()
     c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS bulletins (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    board TEXT NOT NULL,
-                    sender_short_name TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    subject TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    unique_id TEXT NOT NULL
-                )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS mail (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT NOT NULL,
-                    sender_short_name TEXT NOT NULL,
-                    recipient TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    subject TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    unique_id TEXT NOT NULL
-                );''')
-    c.execute('''CREATE TABLE IF NOT EXISTS channels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    url TEXT NOT NULL
-                );''')
-    conn.commit()
+    c.execute(query, args)
+    rows = c.fetchall()
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before_id is not None:
+        rows.reverse()
+        return Page(rows, more, True)
+    return Page(rows, after_id is not None, more)
+
+
+def initialize_database():
+    with get_db_connection() as conn:
+        migrate(conn)
     print("Database schema initialized.")
 
 def add_channel(name, url, bbs_nodes=None, interface=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO channels (name, url) VALUES (?, ?)", (name, url))
-    conn.commit()
+    outbox_id = None
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("INSERT INTO channels (name, url) VALUES (?, ?)", (name, url))
+        if bbs_nodes and interface:
+            outbox_id = record_operation(c, "CHANNEL", (name, url))
+        conn.commit()
 
     if bbs_nodes and interface:
-        send_channel_to_bbs_nodes(name, url, bbs_nodes, interface)
+        send_channel_to_bbs_nodes(name, url, bbs_nodes, interface, outbox_id)
 
 
-def get_channels():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, name, url FROM channels")
-    return c.fetchall()
+def get_channels(after_id=None, before_id=None):
+    with get_db_connection() as conn:
+        return fetch_page(conn, "SELECT id, name, url FROM channels", after_id=after_id, before_id=before_id)
+
+
+def get_channel(channel_id):
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT name, url FROM channels WHERE id = ?", (channel_id,))
+        return c.fetchone()
 
 def remove_channel(id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM channels WHERE id = ?", (id,))
-    conn.commit()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM channels WHERE id = ?", (id,))
+        conn.commit()
 
 def add_bulletin(board, sender_short_name, subject, content, bbs_nodes, interface, unique_id=None):
-    conn = get_db_connection()
-    c = conn.cursor()
     date = datetime.now().strftime('%Y-%m-%d %H:%M')
     if not unique_id:
         unique_id = str(uuid.uuid4())
-    c.execute(
-        "INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?)",
-        (board, sender_short_name, date, subject, content, unique_id))
-    conn.commit()
+    outbox_id = None
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?)",
+            (board, sender_short_name, date, subject, content, unique_id))
+        if bbs_nodes and interface:
+            outbox_id = record_operation(c, "BULLETIN", (board, sender_short_name, subject, content, unique_id))
+        conn.commit()
     if bbs_nodes and interface:
-        send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface)
+        send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface,
+                                   outbox_id)
 
     # New logic to send group chat notification for urgent bulletins
     if board.lower() == "urgent":
@@ -94,66 +124,92 @@ def add_bulletin(board, sender_short_name, subject, content, bbs_nodes, interfac
     return unique_id
 
 
-def get_bulletins(board):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, subject, sender_short_name, date, unique_id FROM bulletins WHERE board = ?", (board,))
-    return c.fetchall()
+def get_bulletins(board, after_id=None, before_id=None):
+    with get_db_connection() as conn:
+        return fetch_page(conn, "SELECT id, subject, sender_short_name, date, unique_id FROM bulletins",
+                          "board = ?", (board,), after_id=after_id, before_id=before_id)
 
 def get_bulletin_content(bulletin_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT sender_short_name, date, subject, content, unique_id FROM bulletins WHERE id = ?", (bulletin_id,))
-    return c.fetchone()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT sender_short_name, date, subject, content, unique_id FROM bulletins WHERE id = ?", (bulletin_id,))
+        return c.fetchone()
 
 
 def delete_bulletin(bulletin_id, bbs_nodes, interface):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM bulletins WHERE id = ?", (bulletin_id,))
-    conn.commit()
-    send_delete_bulletin_to_bbs_nodes(bulletin_id, bbs_nodes, interface)
+    # Row ids are local to each node, so peers are told which bulletin by its unique_id.
+    outbox_id = None
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT unique_id FROM bulletins WHERE id = ?", (bulletin_id,))
+        result = c.fetchone()
+        if result is None:
+            logging.error(f"No bulletin found with id: {bulletin_id}")
+            return
+        unique_id = result[0]
+        c.execute(TOMBSTONE_SQL.format(table='bulletins', where='unique_id = ?'),
+                  ('bulletins', datetime.now().strftime('%Y-%m-%d %H:%M'), unique_id))
+        c.execute("DELETE FROM bulletins WHERE unique_id = ?", (unique_id,))
+        if bbs_nodes:
+            outbox_id = record_operation(c, "DELETE_BULLETIN", (unique_id,))
+        conn.commit()
+    send_delete_bulletin_to_bbs_nodes(unique_id, bbs_nodes, interface, outbox_id)
 
 def add_mail(sender_id, sender_short_name, recipient_id, subject, content, bbs_nodes, interface, unique_id=None):
-    conn = get_db_connection()
-    c = conn.cursor()
     date = datetime.now().strftime('%Y-%m-%d %H:%M')
     if not unique_id:
         unique_id = str(uuid.uuid4())
-    c.execute("INSERT INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
-              (sender_id, sender_short_name, recipient_id, date, subject, content, unique_id))
-    conn.commit()
+    outbox_id = None
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("INSERT INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                  (sender_id, sender_short_name, recipient_id, date, subject, content, unique_id))
+        if bbs_nodes and interface:
+            outbox_id = record_operation(c, "MAIL", (sender_id, sender_short_name, recipient_id, subject, content,
+                                                     unique_id))
+        conn.commit()
     if bbs_nodes and interface:
-        send_mail_to_bbs_nodes(sender_id, sender_short_name, recipient_id, subject, content, unique_id, bbs_nodes, interface)
+        send_mail_to_bbs_nodes(sender_id, sender_short_name, recipient_id, subject, content, unique_id, bbs_nodes, interface,
+                               outbox_id)
     return unique_id
 
-def get_mail(recipient_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, sender_short_name, subject, date, unique_id FROM mail WHERE recipient = ?", (recipient_id,))
-    return c.fetchall()
+def get_mail(recipient_id, after_id=None, before_id=None):
+    with get_db_connection() as conn:
+        return fetch_page(conn, "SELECT id, sender_short_name, subject, date, unique_id FROM mail",
+                          "recipient = ?", (recipient_id,), after_id=after_id, before_id=before_id)
+
+def count_mail(recipient_id):
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM mail WHERE recipient = ?", (recipient_id,))
+        return c.fetchone()[0]
 
 def get_mail_content(mail_id, recipient_id):
     # TODO: ensure only recipient can read mail
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT sender_short_name, date, subject, content, unique_id FROM mail WHERE id = ? and recipient = ?", (mail_id, recipient_id,))
-    return c.fetchone()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT sender_short_name, date, subject, content, unique_id FROM mail WHERE id = ? and recipient = ?", (mail_id, recipient_id,))
+        return c.fetchone()
 
 def delete_mail(unique_id, recipient_id, bbs_nodes, interface):
-    conn = get_db_connection()
-    c = conn.cursor()
+    outbox_id = None
     try:
-        c.execute("SELECT recipient FROM mail WHERE unique_id = ?", (unique_id,))
-        result = c.fetchone()
-        if result is None:
-            logging.error(f"No mail found with unique_id: {unique_id}")
-            return  # Early exit if no matching mail found
-        recipient_id = result[0]
-        logging.info(f"Attempting to delete mail with unique_id: {unique_id} by {recipient_id}")
-        c.execute("DELETE FROM mail WHERE unique_id = ? and recipient = ?", (unique_id, recipient_id,))
-        conn.commit()
-        send_delete_mail_to_bbs_nodes(unique_id, bbs_nodes, interface)
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT recipient FROM mail WHERE unique_id = ?", (unique_id,))
+            result = c.fetchone()
+            if result is None:
+                logging.error(f"No mail found with unique_id: {unique_id}")
+                return  # Early exit if no matching mail found
+            recipient_id = result[0]
+            logging.info(f"Attempting to delete mail with unique_id: {unique_id} by {recipient_id}")
+            c.execute(TOMBSTONE_SQL.format(table='mail', where='unique_id = ?'),
+                      ('mail', datetime.now().strftime('%Y-%m-%d %H:%M'), unique_id))
+            c.execute("DELETE FROM mail WHERE unique_id = ? and recipient = ?", (unique_id, recipient_id,))
+            if bbs_nodes:
+                outbox_id = record_operation(c, "DELETE_MAIL", (unique_id,))
+            conn.commit()
+        send_delete_mail_to_bbs_nodes(unique_id, bbs_nodes, interface, outbox_id)
         logging.info(f"Mail with unique_id: {unique_id} deleted and sync message sent.")
     except Exception as e:
         logging.error(f"Error deleting mail with unique_id {unique_id}: {e}")
@@ -161,10 +217,101 @@ def delete_mail(unique_id, recipient_id, bbs_nodes, interface):
 
 
 def get_sender_id_by_mail_id(mail_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT sender FROM mail WHERE id = ?", (mail_id,))
-    result = c.fetchone()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT sender FROM mail WHERE id = ?", (mail_id,))
+        result = c.fetchone()
     if result:
         return result[0]
     return None
+
+
+def record_exists(table, unique_id):
+    if table not in ('bulletins', 'mail'):
+        raise ValueError(f"Table {table} has no unique_id column")
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT 1 FROM {table} WHERE unique_id = ?", (unique_id,))
+        return c.fetchone() is not None
+
+
+def is_tombstoned(table, unique_id):
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM sync_tombstones WHERE table_name = ? AND unique_id = ?", (table, unique_id))
+        return c.fetchone() is not None
+
+
+# The ingest_* functions queue their writes; `on_error()` is called if a write is dropped.
+def ingest_bulletin(board, sender_short_name, subject, content, unique_id, on_error=None):
+    date = datetime.now().strftime('%Y-%m-%d %H:%M')
+    sync_writer.submit(
+        "INSERT OR IGNORE INTO bulletins (board, sender_short_name, date, subject, content, unique_id) "
+        "SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS "
+        "(SELECT 1 FROM sync_tombstones WHERE table_name = 'bulletins' AND unique_id = ?)",
+        (board, sender_short_name, date, subject, content, unique_id, unique_id), on_error)
+
+
+def ingest_mail(sender_id, sender_short_name, recipient_id, subject, content, unique_id, on_error=None):
+    date = datetime.now().strftime('%Y-%m-%d %H:%M')
+    sync_writer.submit(
+        "INSERT OR IGNORE INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) "
+        "SELECT ?, ?, ?, ?, ?, ?, ? WHERE NOT EXISTS "
+        "(SELECT 1 FROM sync_tombstones WHERE table_name = 'mail' AND unique_id = ?)",
+        (sender_id, sender_short_name, recipient_id, date, subject, content, unique_id, unique_id), on_error)
+
+
+def ingest_delete_bulletin(unique_id, on_error=None):
+    ingest_tombstone('bulletins', unique_id, on_error)
+
+
+def ingest_delete_mail(unique_id, on_error=None):
+    ingest_tombstone('mail', unique_id, on_error)
+
+
+def ingest_tombstone(table, unique_id, on_error=None):
+    if table not in ('bulletins', 'mail'):
+        raise ValueError(f"Table {table} has no unique_id column")
+    sync_writer.submit(
+        "INSERT OR IGNORE INTO sync_tombstones (table_name, unique_id, deleted_at) VALUES (?, ?, ?)",
+        (table, unique_id, datetime.now().strftime('%Y-%m-%d %H:%M')), on_error)
+    sync_writer.submit(f"DELETE FROM {table} WHERE unique_id = ?", (unique_id,), on_error)
+
+
+def get_known_unique_ids(table):
+    """Every (unique_id, deleted) of `table` this node holds; a tombstone wins over a live row."""
+    if table not in ('bulletins', 'mail'):
+        raise ValueError(f"Table {table} has no unique_id column")
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT unique_id, 0 FROM {table} t WHERE NOT EXISTS "
+                  "(SELECT 1 FROM sync_tombstones WHERE table_name = ? AND unique_id = t.unique_id) UNION ALL "
+                  "SELECT unique_id, 1 FROM sync_tombstones WHERE table_name = ?", (table, table))
+        return [(row[0], bool(row[1])) for row in c.fetchall()]
+
+
+def get_sync_record(table, unique_id):
+    """Return the (kind, fields) that replicates `unique_id` to a peer, or None if unknown."""
+    if table not in ('bulletins', 'mail'):
+        raise ValueError(f"Table {table} has no unique_id column")
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM sync_tombstones WHERE table_name = ? AND unique_id = ?", (table, unique_id))
+        if c.fetchone() is not None:
+            return "TOMBSTONE", (table, unique_id)
+        if table == 'bulletins':
+            c.execute("SELECT board, sender_short_name, subject, content, unique_id FROM bulletins "
+                      "WHERE unique_id = ?", (unique_id,))
+            kind = "BULLETIN"
+        else:
+            c.execute("SELECT sender, sender_short_name, recipient, subject, content, unique_id FROM mail "
+                      "WHERE unique_id = ?", (unique_id,))
+            kind = "MAIL"
+        row = c.fetchone()
+    if row is not None:
+        return kind, row
+    return None
+
+
+def ingest_channel(name, url, on_error=None):
+    sync_writer.submit("INSERT INTO channels (name, url) VALUES (?, ?)", (name, url), on_error)
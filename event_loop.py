@@ -0,0 +1,113 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EventLoopCore:
+    """The server's asyncio event loop, run on the main thread.
+
+    Meshtastic delivers packets on its own threads; `bridge` turns a handler
+    into a pubsub listener that hands the message over to the loop and
+    returns straight away. Long-running I/O (the JS8Call stream, transmit
+    pacing) runs as tasks on the loop, and periodic maintenance is scheduled
+    with `every`. Blocking work (database access, writes to the radio) is run
+    in a small shared executor, so the number of threads stays fixed however
+    much traffic there is.
+    """
+
+    def __init__(self, workers=4):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='core')
+        self.loop.set_default_executor(self.executor)
+        self.tasks = set()
+        self.listeners = []
+        self.stopped = asyncio.Event()
+
+    def bridge(self, handler):
+        """Return a pubsub listener that runs `handler(**message)` on the loop.
+
+        pypubsub only holds weak references to listeners, so the core keeps
+        every listener it creates alive for as long as it exists. The
+        listener carries the handler's signature, from which pypubsub infers
+        the topic's message arguments.
+        """
+        @functools.wraps(handler)
+        def listener(**message):
+            self.loop.call_soon_threadsafe(functools.partial(self._call, handler, message))
+        self.listeners.append(listener)
+        return listener
+
+    @staticmethod
+    def _call(handler, message):
+        try:
+            handler(**message)
+        except Exception as e:
+            logging.error(f"Error handling {handler.__name__}: {e}")
+
+    def spawn(self, coroutine, name=None):
+        """Run a coroutine as a task on the loop; callable from any thread."""
+        def create():
+            task = self.loop.create_task(coroutine, name=name)
+            self.tasks.add(task)
+            task.add_done_callback(self._task_done)
+        self.loop.call_soon_threadsafe(create)
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Task {task.get_name()} failed: {task.exception()}")
+
+    def every(self, interval, job, name):
+        """Run the blocking `job()` in the executor every `interval` seconds."""
+        if interval <= 0:
+            return
+        self.spawn(self._periodic(interval, job, name), name=name)
+
+    async def _periodic(self, interval, job, name):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.loop.run_in_executor(None, job)
+            except Exception as e:
+                logging.error(f"Periodic job {name} failed: {e}")
+
+    def call_later(self, delay, job, name):
+        """Run the blocking `job()` once in the executor after `delay` seconds."""
+        self.spawn(self._delayed(delay, job, name), name=name)
+
+    async def _delayed(self, delay, job, name):
+        await asyncio.sleep(delay)
+        try:
+            await self.loop.run_in_executor(None, job)
+        except Exception as e:
+            logging.error(f"Scheduled job {name} failed: {e}")
+
+    def run_blocking(self, job, *args):
+        """Await `job(*args)` in the executor from a coroutine."""
+        return self.loop.run_in_executor(None, functools.partial(job, *args))
+
+    def run(self):
+        """Run the loop until `stop()` is called or the process is interrupted."""
+        self.loop.run_until_complete(self.stopped.wait())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.stopped.set)
+
+    def shutdown(self, *cleanups):
+        """Run each blocking cleanup while the loop keeps serving its tasks, then cancel them."""
+        async def finish():
+            self.stopped.set()
+            for cleanup in cleanups:
+                try:
+                    await self.loop.run_in_executor(None, cleanup)
+                except Exception as e:
+                    logging.error(f"Shutdown step failed: {e}")
+            tasks = list(self.tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.loop.run_until_complete(finish())
+        self.executor.shutdown(wait=True)
+        self.loop.close()
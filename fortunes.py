@@ -0,0 +1,81 @@
+import mmap
+import os
+import random
+import threading
+from array import array
+
+
+class FortuneFile:
+    """Random lines from a fortune file without reading the whole file.
+
+    The file is memory-mapped and the start offset of every non-blank line is
+    indexed once; picking a fortune is then a random index plus one slice.
+    The index is rebuilt whenever the file's mtime or size changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array('Q')
+        self.mapped = None
+        self.signature = None
+        self.lock = threading.Lock()
+
+    def _refresh(self):
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self.signature:
+            return
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        offsets = array('Q')
+        if stat.st_size:
+            with open(self.path, 'rb') as file:
+                self.mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            start = 0
+            while start < stat.st_size:
+                end = self.mapped.find(b'\n', start)
+                if end == -1:
+                    end = stat.st_size
+                if self.mapped[start:end].strip():
+                    offsets.append(start)
+                start = end + 1
+        self.offsets = offsets
+        self.signature = signature
+
+    def __len__(self):
+        with self.lock:
+            self._refresh()
+            return len(self.offsets)
+
+    def choice(self):
+        """Return a random fortune, or None if the file has none."""
+        with self.lock:
+            self._refresh()
+            if not self.offsets:
+                return None
+            start = self.offsets[random.randrange(len(self.offsets))]
+            end = self.mapped.find(b'\n', start)
+            line = self.mapped[start:end if end != -1 else len(self.mapped)]
+        return line.decode('utf-8', errors='replace').strip()
+
+
+class FortuneLibrary:
+    """Named fortune files, one of which the Fortune command draws from."""
+
+    def __init__(self, files, source='default'):
+        self.files = {name: FortuneFile(path) for name, path in files.items()}
+        self.source = source
+
+    @classmethod
+    def from_config(cls, config):
+        files = {'default': 'fortunes.txt'}
+        if config.has_section('fortune_files'):
+            files.update(config.items('fortune_files'))
+        return cls(files, config.get('fortune', 'source', fallback='default'))
+
+    def choice(self, name=None):
+        fortune_file = self.files.get(name or self.source)
+        if fortune_file is None:
+            raise KeyError(f"Unknown fortune file: {name or self.source}")
+        return fortune_file.choice()
@@ -1,14 +1,19 @@
-from socket import socket, AF_INET, SOCK_STREAM
+import asyncio
 import json
 import time
 import sqlite3
 import configparser
 import logging
+import random
+import threading
+from collections import deque
 
 from meshtastic import BROADCAST_NUM
 
-from command_handlers import handle_help_command
-from utils import send_message, update_user_state
+from command_handlers import handle_help_command, page_navigation, page_state, page_cursor
+from db_connection import get_connection_manager
+from db_operations import fetch_page
+from utils import send_message, update_user_state, ReplyBuilder
 
 config_file = 'config.ini'
 
@@ -24,6 +29,115 @@ def to_message(typ, value='', params=None):
     return json.dumps({'type': typ, 'value': value, 'params': params})
 
 
+class LineFramer:
+    """Splits the JS8Call API byte stream into newline-terminated messages.
+
+    Reads can hold several messages or part of one, so bytes are buffered
+    until a newline arrives and only complete lines are decoded. A line that
+    grows past `max_line` bytes is discarded up to its newline, so a
+    misbehaving peer cannot grow the buffer without bound.
+    """
+
+    def __init__(self, max_line=65536, logger=None):
+        self.max_line = max_line
+        self.logger = logger or logging.getLogger('js8call')
+        self.buffer = bytearray()
+        self.discarding = False
+
+    def feed(self, data):
+        """Add received bytes and return the complete lines they finish, decoded."""
+        lines = []
+        start = len(self.buffer)
+        self.buffer += data
+        while True:
+            end = self.buffer.find(b'\n', start)
+            if end == -1:
+                break
+            line = bytes(self.buffer[:end])
+            del self.buffer[:end + 1]
+            start = 0
+            if self.discarding:
+                self.discarding = False
+            elif len(line) > self.max_line:
+                self.logger.warning(f"Discarding JS8Call message longer than {self.max_line} bytes")
+            elif line.strip():
+                lines.append(line.decode('utf-8', errors='replace'))
+        if len(self.buffer) > self.max_line:
+            if not self.discarding:
+                self.logger.warning(f"Discarding JS8Call message longer than {self.max_line} bytes")
+            self.discarding = True
+            self.buffer.clear()
+        return lines
+
+
+class JS8CallStore:
+    """The JS8Call message database, shared by the client that writes it and the menus that read it.
+
+    Opened by JS8CallClient on the configured `db_file`. The list of group
+    names is cached and dropped whenever a group message is stored.
+    """
+
+    # Column holding the receiving station or group, per table.
+    receivers = {'messages': 'receiver', 'groups': 'groupname', 'urgent': 'groupname'}
+
+    def __init__(self):
+        self.manager = None
+        self.group_names = None
+        self.lock = threading.Lock()
+
+    def open(self, db_file):
+        self.manager = get_connection_manager(db_file)
+        return self.manager
+
+    def create_tables(self):
+        with self.manager.connection() as conn, conn:
+            for table, receiver in self.receivers.items():
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        sender TEXT,
+                        {receiver} TEXT,
+                        message TEXT,
+                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{receiver}_timestamp "
+                             f"ON {table} ({receiver}, timestamp)")
+
+    def insert(self, table, sender, receiver, message):
+        with self.manager.connection() as conn, conn:
+            conn.execute(f"INSERT INTO {table} (sender, {self.receivers[table]}, message) VALUES (?, ?, ?)",
+                         (sender, receiver, message))
+        if table == 'groups':
+            with self.lock:
+                self.group_names = None
+
+    def groups(self):
+        with self.lock:
+            if self.group_names is not None:
+                return self.group_names
+        with self.manager.connection() as conn:
+            # Answered from the (groupname, timestamp) index without reading the table.
+            names = [row[0] for row in conn.execute("SELECT DISTINCT groupname FROM groups ORDER BY groupname")]
+        with self.lock:
+            self.group_names = names
+        return names
+
+    def group_messages(self, groupname):
+        with self.manager.connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT sender, message, timestamp FROM groups WHERE groupname = ? ORDER BY timestamp",
+                      (groupname,))
+            return c.fetchall()
+
+    def page(self, select, after_id=None, before_id=None):
+        with self.manager.connection() as conn:
+            return fetch_page(conn, select, after_id=after_id, before_id=before_id)
+
+
+js8call_store = JS8CallStore()
+
+
 class JS8CallClient:
     def __init__(self, interface, logger=None):
         self.logger = logger or logging.getLogger('js8call')
@@ -43,93 +157,45 @@ class JS8CallClient:
         self.js8urgent = self.config.get('js8call', 'js8urgent', fallback='').split(',')
         self.js8groups = [group.strip() for group in self.js8groups]
         self.js8urgent = [group.strip() for group in self.js8urgent]
+        self.max_line = self.config.getint('js8call', 'max_line', fallback=65536)
 
         self.connected = False
-        self.sock = None
-        self.db_conn = None
+        self.writer = None
+        self.messages_received = 0
+        self.message_times = deque(maxlen=1024)
+        self.db = None
         self.interface = interface
 
         if self.db_file:
-            self.db_conn = sqlite3.connect(self.db_file)
+            self.db = js8call_store.open(self.db_file)
             self.create_tables()
         else:
             self.logger.info("JS8Call configuration not found. Skipping JS8Call integration.")
 
     def create_tables(self):
-        if not self.db_conn:
+        if not self.db:
             return
-
-        with self.db_conn:
-            self.db_conn.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT,
-                    receiver TEXT,
-                    message TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            self.db_conn.execute('''
-                CREATE TABLE IF NOT EXISTS groups (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT,
-                    groupname TEXT,
-                    message TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            self.db_conn.execute('''
-                CREATE TABLE IF NOT EXISTS urgent (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT,
-                    groupname TEXT,
-                    message TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+        js8call_store.create_tables()
         self.logger.info("Database tables created or verified.")
 
     def insert_message(self, sender, receiver, message):
-        if not self.db_conn:
-            self.logger.error("Database connection is not available.")
-            return
-
-        try:
-            with self.db_conn:
-                self.db_conn.execute('''
-                    INSERT INTO messages (sender, receiver, message)
-                    VALUES (?, ?, ?)
-                ''', (sender, receiver, message))
-        except sqlite3.Error as e:
-            self.logger.error(f"Failed to insert message into database: {e}")
+        self._insert('messages', sender, receiver, message)
 
     def insert_group(self, sender, groupname, message):
-        if not self.db_conn:
-            self.logger.error("Database connection is not available.")
-            return
-
-        try:
-            with self.db_conn:
-                self.db_conn.execute('''
-                    INSERT INTO groups (sender, groupname, message)
-                    VALUES (?, ?, ?)
-                ''', (sender, groupname, message))
-        except sqlite3.Error as e:
-            self.logger.error(f"Failed to insert group message into database: {e}")
+        self._insert('groups', sender, groupname, message)
 
     def insert_urgent(self, sender, groupname, message):
-        if not self.db_conn:
+        self._insert('urgent', sender, groupname, message)
+
+    def _insert(self, table, sender, receiver, message):
+        if not self.db:
             self.logger.error("Database connection is not available.")
             return
 
         try:
-            with self.db_conn:
-                self.db_conn.execute('''
-                    INSERT INTO urgent (sender, groupname, message)
-                    VALUES (?, ?, ?)
-                ''', (sender, groupname, message))
+            js8call_store.insert(table, sender, receiver, message)
         except sqlite3.Error as e:
-            self.logger.error(f"Failed to insert urgent message into database: {e}")
+            self.logger.error(f"Failed to insert {table} message into database: {e}")
 
     def process(self, message):
         typ = message.get('type', '')
@@ -177,43 +243,145 @@ class JS8CallClient:
             params['_ID'] = '{}'.format(int(time.time() * 1000))
             kwargs['params'] = params
         message = to_message(*args, **kwargs)
-        self.sock.send((message + '\n').encode('utf-8'))  # Convert to bytes
-
-    def connect(self):
-        if not self.server[0] or not self.server[1]:
-            self.logger.info("JS8Call server configuration not found. Skipping JS8Call connection.")
+        if self.writer is None:
+            self.logger.warning(f"Not connected to JS8Call, dropping {message}")
             return
+        self.writer.write((message + '\n').encode('utf-8'))
 
+    async def run(self, on_connected=None):
+        """Read the JS8Call API stream on the event loop until the server closes the connection.
+
+        Connection errors are raised to the caller (see JS8CallSupervisor).
+        """
         self.logger.info(f"Connecting to {self.server}")
-        self.sock = socket(AF_INET, SOCK_STREAM)
+        reader, self.writer = await asyncio.open_connection(*self.server)
+        loop = asyncio.get_running_loop()
+        self.connected = True
+        if on_connected is not None:
+            on_connected()
         try:
-            self.sock.connect(self.server)
-            self.connected = True
             self.send("STATION.GET_STATUS")
-
+            framer = LineFramer(self.max_line, self.logger)
             while self.connected:
-                content = self.sock.recv(65500).decode('utf-8')  # Decode received bytes to string
-                if not content:
-                    continue  # Skip empty content
-
-                try:
-                    message = json.loads(content)
-                except ValueError:
-                    continue  # Skip invalid JSON content
-
-                if not message:
-                    continue  # Skip empty message
-
-                self.process(message)
-        except ConnectionRefusedError:
-            self.logger.error(f"Connection to JS8Call server {self.server} refused.")
+                data = await reader.read(65500)
+                if not data:
+                    self.logger.info(f"JS8Call server {self.server} closed the connection.")
+                    break
+                for line in framer.feed(data):
+                    message = from_message(line)
+                    if message:
+                        self.messages_received += 1
+                        self.message_times.append(time.monotonic())
+                        # Storing a message touches the database, so keep it off the loop.
+                        try:
+                            await loop.run_in_executor(None, self.process, message)
+                        except Exception as e:
+                            self.logger.error(f"Error processing JS8Call message {line!r}: {e}")
         finally:
-            self.sock.close()
+            self.connected = False
+            self.writer.close()
+            self.writer = None
 
     def close(self):
         self.connected = False
 
 
+class JS8CallSupervisor:
+    """Keeps a JS8CallClient connected from a task on the server's event loop.
+
+    Whenever the connection fails or drops, the supervisor waits and
+    reconnects. The wait doubles after each failure, from `min_delay` up to
+    `max_delay` seconds, with random jitter. It returns to `min_delay` once a
+    connection has stayed up for `max_delay` seconds.
+    """
+
+    def __init__(self, client, min_delay=5.0, max_delay=300.0, rate_window=300.0):
+        self.client = client
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.rate_window = rate_window
+        self.failures = 0
+        self.reconnects = 0
+        self.connected_since = None
+        self.connected_at = None
+        self.last_error = None
+        self.stopping = False
+        self.core = None
+        self.task = None
+
+    @classmethod
+    def from_config(cls, client):
+        return cls(
+            client,
+            min_delay=client.config.getfloat('js8call', 'reconnect_min', fallback=5.0),
+            max_delay=client.config.getfloat('js8call', 'reconnect_max', fallback=300.0)
+        )
+
+    def start(self, core):
+        if not self.client.server[0] or not self.client.server[1]:
+            self.client.logger.info("JS8Call server configuration not found. Skipping JS8Call connection.")
+            return
+        self.core = core
+        core.spawn(self._run(), name='js8call')
+
+    def stop(self):
+        """Disconnect and stop reconnecting; callable from any thread."""
+        self.stopping = True
+        self.client.close()
+        if self.task is not None and not self.core.loop.is_closed():
+            self.core.loop.call_soon_threadsafe(self.task.cancel)
+
+    def backoff(self):
+        delay = min(self.max_delay, self.min_delay * 2 ** max(self.failures - 1, 0))
+        return random.uniform(delay / 2, delay)
+
+    async def _run(self):
+        self.task = asyncio.current_task()
+        while not self.stopping:
+            self.connected_at = None
+            try:
+                await self.client.run(on_connected=self._connected)
+                self.last_error = "connection closed by server"
+            except Exception as e:
+                # Anything but cancellation counts as a failed connection and is retried.
+                self.last_error = str(e)
+                self.client.logger.error(f"Connection to JS8Call server {self.client.server} failed: {e}")
+            finally:
+                self.connected_since = None
+
+            if self.stopping:
+                break
+            if self.connected_at is not None and time.monotonic() - self.connected_at >= self.max_delay:
+                self.failures = 0
+            self.failures += 1
+            delay = self.backoff()
+            self.client.logger.info(f"Reconnecting to JS8Call in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+            self.reconnects += 1
+
+    def _connected(self):
+        self.connected_at = time.monotonic()
+        self.connected_since = time.time()
+        self.client.logger.info(f"Connected to JS8Call server {self.client.server}")
+
+    def message_rate(self):
+        """API messages per minute over the last `rate_window` seconds."""
+        cutoff = time.monotonic() - self.rate_window
+        recent = sum(1 for received in self.client.message_times if received >= cutoff)
+        return recent * 60 / self.rate_window
+
+    def health(self):
+        return {
+            'connected': self.client.connected,
+            'connected_since': self.connected_since,
+            'reconnects': self.reconnects,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'messages': self.client.messages_received,
+            'messages_per_minute': round(self.message_rate(), 2)
+        }
+
+
 def handle_js8call_command(sender_id, interface):
     response = "JS8Call Menu:\n[G]roup Messages\n[S]tation Messages\n[U]rgent Messages\nE[X]IT"
     send_message(response, sender_id, interface)
@@ -230,6 +398,9 @@ def handle_js8call_steps(sender_id, message, step, interface, state):
         if choice == 'x':
             handle_help_command(sender_id, interface, 'bbs')
             return
+        elif choice in ('g', 's', 'u') and js8call_store.manager is None:
+            send_message("JS8Call is not configured on this BBS.", sender_id, interface)
+            handle_js8call_command(sender_id, interface)
         elif choice == 'g':
             handle_group_messages_command(sender_id, interface)
         elif choice == 's':
@@ -240,59 +411,75 @@ def handle_js8call_steps(sender_id, message, step, interface, state):
             send_message("Invalid option. Please choose again.", sender_id, interface)
             handle_js8call_command(sender_id, interface)
 
+    elif step == 2:
+        # Paging through a message listing; anything else is a JS8Call menu choice.
+        if message in ('n', 'p'):
+            list_js8call_messages(sender_id, interface, state['listing'], **page_cursor(state, message))
+        else:
+            handle_js8call_steps(sender_id, message, 1, interface, state)
+
 
 
 def handle_group_messages_command(sender_id, interface):
-    conn = sqlite3.connect('js8call.db')
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT groupname FROM groups")
-    groups = c.fetchall()
+    groups = js8call_store.groups()
     if groups:
-        response = "Group Messages Menu:\n" + "\n".join([f"[{i}] {group[0]}" for i, group in enumerate(groups)])
-        send_message(response, sender_id, interface)
+        reply = ReplyBuilder(sender_id, interface)
+        reply.add("Group Messages Menu:")
+        reply.extend([f"[{i}] {group}" for i, group in enumerate(groups)])
+        reply.flush()
         update_user_state(sender_id, {'command': 'GROUP_MESSAGES', 'step': 1, 'groups': groups})
     else:
         send_message("No group messages available.", sender_id, interface)
         handle_js8call_command(sender_id, interface)
 
-def handle_station_messages_command(sender_id, interface):
-    conn = sqlite3.connect('js8call.db')
-    c = conn.cursor()
-    c.execute("SELECT sender, receiver, message, timestamp FROM messages")
-    messages = c.fetchall()
-    if messages:
-        response = "Station Messages:\n" + "\n".join([f"[{i+1}] {msg[0]} -> {msg[1]}: {msg[2]} ({msg[3]})" for i, msg in enumerate(messages)])
-        send_message(response, sender_id, interface)
+js8call_listings = {
+    'station': ("Station Messages:", "SELECT id, sender, receiver, message, timestamp FROM messages",
+                "No station messages available."),
+    'urgent': ("Urgent Messages:", "SELECT id, sender, groupname, message, timestamp FROM urgent",
+               "No urgent messages available.")
+}
+
+
+def list_js8call_messages(sender_id, interface, listing, after_id=None, before_id=None):
+    title, query, empty_response = js8call_listings[listing]
+    page = js8call_store.page(query, after_id=after_id, before_id=before_id)
+    if page.rows:
+        reply = ReplyBuilder(sender_id, interface)
+        reply.add(title)
+        reply.extend([f"[{i+1}] {msg[1]} -> {msg[2]}: {msg[3]} ({msg[4]})" for i, msg in enumerate(page.rows)])
+        navigation = page_navigation(page)
+        if navigation:
+            reply.add(navigation)
+        reply.flush()
+    elif after_id is None and before_id is None:
+        send_message(empty_response, sender_id, interface)
     else:
-        send_message("No station messages available.", sender_id, interface)
+        send_message("No more messages.", sender_id, interface)
     handle_js8call_command(sender_id, interface)
+    if page.rows and (page.has_prev or page.has_next):
+        update_user_state(sender_id, {'command': 'JS8CALL_MENU', 'step': 2, 'listing': listing, **page_state(page)})
+
+
+def handle_station_messages_command(sender_id, interface, after_id=None, before_id=None):
+    list_js8call_messages(sender_id, interface, 'station', after_id=after_id, before_id=before_id)
+
+
+def handle_urgent_messages_command(sender_id, interface, after_id=None, before_id=None):
+    list_js8call_messages(sender_id, interface, 'urgent', after_id=after_id, before_id=before_id)
 
-def handle_urgent_messages_command(sender_id, interface):
-    conn = sqlite3.connect('js8call.db')
-    c = conn.cursor()
-    c.execute("SELECT sender, groupname, message, timestamp FROM urgent")
-    messages = c.fetchall()
-    if messages:
-        response = "Urgent Messages:\n" + "\n".join([f"[{i+1}] {msg[0]} -> {msg[1]}: {msg[2]} ({msg[3]})" for i, msg in enumerate(messages)])
-        send_message(response, sender_id, interface)
-    else:
-        send_message("No urgent messages available.", sender_id, interface)
-    handle_js8call_command(sender_id, interface)
 
 def handle_group_message_selection(sender_id, message, step, state, interface):
     groups = state['groups']
     try:
         group_index = int(message)
-        groupname = groups[group_index][0]
-
-        conn = sqlite3.connect('js8call.db')
-        c = conn.cursor()
-        c.execute("SELECT sender, message, timestamp FROM groups WHERE groupname=?", (groupname,))
-        messages = c.fetchall()
+        groupname = groups[group_index]
+        messages = js8call_store.group_messages(groupname)
 
         if messages:
-            response = f"Messages for group {groupname}:\n" + "\n".join([f"[{i+1}] {msg[0]}: {msg[1]} ({msg[2]})" for i, msg in enumerate(messages)])
-            send_message(response, sender_id, interface)
+            reply = ReplyBuilder(sender_id, interface)
+            reply.add(f"Messages for group {groupname}:")
+            reply.extend([f"[{i+1}] {msg[0]}: {msg[1]} ({msg[2]})" for i, msg in enumerate(messages)])
+            reply.flush()
         else:
             send_message(f"No messages for group {groupname}.", sender_id, interface)
     except (IndexError, ValueError):
@@ -1,4 +1,5 @@
 import logging
+from collections import Counter
 
 from meshtastic import BROADCAST_NUM
 
@@ -10,9 +11,26 @@ from command_handlers import (
     handle_check_bulletin_command, handle_read_bulletin_command, handle_read_channel_command,
     handle_post_channel_command, handle_list_channels_command, handle_quick_help_command
 )
-from db_operations import add_bulletin, add_mail, delete_bulletin, delete_mail, get_db_connection, add_channel
+from db_operations import (
+    ingest_bulletin, ingest_mail, ingest_delete_bulletin, ingest_delete_mail, ingest_channel, ingest_tombstone,
+    is_tombstoned, record_exists
+)
 from js8call_integration import handle_js8call_command, handle_js8call_steps, handle_group_message_selection
-from utils import get_user_state, get_node_short_name, get_node_id_from_num, send_message
+from router import CommandRouter
+from sync_protocol import (
+    FRAME_ACK, FRAME_BROADCAST, FRAME_DIGEST, FRAME_FRAGMENT, FRAME_HELLO, FRAME_IDS, FRAME_NACK, FRAME_RECORD,
+    FRAME_WANT, HELLO_REPLY_REQUESTED, SYNC_PORTNUM_NAME, SyncProtocolError,
+    decode_frame, is_text_record, parse_text_record, record_digest, sync_peers
+)
+from sync_fanout import sync_fanout
+from sync_outbox import sync_outbox
+from sync_reconcile import handle_digest, handle_ids, handle_want, push_record, start_reconciliation
+from sync_transport import send_nack, sync_transport
+from utils import (
+    get_user_state, get_node_short_name, get_node_id_from_num, replay_outbox, send_message, send_sync_frame,
+    send_sync_hello, RecentIdCache
+)
+from worker_pool import get_worker_pool
 
 main_menu_handlers = {
     "q": handle_quick_help_command,
@@ -53,130 +71,220 @@ board_action_handlers = {
     "x": handle_help_command
 }
 
-def process_message(sender_id, message, interface, is_sync_message=False):
-    state = get_user_state(sender_id)
-    message_lower = message.lower().strip()
-    bbs_nodes = interface.bbs_nodes
+# unique_ids of sync records already handled, so peer resends are dropped before touching the database
+recent_sync_ids = RecentIdCache()
+record_tables = {"BULLETIN": "bulletins", "MAIL": "mail"}
+# Malformed sync frames dropped, per sending node
+dropped_sync_frames = Counter()
 
-    # Handle repeated characters for single character commands using a prefix
-    if len(message_lower) == 2 and message_lower[1] == 'x':
-        message_lower = message_lower[0]
+BUSY_MESSAGE = "The BBS is busy right now, please try again in a minute."
 
-    if is_sync_message:
-        if message.startswith("BULLETIN|"):
-            parts = message.split("|")
-            board, sender_short_name, subject, content, unique_id = parts[1], parts[2], parts[3], parts[4], parts[5]
-            add_bulletin(board, sender_short_name, subject, content, [], interface, unique_id=unique_id)
-
-            if board.lower() == "urgent":
-                notification_message = f"💥NEW URGENT BULLETIN💥\nFrom: {sender_short_name}\nTitle: {subject}"
-                send_message(notification_message, BROADCAST_NUM, interface)
-        elif message.startswith("MAIL|"):
-            parts = message.split("|")
-            sender_id, sender_short_name, recipient_id, subject, content, unique_id = parts[1], parts[2], parts[3], parts[4], parts[5], parts[6]
-            add_mail(sender_id, sender_short_name, recipient_id, subject, content, [], interface, unique_id=unique_id)
-        elif message.startswith("DELETE_BULLETIN|"):
-            unique_id = message.split("|")[1]
-            delete_bulletin(unique_id, [], interface)
-        elif message.startswith("DELETE_MAIL|"):
-            unique_id = message.split("|")[1]
-            logging.info(f"Processing delete mail with unique_id: {unique_id}")
-            recipient_id = get_recipient_id_by_mail(unique_id)
-            delete_mail(unique_id, recipient_id, [], interface)
-        elif message.startswith("CHANNEL|"):
-            parts = message.split("|")
-            channel_name, channel_url = parts[1], parts[2]
-            add_channel(channel_name, channel_url)
-    else:
-        if message_lower.startswith("sm,,"):
-            handle_send_mail_command(sender_id, message_lower, interface, bbs_nodes)
-        elif message_lower.startswith("cm"):
-            handle_check_mail_command(sender_id, interface)
-        elif message_lower.startswith("pb,,"):
-            handle_post_bulletin_command(sender_id, message_lower, interface, bbs_nodes)
-        elif message_lower.startswith("cb,,"):
-            handle_check_bulletin_command(sender_id, message_lower, interface)
-        elif message_lower.startswith("chp,,"):
-            handle_post_channel_command(sender_id, message_lower, interface)
-        elif message_lower.startswith("chl"):
-            handle_list_channels_command(sender_id, interface)
+
+def sync_record_key(kind, fields):
+    return (kind, fields[-1]) if kind in record_tables else (kind, fields)
+
+
+def is_duplicate_sync_record(kind, fields):
+    if recent_sync_ids.check_and_add(sync_record_key(kind, fields)):
+        return True
+    # Not seen since startup; the unique index lookup still catches older copies.
+    if kind in record_tables and record_exists(record_tables[kind], fields[-1]):
+        recent_sync_ids.count_duplicate()
+        return True
+    return False
+
+
+def process_sync_record(kind, fields, interface, sender_node_id=None):
+    if is_duplicate_sync_record(kind, fields):
+        logging.info(f"Ignoring duplicate sync message ({recent_sync_ids.duplicates_suppressed} suppressed so far)")
+        return
+
+    if kind in record_tables and is_tombstoned(record_tables[kind], fields[-1]):
+        logging.info(f"Ignoring {kind} {fields[-1]}, which has been deleted here")
+        if sender_node_id is not None:
+            # The sender missed the deletion; answer with the tombstone.
+            push_record(sender_node_id, record_tables[kind], fields[-1], interface)
+        return
+
+    # The record counts as seen from here on; if its write is dropped, let the next copy through.
+    key = sync_record_key(kind, fields)
+    forget = lambda: recent_sync_ids.discard(key)
+    try:
+        ingest_sync_record(kind, fields, forget)
+    except Exception:
+        forget()
+        raise
+
+    if kind == "BULLETIN" and fields[0].lower() == "urgent":
+        sender_short_name, subject = fields[1:3]
+        notification_message = f"💥NEW URGENT BULLETIN💥\nFrom: {sender_short_name}\nTitle: {subject}"
+        send_message(notification_message, BROADCAST_NUM, interface)
+
+
+def ingest_sync_record(kind, fields, on_error):
+    if kind == "BULLETIN":
+        board, sender_short_name, subject, content, unique_id = fields
+        ingest_bulletin(board, sender_short_name, subject, content, unique_id, on_error)
+    elif kind == "MAIL":
+        sender_id, sender_short_name, recipient_id, subject, content, unique_id = fields
+        ingest_mail(sender_id, sender_short_name, recipient_id, subject, content, unique_id, on_error)
+    elif kind == "DELETE_BULLETIN":
+        unique_id, = fields
+        logging.info(f"Processing delete bulletin with unique_id: {unique_id}")
+        ingest_delete_bulletin(unique_id, on_error)
+    elif kind == "DELETE_MAIL":
+        unique_id, = fields
+        logging.info(f"Processing delete mail with unique_id: {unique_id}")
+        ingest_delete_mail(unique_id, on_error)
+    elif kind == "CHANNEL":
+        channel_name, channel_url = fields
+        ingest_channel(channel_name, channel_url, on_error)
+    elif kind == "TOMBSTONE":
+        table, unique_id = fields
+        if table in record_tables.values():
+            ingest_tombstone(table, unique_id, on_error)
+
+
+def process_sync_frame(sender_node_id, payload, interface):
+    try:
+        frame_type, version, value = decode_frame(payload)
+    except SyncProtocolError as e:
+        dropped_sync_frames[sender_node_id] += 1
+        logging.error(f"Dropping malformed sync frame from {sender_node_id}: {e}")
+        return
+
+    if sync_peers.update(sender_node_id, version) is None:
+        logging.info(f"SERVER SYNC: {sender_node_id} speaks binary sync protocol v{version}")
+    if frame_type == FRAME_HELLO:
+        if value & HELLO_REPLY_REQUESTED:
+            send_sync_hello(sender_node_id, interface)
         else:
-            if state and state['command'] == 'MENU':
-                menu_name = state['menu']
-                if menu_name == 'bbs':
-                    handlers = bbs_menu_handlers
-                elif menu_name == 'utilities':
-                    handlers = utilities_menu_handlers
-                else:
-                    handlers = main_menu_handlers
-            elif state and state['command'] == 'BULLETIN_MENU':
-                handlers = bulletin_menu_handlers
-            elif state and state['command'] == 'BULLETIN_ACTION':
-                handlers = board_action_handlers
-            elif state and state['command'] == 'JS8CALL_MENU':
-                handle_js8call_steps(sender_id, message, state['step'], interface, state)
-                return
-            elif state and state['command'] == 'GROUP_MESSAGES':
-                handle_group_message_selection(sender_id, message, state['step'], state, interface)
-                return
-            else:
-                handlers = main_menu_handlers
+            # The peer answered our offer: catch up on anything missed while apart.
+            start_reconciliation(sender_node_id, interface)
+        # Either way the peer is (back) online; resume its outbox replay from its cursor.
+        replay_outbox(sender_node_id, interface, restart=True)
+    elif frame_type == FRAME_RECORD:
+        kind, fields = value
+        process_sync_record(kind, fields, interface, sender_node_id)
+        sync_fanout.queue_ack(sender_node_id, record_digest(kind, fields))
+    elif frame_type == FRAME_DIGEST:
+        handle_digest(sender_node_id, *value, interface)
+    elif frame_type == FRAME_IDS:
+        handle_ids(sender_node_id, *value, interface)
+    elif frame_type == FRAME_WANT:
+        handle_want(sender_node_id, *value, interface)
+    elif frame_type == FRAME_FRAGMENT:
+        msg_id = value[0]
+        frame, missing = sync_transport.receive(sender_node_id, *value)
+        if missing:
+            send_nack(sender_node_id, msg_id, missing, interface)
+        if frame is not None:
+            process_sync_frame(sender_node_id, frame, interface)
+    elif frame_type == FRAME_NACK:
+        msg_id, missing = value
+        for fragment in sync_transport.retransmit(sender_node_id, msg_id, missing):
+            send_sync_frame(sender_node_id, fragment, interface)
+    elif frame_type == FRAME_BROADCAST:
+        tag, frame = value
+        frame = sync_fanout.open(sender_node_id, tag, frame)
+        if frame is None:
+            return
+        try:
+            inner_type, _, record = decode_frame(frame)
+            if inner_type != FRAME_RECORD:
+                raise SyncProtocolError(f"Unexpected frame type {inner_type}")
+        except SyncProtocolError as e:
+            dropped_sync_frames[sender_node_id] += 1
+            logging.error(f"Dropping malformed sync broadcast from {sender_node_id}: {e}")
+            return
+        kind, fields = record
+        process_sync_record(kind, fields, interface, sender_node_id)
+        # Duplicates and records deleted here are ACKed too, or the sender would keep resending them.
+        sync_fanout.queue_ack(sender_node_id, record_digest(kind, fields))
+    elif frame_type == FRAME_ACK:
+        sync_fanout.handle_ack(sender_node_id, value)
+        if sync_outbox.handle_ack(sender_node_id, value):
+            replay_outbox(sender_node_id, interface)
 
-            if message_lower == 'x':
-                # Reset to main menu state
-                handle_help_command(sender_id, interface)
-                return
 
-            if message_lower in handlers:
-                if state and state['command'] in ['BULLETIN_ACTION', 'BULLETIN_READ', 'BULLETIN_POST', 'BULLETIN_POST_CONTENT']:
-                    handlers[message_lower](sender_id, interface, state)
-                else:
-                    handlers[message_lower](sender_id, interface)
-            elif state:
-                command = state['command']
-                step = state['step']
-
-                if command == 'MAIL':
-                    handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes)
-                elif command == 'BULLETIN':
-                    handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes)
-                elif command == 'STATS':
-                    handle_stats_steps(sender_id, message, step, interface)
-                elif command == 'CHANNEL_DIRECTORY':
-                    handle_channel_directory_steps(sender_id, message, step, state, interface)
-                elif command == 'CHECK_MAIL':
-                    if step == 1:
-                        handle_read_mail_command(sender_id, message, state, interface)
-                    elif step == 2:
-                        handle_delete_mail_confirmation(sender_id, message, state, interface, bbs_nodes)
-                elif command == 'CHECK_BULLETIN':
-                    if step == 1:
-                        handle_read_bulletin_command(sender_id, message, state, interface)
-                elif command == 'CHECK_CHANNEL':
-                    if step == 1:
-                        handle_read_channel_command(sender_id, message, state, interface)
-                elif command == 'LIST_CHANNELS':
-                    if step == 1:
-                        handle_read_channel_command(sender_id, message, state, interface)
-                elif command == 'BULLETIN_POST':
-                    handle_bb_steps(sender_id, message, 4, state, interface, bbs_nodes)
-                elif command == 'BULLETIN_POST_CONTENT':
-                    handle_bb_steps(sender_id, message, 5, state, interface, bbs_nodes)
-                elif command == 'BULLETIN_READ':
-                    handle_bb_steps(sender_id, message, 3, state, interface, bbs_nodes)
-                elif command == 'JS8CALL_MENU':
-                    handle_js8call_steps(sender_id, message, step, interface, state)
-                elif command == 'GROUP_MESSAGES':
-                    handle_group_message_selection(sender_id, message, step, state, interface)
-                else:
-                    handle_help_command(sender_id, interface)
-            else:
-                handle_help_command(sender_id, interface)
+def build_router():
+    router = CommandRouter(handle_help_command)
+
+    router.quick_command("sm,,", handle_send_mail_command)
+    router.quick_command("cm", lambda sender_id, message, interface, bbs_nodes:
+                         handle_check_mail_command(sender_id, interface))
+    router.quick_command("pb,,", handle_post_bulletin_command)
+    router.quick_command("cb,,", lambda sender_id, message, interface, bbs_nodes:
+                         handle_check_bulletin_command(sender_id, message, interface))
+    router.quick_command("chp,,", lambda sender_id, message, interface, bbs_nodes:
+                         handle_post_channel_command(sender_id, message, interface))
+    router.quick_command("chl", lambda sender_id, message, interface, bbs_nodes:
+                         handle_list_channels_command(sender_id, interface))
+
+    router.intercept('JS8CALL_MENU', lambda sender_id, message, state, interface:
+                     handle_js8call_steps(sender_id, message, state['step'], interface, state))
+    router.intercept('GROUP_MESSAGES', lambda sender_id, message, state, interface:
+                     handle_group_message_selection(sender_id, message, state['step'], state, interface))
+
+    router.default_menu = main_menu_handlers
+    router.menu('MENU', bbs_menu_handlers, menu='bbs')
+    router.menu('MENU', utilities_menu_handlers, menu='utilities')
+    router.menu('BULLETIN_MENU', bulletin_menu_handlers)
+    router.menu('BULLETIN_ACTION', board_action_handlers, with_state=True)
+
+    router.step('MAIL', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_mail_steps(sender_id, message, state['step'], state, interface, bbs_nodes))
+    router.step('BULLETIN', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_bb_steps(sender_id, message, state['step'], state, interface, bbs_nodes))
+    router.step('STATS', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_stats_steps(sender_id, message, state['step'], interface))
+    router.step('CHANNEL_DIRECTORY', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_channel_directory_steps(sender_id, message, state['step'], state, interface))
+    router.step('CHECK_MAIL', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_read_mail_command(sender_id, message, state, interface), step=1)
+    router.step('CHECK_MAIL', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_delete_mail_confirmation(sender_id, message, state, interface, bbs_nodes), step=2)
+    router.step('CHECK_BULLETIN', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_read_bulletin_command(sender_id, message, state, interface), step=1)
+    router.step('CHECK_CHANNEL', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_read_channel_command(sender_id, message, state, interface), step=1)
+    router.step('LIST_CHANNELS', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_read_channel_command(sender_id, message, state, interface), step=1)
+    router.step('BULLETIN_POST', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_bb_steps(sender_id, message, 4, state, interface, bbs_nodes))
+    router.step('BULLETIN_POST_CONTENT', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_bb_steps(sender_id, message, 5, state, interface, bbs_nodes))
+    router.step('BULLETIN_READ', lambda sender_id, message, state, interface, bbs_nodes:
+                handle_bb_steps(sender_id, message, 3, state, interface, bbs_nodes))
+    return router
+
+
+router = build_router()
+
+
+def process_message(sender_id, message, interface, is_sync_message=False):
+    if is_sync_message:
+        try:
+            kind, fields = parse_text_record(message)
+        except SyncProtocolError as e:
+            logging.error(f"Dropping malformed sync message: {e}")
+            return
+        process_sync_record(kind, fields, interface)
+    else:
+        router.dispatch(sender_id, message, get_user_state(sender_id), interface, interface.bbs_nodes)
 
 
 def on_receive(packet, interface):
     try:
-        if 'decoded' in packet and packet['decoded']['portnum'] == 'TEXT_MESSAGE_APP':
+        if 'decoded' in packet and packet['decoded']['portnum'] == SYNC_PORTNUM_NAME:
+            sender_node_id = packet['fromId']
+            if sender_node_id in interface.bbs_nodes:
+                payload = packet['decoded']['payload']
+                get_worker_pool(interface).submit(
+                    sender_node_id, lambda: process_sync_frame(sender_node_id, payload, interface))
+            else:
+                logging.info(f"Ignoring sync frame from non-BBS node {sender_node_id}")
+        elif 'decoded' in packet and packet['decoded']['portnum'] == 'TEXT_MESSAGE_APP':
             message_bytes = packet['decoded']['payload']
             message_string = message_bytes.decode('utf-8')
             sender_id = packet['from']
@@ -189,27 +297,20 @@ def on_receive(packet, interface):
             logging.info(f"Received message from user '{sender_short_name}' to {receiver_short_name}: {message_string}")
 
             bbs_nodes = interface.bbs_nodes
-            is_sync_message = any(message_string.startswith(prefix) for prefix in
-                                  ["BULLETIN|", "MAIL|", "DELETE_BULLETIN|", "DELETE_MAIL|"])
+            is_sync_message = is_text_record(message_string)
 
             if sender_node_id in bbs_nodes:
                 if is_sync_message:
-                    process_message(sender_id, message_string, interface, is_sync_message=True)
+                    get_worker_pool(interface).submit(
+                        sender_node_id, lambda: process_message(sender_id, message_string, interface, is_sync_message=True))
                 else:
                     logging.info("Ignoring non-sync message from known BBS node")
             elif to_id is not None and to_id != 0 and to_id != 255 and to_id == interface.myInfo.my_node_num:
-                process_message(sender_id, message_string, interface, is_sync_message=False)
+                # Dropped sync traffic is recovered by reconciliation; a user has to be told to retry.
+                get_worker_pool(interface).submit(
+                    sender_node_id, lambda: process_message(sender_id, message_string, interface),
+                    on_shed=lambda: send_message(BUSY_MESSAGE, sender_id, interface))
             else:
                 logging.info("Ignoring message sent to group chat or from unknown node")
     except KeyError as e:
         logging.error(f"Error processing packet: {e}")
-
-def get_recipient_id_by_mail(unique_id):
-    # Fix for Mail Delete sync issue
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT recipient FROM mail WHERE unique_id = ?", (unique_id,))
-    result = c.fetchone()
-    if result:
-        return result[0]
-    return None
@@ -0,0 +1,112 @@
+import threading
+
+from pubsub import pub
+
+directory_lock = threading.Lock()
+
+
+class NodeDirectory:
+    """Hash indexes over `interface.nodes` by node number, node id and lowercased short name.
+
+    The indexes are built once from `interface.nodes` and then kept current
+    from meshtastic's "meshtastic.node.updated" events and from NODEINFO
+    packets ("meshtastic.receive.user"), which meshtastic applies to its node
+    database in place without a node-updated event. A lookup by number or
+    id that misses still falls back to `interface.nodes`.
+    """
+
+    def __init__(self, interface):
+        self.interface = interface
+        self.by_num = {}
+        self.by_id = {}
+        self.by_short_name = {}
+        self.short_names = {}
+        self.lock = threading.Lock()
+        self.rebuild()
+
+    def rebuild(self):
+        nodes = list(self.interface.nodes.values()) if self.interface.nodes else []
+        with self.lock:
+            self.by_num.clear()
+            self.by_id.clear()
+            self.by_short_name.clear()
+            self.short_names.clear()
+            for node in nodes:
+                self._index(node)
+
+    def update(self, node):
+        with self.lock:
+            self._index(node)
+
+    def on_node_updated(self, node, interface):
+        if interface is self.interface:
+            self.update(node)
+
+    def on_user_packet(self, packet, interface):
+        if interface is not self.interface:
+            return
+        node = (getattr(self.interface, 'nodesByNum', None) or {}).get(packet.get('from'))
+        if node is not None:
+            self.update(node)
+
+    def _index(self, node):
+        user = node.get('user') or {}
+        node_id = user.get('id') or (f"!{node['num']:08x}" if 'num' in node else None)
+        if node_id is None:
+            return
+        self.by_id[node_id] = node
+        if 'num' in node:
+            self.by_num[node['num']] = node_id
+        # Meshtastic updates node dicts in place, so the name to unindex is the one recorded here.
+        short_name = (user.get('shortName') or '').lower()
+        previous = self.short_names.get(node_id)
+        if previous == short_name:
+            return
+        if previous:
+            node_ids = self.by_short_name.get(previous)
+            if node_ids is not None:
+                node_ids.discard(node_id)
+                if not node_ids:
+                    del self.by_short_name[previous]
+        if short_name:
+            self.by_short_name.setdefault(short_name, set()).add(node_id)
+            self.short_names[node_id] = short_name
+        else:
+            self.short_names.pop(node_id, None)
+
+    def id_from_num(self, node_num):
+        with self.lock:
+            node_id = self.by_num.get(node_num)
+        if node_id is None and isinstance(node_num, int):
+            node = (self.interface.nodes or {}).get(f"!{node_num:08x}")
+            if node is not None:
+                self.update(node)
+                node_id = f"!{node_num:08x}"
+        return node_id
+
+    def get(self, node_id):
+        with self.lock:
+            node = self.by_id.get(node_id)
+        if node is None:
+            node = (self.interface.nodes or {}).get(node_id)
+            if node is not None:
+                self.update(node)
+        return node
+
+    def find_short_name(self, short_name):
+        """Return (node_id, node) for every node whose short name matches, ignoring case."""
+        with self.lock:
+            return [(node_id, self.by_id[node_id]) for node_id in self.by_short_name.get(short_name.lower(), ())]
+
+
+def get_node_directory(interface):
+    directory = getattr(interface, 'node_directory', None)
+    if directory is None:
+        with directory_lock:
+            directory = getattr(interface, 'node_directory', None)
+            if directory is None:
+                directory = NodeDirectory(interface)
+                pub.subscribe(directory.on_node_updated, "meshtastic.node.updated")
+                pub.subscribe(directory.on_user_packet, "meshtastic.receive.user")
+                interface.node_directory = directory
+    return directory
@@ -0,0 +1,163 @@
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+
+from pubsub import pub
+
+stats_lock = threading.Lock()
+
+DEFAULT_WINDOWS = "24h,8h,1h"
+WINDOW_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_windows(value):
+    """Parse a comma-separated list such as "24h,8h,1h" into seconds."""
+    windows = []
+    for item in value.split(','):
+        match = re.fullmatch(r'\s*(\d+)\s*([smhd]?)\s*', item.lower())
+        if not match:
+            raise ValueError(f"Invalid stats window: {item!r}")
+        windows.append(int(match.group(1)) * WINDOW_UNITS[match.group(2) or 's'])
+    return windows
+
+
+def window_label(seconds):
+    for unit, name in ((86400, 'day'), (3600, 'hour'), (60, 'minute'), (1, 'second')):
+        # A single day still reads as "Last 24 hours".
+        if seconds % unit == 0 and (unit != 86400 or seconds > unit):
+            count = seconds // unit
+            return f"Last {name}" if count == 1 else f"Last {count} {name}s"
+
+
+class HeardWindow:
+    """Nodes heard within the last `seconds`.
+
+    Sightings go on a min-heap by time, so an update costs O(log n) in
+    whatever order it arrives (a node database replay is not sorted) and
+    expiry only pops from the top. A node heard again leaves its older entry
+    behind; it is skipped when it expires, and the heap is rebuilt from
+    `nodes` if such entries come to outnumber the live ones.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.nodes = {}
+        self.heap = []
+
+    def heard(self, node_id, last_heard):
+        self.nodes[node_id] = last_heard
+        heapq.heappush(self.heap, (last_heard, node_id))
+        if len(self.heap) > 2 * len(self.nodes) + 64:
+            self.heap = [(heard, node) for node, heard in self.nodes.items()]
+            heapq.heapify(self.heap)
+
+    def count(self, now):
+        cutoff = now - self.seconds
+        while self.heap and self.heap[0][0] < cutoff:
+            last_heard, node_id = heapq.heappop(self.heap)
+            if self.nodes.get(node_id) == last_heard:
+                del self.nodes[node_id]
+        return len(self.nodes)
+
+
+class NodeStats:
+    """Heard-node counts per time window and hardware model and role histograms.
+
+    Seeded from `interface.nodes` once, then kept current from received
+    packets and meshtastic's node-updated events, so answering the Stats
+    menu never walks the node list.
+    """
+
+    def __init__(self, interface, windows=None):
+        self.interface = interface
+        self.windows = [HeardWindow(seconds) for seconds in (windows or parse_windows(DEFAULT_WINDOWS))]
+        self.last_heard = {}
+        self.hw_models = Counter()
+        self.roles = Counter()
+        self.profiles = {}
+        self.lock = threading.Lock()
+
+        nodes = list(interface.nodes.values()) if interface.nodes else []
+        for node in sorted(nodes, key=lambda node: node.get('lastHeard') or 0):
+            self.update_node(node, interface)
+
+    @classmethod
+    def from_config(cls, interface, config):
+        return cls(interface, parse_windows(config.get('stats', 'windows', fallback=DEFAULT_WINDOWS)))
+
+    def update_node(self, node, interface):
+        if interface is not self.interface:
+            return
+        user = node.get('user') or {}
+        node_id = user.get('id') or (f"!{node['num']:08x}" if 'num' in node else None)
+        if node_id is None:
+            return
+        profile = (user.get('hwModel', 'Unknown'), user.get('role', 'Unknown'))
+        with self.lock:
+            previous = self.profiles.get(node_id)
+            if previous != profile:
+                if previous is not None:
+                    self._decrement(self.hw_models, previous[0])
+                    self._decrement(self.roles, previous[1])
+                self.hw_models[profile[0]] += 1
+                self.roles[profile[1]] += 1
+                self.profiles[node_id] = profile
+            self._heard(node_id, node.get('lastHeard') or 0)
+
+    def on_packet(self, packet, interface):
+        if interface is not self.interface:
+            return
+        node_id = packet.get('fromId')
+        if node_id is None:
+            return
+        with self.lock:
+            if node_id not in self.profiles:
+                self.profiles[node_id] = ('Unknown', 'Unknown')
+                self.hw_models['Unknown'] += 1
+                self.roles['Unknown'] += 1
+            self._heard(node_id, packet.get('rxTime') or int(time.time()))
+
+    def _heard(self, node_id, last_heard):
+        if last_heard < self.last_heard.get(node_id, 0):
+            return
+        self.last_heard[node_id] = last_heard
+        for window in self.windows:
+            if last_heard >= time.time() - window.seconds:
+                window.heard(node_id, last_heard)
+
+    @staticmethod
+    def _decrement(counter, key):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    def heard_counts(self):
+        """Return [(label, count)] for all time followed by each configured window."""
+        now = time.time()
+        with self.lock:
+            counts = [("All time", len(self.profiles))]
+            counts.extend((window_label(window.seconds), window.count(now)) for window in self.windows)
+        return counts
+
+    def hardware_models(self):
+        with self.lock:
+            return list(self.hw_models.items())
+
+    def role_counts(self):
+        with self.lock:
+            return list(self.roles.items())
+
+
+def get_node_stats(interface, config=None):
+    stats = getattr(interface, 'node_stats', None)
+    if stats is None:
+        with stats_lock:
+            stats = getattr(interface, 'node_stats', None)
+            if stats is None:
+                stats = NodeStats.from_config(interface, config) if config is not None else NodeStats(interface)
+                pub.subscribe(stats.update_node, "meshtastic.node.updated")
+                pub.subscribe(stats.on_packet, "meshtastic.receive")
+                interface.node_stats = stats
+    return stats
@@ -0,0 +1,96 @@
+import unicodedata
+from bisect import bisect_right
+
+try:
+    from meshtastic.protobuf.mesh_pb2 import Constants
+except ImportError:  # meshtastic < 2.4
+    from meshtastic.mesh_pb2 import Constants
+
+MAX_PAYLOAD_BYTES = Constants.DATA_PAYLOAD_LEN
+
+ZERO_WIDTH_JOINER = '\u200d'
+
+
+def is_regional_indicator(char):
+    return 0x1F1E6 <= ord(char) <= 0x1F1FF
+
+
+def extends_grapheme(char):
+    """True if `char` attaches to the character before it."""
+    code = ord(char)
+    return (
+        char == ZERO_WIDTH_JOINER
+        or 0xFE00 <= code <= 0xFE0F       # variation selectors
+        or 0xE0100 <= code <= 0xE01EF     # variation selectors supplement
+        or 0x1F3FB <= code <= 0x1F3FF     # emoji skin tone modifiers
+        or 0xE0020 <= code <= 0xE007F     # emoji tag sequences
+        or unicodedata.category(char) in ('Mn', 'Mc', 'Me')
+    )
+
+
+def is_grapheme_boundary(text, index):
+    """Approximate extended grapheme cluster boundary check between text[index - 1] and text[index].
+
+    Covers what shows up in mesh chat: combining marks, variation selectors,
+    skin tones, ZWJ emoji sequences, flags and CRLF.
+    """
+    if index <= 0 or index >= len(text):
+        return True
+    before, after = text[index - 1], text[index]
+    if before == '\r' and after == '\n':
+        return False
+    if before == ZERO_WIDTH_JOINER or extends_grapheme(after):
+        return False
+    if is_regional_indicator(before) and is_regional_indicator(after):
+        run = 0
+        while index - run - 1 >= 0 and is_regional_indicator(text[index - run - 1]):
+            run += 1
+        return run % 2 == 0
+    return True
+
+
+def pack_message(message, max_bytes=MAX_PAYLOAD_BYTES):
+    """Split `message` into as few packets as possible, each at most `max_bytes` of UTF-8.
+
+    Packets are filled greedily. Within the room left in a packet the split
+    prefers the point after the last line break, then after the last space,
+    and otherwise the last grapheme boundary, so multi-byte characters and
+    emoji sequences are never torn apart. Nothing is dropped: joining the
+    packets gives back `message` exactly. The length of the returned list is
+    the packet count.
+    """
+    offsets = [0]
+    for char in message:
+        offsets.append(offsets[-1] + len(char.encode('utf-8')))
+
+    packets = []
+    start = 0
+    length = len(message)
+    while start < length:
+        if offsets[length] - offsets[start] <= max_bytes:
+            packets.append(message[start:])
+            break
+
+        # Largest character index `limit` such that message[start:limit] fits.
+        limit = bisect_right(offsets, offsets[start] + max_bytes) - 1
+        end = split_point(message, start, limit, offsets, max_bytes)
+        packets.append(message[start:end])
+        start = end
+    return packets
+
+
+def split_point(message, start, limit, offsets, max_bytes):
+    # A separator only wins if it leaves the packet at least half full;
+    # otherwise splitting mid-line costs fewer packets overall.
+    min_fill = offsets[start] + max_bytes // 2
+    for separator in ('\n', ' '):
+        # The separator stays at the end of this packet, so it must fit too.
+        index = message.rfind(separator, start, limit)
+        if index != -1 and offsets[index + 1] >= min_fill and is_grapheme_boundary(message, index + 1):
+            return index + 1
+
+    for end in range(limit, start, -1):
+        if is_grapheme_boundary(message, end):
+            return end
+    # A single grapheme larger than a packet: fall back to a code point boundary.
+    return max(limit, start + 1)
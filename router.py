@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+
+
+class PrefixTrie:
+    """Maps string prefixes to values; a lookup walks the message once and returns the longest match."""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, prefix, value):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = value
+
+    def longest_match(self, text):
+        node = self.root
+        match = node.get(None)
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                match = node[None]
+        return match
+
+
+class CommandRouter:
+    """Routes a user message to its handler through registered tables instead of an if/elif chain.
+
+    In order of precedence a message is matched against:
+
+    - quick commands, by prefix, whatever state the user is in;
+    - interceptors, which take every message while the user is in their state;
+    - the menu for the user's state (or the main menu), by exact key;
+    - the step handler registered for the state's (command, step), falling
+      back to one registered for the command with any step.
+
+    Every dispatch is timed; `timings()` reports the count and total time
+    spent per route.
+    """
+
+    def __init__(self, help_handler):
+        self.help_handler = help_handler
+        self.quick_commands = PrefixTrie()
+        self.interceptors = {}
+        self.menus = {}
+        self.default_menu = {}
+        self.steps = {}
+        self.commands = set()
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def quick_command(self, prefix, handler):
+        """handler(sender_id, message_lower, interface, bbs_nodes)"""
+        self.quick_commands.insert(prefix, (f"quick:{prefix}", handler))
+
+    def intercept(self, command, handler):
+        """handler(sender_id, message, state, interface)"""
+        self.interceptors[command] = handler
+
+    def menu(self, command, handlers, menu=None, with_state=False):
+        """Register the key -> handler table shown while in `command` (and `menu`, for MENU states)."""
+        self.menus[(command, menu)] = (handlers, with_state)
+
+    def step(self, command, handler, step=None):
+        """handler(sender_id, message, state, interface, bbs_nodes); `step=None` matches any step."""
+        self.steps[(command, step)] = handler
+        self.commands.add(command)
+
+    def resolve(self, sender_id, message, state, interface, bbs_nodes):
+        """Return (route name, zero-argument callable) for a message."""
+        message_lower = message.lower().strip()
+        # Handle repeated characters for single character commands using a prefix
+        if len(message_lower) == 2 and message_lower[1] == 'x':
+            message_lower = message_lower[0]
+
+        quick = self.quick_commands.longest_match(message_lower)
+        if quick is not None:
+            name, handler = quick
+            return name, lambda: handler(sender_id, message_lower, interface, bbs_nodes)
+
+        command = state['command'] if state else None
+        interceptor = self.interceptors.get(command)
+        if interceptor is not None:
+            return command, lambda: interceptor(sender_id, message, state, interface)
+
+        handlers, with_state = self.menus.get((command, state.get('menu') if state else None),
+                                              (self.default_menu, False))
+        if message_lower == 'x':
+            # Reset to main menu state
+            return 'exit', lambda: self.help_handler(sender_id, interface)
+        if message_lower in handlers:
+            handler = handlers[message_lower]
+            if with_state:
+                return f"menu:{message_lower}", lambda: handler(sender_id, interface, state)
+            return f"menu:{message_lower}", lambda: handler(sender_id, interface)
+
+        if state is None:
+            return 'help', lambda: self.help_handler(sender_id, interface)
+        step = state.get('step')
+        handler = self.steps.get((command, step)) or self.steps.get((command, None))
+        if handler is not None:
+            return f"{command}:{step}", lambda: handler(sender_id, message, state, interface, bbs_nodes)
+        if command in self.commands:
+            # A known command at a step that takes no input.
+            return f"{command}:{step}", lambda: None
+        return 'help', lambda: self.help_handler(sender_id, interface)
+
+    def dispatch(self, sender_id, message, state, interface, bbs_nodes):
+        name, route = self.resolve(sender_id, message, state, interface, bbs_nodes)
+        start = time.perf_counter()
+        try:
+            route()
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.stats_lock:
+                count, total = self.stats.get(name, (0, 0.0))
+                self.stats[name] = (count + 1, total + elapsed)
+            logging.debug(f"DISPATCH {name} for {sender_id} took {elapsed * 1000:.1f} ms")
+
+    def timings(self):
+        """Return {route: (dispatch count, total seconds)}."""
+        with self.stats_lock:
+            return dict(self.stats)
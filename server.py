@@ -13,13 +13,26 @@ other BBS servers listed in the config.ini file.
 """
 
 import logging
-import time
 
 from config_init import initialize_config, get_interface, init_cli_parser, merge_config
-from db_operations import initialize_database
-from js8call_integration import JS8CallClient
-from message_processing import on_receive
+from db_connection import close_all
+from db_operations import initialize_database, sync_writer
+from event_loop import EventLoopCore
+from js8call_integration import JS8CallClient, JS8CallSupervisor
+from message_processing import on_receive, router
+from node_directory import get_node_directory
+from node_stats import get_node_stats
 from pubsub import pub
+from session_store import user_sessions
+from sync_fanout import sync_fanout
+from sync_outbox import sync_outbox
+from sync_protocol import sync_peers
+from sync_reconcile import Reconciler
+from sync_transport import sync_transport
+from telemetry_store import get_telemetry_history
+from transmit import get_transmit_scheduler
+from utils import replay_outbox, send_sync_hello
+from worker_pool import get_worker_pool
 
 # General logging
 logging.basicConfig(
@@ -37,6 +50,13 @@ js8call_formatter = logging.Formatter('%(asctime)s - JS8Call - %(levelname)s - %
 js8call_handler.setFormatter(js8call_formatter)
 js8call_logger.addHandler(js8call_handler)
 
+# Seconds a peer has to answer the sync HELLO before it is treated as text-only.
+HELLO_GRACE_PERIOD = 120
+# Seconds between pruning of delivered sync operations and expired sessions.
+RETENTION_INTERVAL = 3600
+# Seconds between log lines summarising queue depths and dispatch times.
+STATS_INTERVAL = 900
+
 def display_banner():
     banner = """
 ████████╗ ██████╗██████╗       ██████╗ ██████╗ ███████╗
@@ -62,32 +82,77 @@ def main():
     interface = get_interface(system_config)
     interface.bbs_nodes = system_config['bbs_nodes']
     interface.allowed_nodes = system_config['allowed_nodes']
+    core = EventLoopCore()
+    tx_scheduler = get_transmit_scheduler(interface, system_config['config'], core)
+    get_node_directory(interface)
+    get_node_stats(interface, system_config['config'])
 
     logging.info(f"TC²-BBS is running on {system_config['interface_type']} interface...")
 
     initialize_database()
-
-    def receive_packet(packet, interface):
-        on_receive(packet, interface)
-
-    pub.subscribe(receive_packet, system_config['mqtt_topic'])
+    telemetry_history = get_telemetry_history(interface, system_config['config'])
+    user_sessions.configure(system_config['config'])
+    worker_pool = get_worker_pool(interface, system_config['config'])
+    sync_outbox.register_peers(interface.bbs_nodes)
+
+    # Packets arrive on meshtastic's threads; on_receive runs on the event loop.
+    receive_listener = core.bridge(on_receive)
+    pub.subscribe(receive_listener, system_config['mqtt_topic'])
+
+    # Offer the binary sync protocol to every peer; peers that never answer keep getting text.
+    for node_id in interface.bbs_nodes:
+        send_sync_hello(node_id, interface, reply_requested=True)
+
+    def replay_to_text_peers():
+        # Binary peers are replayed when they answer the HELLO; the rest only understand text.
+        for node_id in interface.bbs_nodes:
+            if not sync_peers.supports_binary(node_id):
+                replay_outbox(node_id, interface, restart=True)
+
+    def apply_retention():
+        sync_outbox.prune()
+        user_sessions.expire()
+
+    def log_stats():
+        logging.info(f"STATS transmit={tx_scheduler.throttle_state()} workers={worker_pool.stats()} "
+                     f"sessions={len(user_sessions)}")
+        if js8call_supervisor.task is not None:
+            logging.info(f"STATS js8call={js8call_supervisor.health()}")
+        for route, (count, total) in sorted(router.timings().items()):
+            logging.info(f"STATS dispatch {route}: {count} in {total:.2f}s")
+
+    core.call_later(HELLO_GRACE_PERIOD, replay_to_text_peers, 'sync-catch-up')
+    core.every(RETENTION_INTERVAL, apply_retention, 'retention')
+    core.every(STATS_INTERVAL, log_stats, 'stats')
+
+    sync_transport.start(core, interface)
+    sync_fanout.configure(system_config['config'])
+    sync_fanout.start(core, interface)
+    Reconciler.from_config(interface, system_config['config']).start(core)
 
     # Initialize and start JS8Call Client if configured
     js8call_client = JS8CallClient(interface)
     js8call_client.logger = js8call_logger
+    js8call_supervisor = JS8CallSupervisor.from_config(js8call_client)
 
-    if js8call_client.db_conn:
-        js8call_client.connect()
+    if js8call_client.db:
+        js8call_supervisor.start(core)
 
     try:
-        while True:
-            time.sleep(1)
+        core.run()
 
     except KeyboardInterrupt:
         logging.info("Shutting down the server...")
+        worker_pool.stop(timeout=10)
+        js8call_supervisor.stop()
+        # Let the transmit task drain the queues before the loop's tasks are cancelled.
+        core.shutdown(lambda: tx_scheduler.flush(timeout=10))
+        tx_scheduler.stop()
         interface.close()
-        if js8call_client.connected:
-            js8call_client.close()
+        sync_writer.stop()
+        telemetry_history.close()
+        user_sessions.close()
+        close_all()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,160 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from db_connection import get_connection_manager, WriteBehindQueue
+
+SESSION_FIELDS = (
+    'menu', 'board', 'board_name', 'subject', 'content', 'listing', 'groups', 'channel_name',
+    'first_id', 'last_id', 'mail_ids', 'bulletin_ids', 'channel_ids', 'node_nums',
+    'mail_id', 'unique_id', 'recipient_id', 'reply_to_mail_id'
+)
+
+
+class Session:
+    """One user's position in the menus, readable and writable like the dict it replaces.
+
+    Only `command`, `step` and the names in SESSION_FIELDS can be set, and
+    handlers are expected to keep row ids rather than rows in them.
+    """
+
+    __slots__ = ('command', 'step', 'last_seen') + SESSION_FIELDS
+
+    def __init__(self, state, last_seen=None):
+        self.last_seen = time.time() if last_seen is None else last_seen
+        for key, value in state.items():
+            self[key] = value
+
+    def _check(self, key):
+        if key == 'last_seen' or key not in self.__slots__:
+            raise KeyError(key)
+
+    def __getitem__(self, key):
+        self._check(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        self._check(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key != 'last_seen' and key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key in self.__slots__ if key in self]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"Session({self.to_dict()!r})"
+
+
+class SessionStore:
+    """User sessions with an idle timeout and a cap on how many are kept.
+
+    Sessions are held least recently used first, so expiry and eviction only
+    ever look at the front. With `persist` enabled every change is also
+    written to the `user_sessions` table through a write-behind queue, and
+    unexpired sessions are loaded back at startup.
+    """
+
+    def __init__(self, ttl=1800, max_sessions=500):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.writer = None
+        self.lock = threading.Lock()
+
+    def configure(self, config, db_path='bulletins.db'):
+        section = 'sessions'
+        self.ttl = config.getint(section, 'ttl', fallback=1800)
+        self.max_sessions = config.getint(section, 'max_sessions', fallback=500)
+        if config.getboolean(section, 'persist', fallback=False):
+            self.writer = WriteBehindQueue(get_connection_manager(db_path))
+            self.load()
+
+    def load(self):
+        cutoff = time.time() - self.ttl
+        with self.writer.manager.connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT user_id, state, last_seen FROM user_sessions WHERE last_seen >= ? ORDER BY last_seen",
+                      (cutoff,))
+            rows = c.fetchall()
+            c.execute("DELETE FROM user_sessions WHERE last_seen < ?", (cutoff,))
+            conn.commit()
+        with self.lock:
+            for user_id, state, last_seen in rows:
+                try:
+                    self.sessions[user_id] = Session(json.loads(state), last_seen)
+                except (ValueError, KeyError) as e:
+                    logging.error(f"Discarding unreadable session for {user_id}: {e}")
+            self._evict(time.time())
+        logging.info(f"Restored {len(self.sessions)} user session(s)")
+
+    def get(self, user_id):
+        now = time.time()
+        with self.lock:
+            self._evict(now)
+            session = self.sessions.get(user_id)
+            if session is not None:
+                session.last_seen = now
+                self.sessions.move_to_end(user_id)
+            return session
+
+    def set(self, user_id, state):
+        now = time.time()
+        with self.lock:
+            if state is None:
+                if self.sessions.pop(user_id, None) is not None:
+                    self._forget(user_id)
+                return
+            session = state if isinstance(state, Session) else Session(state, now)
+            session.last_seen = now
+            self.sessions[user_id] = session
+            self.sessions.move_to_end(user_id)
+            if self.writer is not None:
+                self.writer.submit("INSERT OR REPLACE INTO user_sessions (user_id, state, last_seen) VALUES (?, ?, ?)",
+                                   (user_id, json.dumps(session.to_dict()), now))
+            self._evict(now)
+
+    def expire(self):
+        with self.lock:
+            self._evict(time.time())
+
+    def _evict(self, now):
+        cutoff = now - self.ttl
+        while self.sessions:
+            user_id, session = next(iter(self.sessions.items()))
+            if session.last_seen >= cutoff and len(self.sessions) <= self.max_sessions:
+                break
+            del self.sessions[user_id]
+            self._forget(user_id)
+
+    def _forget(self, user_id):
+        if self.writer is not None:
+            self.writer.submit("DELETE FROM user_sessions WHERE user_id = ?", (user_id,))
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.stop()
+
+
+user_sessions = SessionStore()
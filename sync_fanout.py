@@ -0,0 +1,126 @@
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from meshtastic import BROADCAST_NUM
+
+from packing import MAX_PAYLOAD_BYTES
+from sync_protocol import RECORD_DIGEST_LEN, broadcast_tag, encode_ack, encode_broadcast, record_digest
+from sync_transport import send_frame
+
+# Version, frame type and a one or two byte count ahead of the digests.
+MAX_ACKS_PER_FRAME = (MAX_PAYLOAD_BYTES - 4) // RECORD_DIGEST_LEN
+
+
+class PendingDelivery:
+    __slots__ = ('kind', 'frame', 'peers', 'sent_at')
+
+    def __init__(self, kind, frame, peers, sent_at):
+        self.kind = kind
+        self.frame = frame
+        self.peers = peers
+        self.sent_at = sent_at
+
+
+class SyncFanout:
+    """Sends each sync record once, as a broadcast, to every peer that shares the sync key.
+
+    A BROADCAST frame carries a short HMAC tag of the record under the shared
+    `[sync] sync_key`, so peers drop broadcasts from BBS networks they do not
+    belong to. Receivers ACK the record digests in batches every `ack_delay`
+    seconds; a peer that has not ACKed a record within `ack_timeout` seconds
+    gets a unicast copy instead. Without a key, or with fewer than
+    `min_peers` binary peers, records keep going to each peer separately.
+    """
+
+    def __init__(self, key=None, channel_index=0, ack_delay=15.0, ack_timeout=600.0, min_peers=2,
+                 max_pending=512):
+        self.key = key.encode('utf-8') if key else None
+        self.channel_index = channel_index
+        self.ack_delay = ack_delay
+        self.ack_timeout = ack_timeout
+        self.min_peers = min_peers
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.acks = {}
+        self.lock = threading.Lock()
+
+    def configure(self, config):
+        section = 'sync'
+        key = config.get(section, 'sync_key', fallback='')
+        self.key = key.encode('utf-8') if key else None
+        self.channel_index = config.getint(section, 'sync_channel', fallback=0)
+        self.ack_timeout = config.getfloat(section, 'ack_timeout', fallback=600.0)
+
+    def enabled(self, peers):
+        return self.key is not None and len(peers) >= self.min_peers
+
+    def broadcast(self, kind, fields, frame, peers, interface):
+        digest = record_digest(kind, fields)
+        with self.lock:
+            self.pending[digest] = PendingDelivery(kind, frame, set(peers), time.monotonic())
+            self.pending.move_to_end(digest)
+            while len(self.pending) > self.max_pending:
+                # Reconciliation still recovers whatever the evicted record's stragglers miss.
+                self.pending.popitem(last=False)
+        logging.info(f"SERVER SYNC: Broadcasting {kind} record to {len(peers)} peers")
+        send_frame(BROADCAST_NUM, encode_broadcast(self.key, frame), interface, self.channel_index)
+
+    def open(self, sender, tag, frame):
+        """Return the frame inside a broadcast if its tag matches our key, else None."""
+        if self.key is None:
+            logging.info(f"Ignoring sync broadcast from {sender}: no sync_key configured")
+            return None
+        if not hmac.compare_digest(tag, broadcast_tag(self.key, frame)):
+            logging.info(f"Ignoring sync broadcast from {sender} signed with a different sync_key")
+            return None
+        return frame
+
+    def queue_ack(self, sender, digest):
+        # Every binary record is ACKed, broadcast or unicast; the sender also advances its outbox cursor on them.
+        with self.lock:
+            self.acks.setdefault(sender, []).append(digest)
+
+    def handle_ack(self, sender, digests):
+        with self.lock:
+            for digest in digests:
+                delivery = self.pending.get(digest)
+                if delivery is None:
+                    continue
+                delivery.peers.discard(sender)
+                if not delivery.peers:
+                    del self.pending[digest]
+
+    def start(self, core, interface):
+        core.every(self.ack_delay, lambda: self.maintain(interface), 'sync-fanout')
+
+    def maintain(self, interface):
+        self.send_acks(interface)
+        self.resend_overdue(interface)
+
+    def send_acks(self, interface):
+        with self.lock:
+            acks, self.acks = self.acks, {}
+        for sender, digests in acks.items():
+            for start in range(0, len(digests), MAX_ACKS_PER_FRAME):
+                send_frame(sender, encode_ack(digests[start:start + MAX_ACKS_PER_FRAME]), interface)
+
+    def resend_overdue(self, interface, now=None):
+        now = time.monotonic() if now is None else now
+        overdue = []
+        with self.lock:
+            while self.pending:
+                digest, delivery = next(iter(self.pending.items()))
+                if now - delivery.sent_at < self.ack_timeout:
+                    break
+                del self.pending[digest]
+                overdue.append(delivery)
+        for delivery in overdue:
+            for node_id in sorted(delivery.peers):
+                logging.info(f"SERVER SYNC: {node_id} did not ACK a broadcast {delivery.kind} record, resending")
+                send_frame(node_id, delivery.frame, interface)
+
+
+sync_fanout = SyncFanout()
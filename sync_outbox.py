@@ -0,0 +1,140 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from db_connection import get_connection_manager
+from sync_protocol import record_digest
+
+
+def record_operation(c, kind, fields):
+    """Append a replicated operation to the outbox on cursor `c`, inside the caller's transaction."""
+    c.execute("INSERT INTO sync_outbox (kind, fields, created_at) VALUES (?, ?, ?)",
+              (kind, json.dumps([str(value) for value in fields]), datetime.now().strftime('%Y-%m-%d %H:%M')))
+    return c.lastrowid
+
+
+class SyncOutbox:
+    """Delivery cursors of the peer BBS nodes over the persistent sync outbox.
+
+    Every replicated operation is written to `sync_outbox` in the same
+    transaction as the change itself. Each peer's cursor is the highest
+    outbox id it is known to have received: for binary peers every id up to
+    it has been ACKed, for text-only peers it has been sent. A peer that
+    comes back (answers or sends a HELLO) is replayed everything after its
+    cursor, `batch_size` operations at a time, the next batch going out once
+    the previous one has been ACKed.
+    """
+
+    def __init__(self, db_path='bulletins.db', batch_size=20, max_unacked=500, retention_days=30):
+        self.manager = get_connection_manager(db_path)
+        self.batch_size = batch_size
+        self.max_unacked = max_unacked
+        self.retention_days = retention_days
+        self.cursors = {}
+        self.unacked = {}
+        self.sent = {}
+        self.replaying = set()
+        self.lock = threading.RLock()
+
+    def register_peers(self, node_ids):
+        """Start new peers at the current end of the outbox and load every peer's cursor."""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M')
+        with self.lock, self.manager.connection() as conn:
+            c = conn.cursor()
+            for node_id in node_ids:
+                c.execute("INSERT OR IGNORE INTO sync_cursors (node_id, last_id, updated_at) "
+                          "SELECT ?, COALESCE(MAX(id), 0), ? FROM sync_outbox", (node_id, now))
+            conn.commit()
+            c.execute("SELECT node_id, last_id FROM sync_cursors")
+            self.cursors = {node_id: last_id for node_id, last_id in c.fetchall() if node_id in node_ids}
+            self.sent = dict(self.cursors)
+        self.prune()
+
+    def prune(self):
+        """Drop operations every peer has received, and any older than `retention_days`."""
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime('%Y-%m-%d %H:%M')
+        with self.lock:
+            floor = min(self.cursors.values(), default=None)
+        with self.manager.connection() as conn:
+            c = conn.cursor()
+            if floor is not None:
+                c.execute("DELETE FROM sync_outbox WHERE id <= ? OR created_at < ?", (floor, cutoff))
+            else:
+                c.execute("DELETE FROM sync_outbox WHERE created_at < ?", (cutoff,))
+            conn.commit()
+
+    def track(self, node_id, outbox_id, kind, fields):
+        """Remember an operation sent to a binary peer until the peer ACKs it."""
+        with self.lock:
+            if node_id not in self.cursors:
+                return
+            unacked = self.unacked.setdefault(node_id, OrderedDict())
+            if len(unacked) >= self.max_unacked:
+                # Untracked operations stay behind the cursor and go out again on the next replay.
+                return
+            unacked[record_digest(kind, fields)] = outbox_id
+            # Only an unbroken run of operations can move the cursor; anything
+            # sent past a gap is replayed once the gap has been filled.
+            if outbox_id == self.sent[node_id] + 1:
+                self.sent[node_id] = outbox_id
+
+    def mark_sent(self, node_id, outbox_id):
+        """Advance a text-only peer's cursor; it cannot acknowledge anything."""
+        with self.lock:
+            if node_id in self.cursors and outbox_id == self.cursors[node_id] + 1:
+                self.sent[node_id] = outbox_id
+                self._save_cursor(node_id, outbox_id)
+
+    def handle_ack(self, node_id, digests):
+        """Advance the peer's cursor; return True when its replay is ready for the next batch."""
+        with self.lock:
+            unacked = self.unacked.get(node_id)
+            if not unacked:
+                return False
+            if not [unacked.pop(digest) for digest in digests if digest in unacked]:
+                return False
+            sent = self.sent[node_id]
+            oldest = min(unacked.values(), default=sent + 1)
+            delivered = min(sent, oldest - 1)
+            if delivered > self.cursors[node_id]:
+                self._save_cursor(node_id, delivered)
+            return node_id in self.replaying and oldest > sent
+
+    def next_batch(self, node_id, restart=False):
+        """Return the next (outbox_id, kind, fields) operations to replay to a peer.
+
+        `restart` begins a new replay from the peer's cursor; otherwise an
+        ongoing replay continues where its previous batch ended.
+        """
+        with self.lock:
+            if node_id not in self.cursors:
+                return []
+            if restart:
+                self.unacked.pop(node_id, None)
+                self.sent[node_id] = self.cursors[node_id]
+            elif node_id not in self.replaying:
+                return []
+            with self.manager.connection() as conn:
+                c = conn.cursor()
+                c.execute("SELECT id, kind, fields FROM sync_outbox WHERE id > ? ORDER BY id LIMIT ?",
+                          (self.sent[node_id], self.batch_size))
+                rows = [(outbox_id, kind, tuple(json.loads(fields))) for outbox_id, kind, fields in c.fetchall()]
+            if rows:
+                self.replaying.add(node_id)
+            elif node_id in self.replaying:
+                self.replaying.discard(node_id)
+                self.prune()
+            return rows
+
+    def _save_cursor(self, node_id, last_id):
+        self.cursors[node_id] = last_id
+        with self.manager.connection() as conn:
+            conn.execute("UPDATE sync_cursors SET last_id = ?, updated_at = ? WHERE node_id = ?",
+                         (last_id, datetime.now().strftime('%Y-%m-%d %H:%M'), node_id))
+            conn.commit()
+        logging.debug(f"SERVER SYNC: {node_id} has received the outbox up to {last_id}")
+
+
+sync_outbox = SyncOutbox()
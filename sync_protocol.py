@@ -0,0 +1,445 @@
+import hashlib
+import hmac
+import re
+import threading
+import uuid
+import zlib
+
+try:
+    from meshtastic.protobuf import portnums_pb2
+except ImportError:  # meshtastic < 2.4
+    from meshtastic import portnums_pb2
+
+# Binary sync frames travel on their own port so they never show up as chat text.
+SYNC_PORTNUM = portnums_pb2.PortNum.PRIVATE_APP
+SYNC_PORTNUM_NAME = portnums_pb2.PortNum.Name(SYNC_PORTNUM)
+
+PROTOCOL_VERSION = 1
+
+FRAME_HELLO = 1
+FRAME_RECORD = 2
+FRAME_DIGEST = 3
+FRAME_IDS = 4
+FRAME_WANT = 5
+FRAME_FRAGMENT = 6
+FRAME_NACK = 7
+FRAME_BROADCAST = 8
+FRAME_ACK = 9
+
+HELLO_REPLY_REQUESTED = 0x01
+RECORD_COMPRESSED = 0x01
+
+# Field layout of every replicated record, shared by the text and binary encodings.
+RECORD_SCHEMAS = {
+    "BULLETIN": ('str', 'str', 'str', 'str', 'uuid'),           # board, sender_short_name, subject, content, unique_id
+    "MAIL": ('node', 'str', 'node', 'str', 'str', 'uuid'),      # sender, sender_short_name, recipient, subject, content, unique_id
+    "DELETE_BULLETIN": ('uuid',),                               # unique_id
+    "DELETE_MAIL": ('uuid',),                                   # unique_id
+    "CHANNEL": ('str', 'str'),                                  # name, url
+    "TOMBSTONE": ('str', 'uuid'),                               # table, unique_id
+}
+RECORD_TYPES = {"BULLETIN": 1, "MAIL": 2, "DELETE_BULLETIN": 3, "DELETE_MAIL": 4, "CHANNEL": 5, "TOMBSTONE": 6}
+RECORD_KINDS = {number: kind for kind, number in RECORD_TYPES.items()}
+
+# Tables kept consistent by anti-entropy reconciliation, by their code on the wire.
+SYNC_TABLES = {1: 'bulletins', 2: 'mail'}
+SYNC_TABLE_CODES = {table: code for code, table in SYNC_TABLES.items()}
+DIGEST_FANOUT = 16
+# State of an id in digests and IDS frames, so a record live on one node and tombstoned on another differs.
+ID_LIVE = 0
+ID_DELETED = 1
+
+# version, frame type, message id (2 bytes), sequence number, fragment count
+FRAGMENT_HEADER_LEN = 6
+MAX_FRAGMENTS = 255
+
+BROADCAST_TAG_LEN = 4
+RECORD_DIGEST_LEN = 8
+
+NODE_ID_PATTERN = re.compile(r'^![0-9a-f]{8}$')
+COMPRESSION_THRESHOLD = 48
+# Largest record body accepted after decompression, so a small compressed frame cannot expand without bound.
+MAX_RECORD_BYTES = 256 * 1024
+
+
+class SyncProtocolError(ValueError):
+    pass
+
+
+def format_text_record(kind, fields):
+    return "|".join((kind,) + tuple(fields))
+
+
+def is_text_record(message):
+    kind, separator, _ = message.partition("|")
+    return bool(separator) and kind in RECORD_SCHEMAS
+
+
+def parse_text_record(message):
+    """Split a pipe-delimited sync message into (kind, fields).
+
+    The unique_id is always the last field, so a `|` inside bulletin or mail
+    content no longer shifts the fields after it.
+    """
+    kind, _, rest = message.partition("|")
+    schema = RECORD_SCHEMAS.get(kind)
+    if schema is None:
+        raise SyncProtocolError(f"Unknown sync record type: {kind}")
+    if len(schema) > 1 and schema[-1] == 'uuid':
+        rest, _, unique_id = rest.rpartition("|")
+        fields = rest.split("|", len(schema) - 2) + [unique_id]
+    else:
+        fields = rest.split("|", len(schema) - 1)
+    if len(fields) != len(schema):
+        raise SyncProtocolError(f"Malformed {kind} sync record")
+    return kind, tuple(fields)
+
+
+def encode_varint(value, out):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def decode_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data) or shift > 63:
+            raise SyncProtocolError("Truncated varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_str(value, out):
+    raw = value.encode('utf-8')
+    encode_varint(len(raw), out)
+    out += raw
+
+
+def decode_str(data, offset):
+    length, offset = decode_varint(data, offset)
+    end = offset + length
+    if end > len(data):
+        raise SyncProtocolError("Truncated string")
+    try:
+        return bytes(data[offset:end]).decode('utf-8'), end
+    except UnicodeDecodeError as e:
+        raise SyncProtocolError(f"Invalid UTF-8 in string field: {e}") from e
+
+
+def encode_field(field_type, value, out):
+    # uuid and node fields carry a one-byte tag: 0 for the compact binary form,
+    # 1 for a plain string when the value does not have the usual shape.
+    if field_type == 'uuid':
+        try:
+            parsed = uuid.UUID(value)
+        except ValueError:
+            parsed = None
+        if parsed is not None and str(parsed) == value:
+            out.append(0)
+            out += parsed.bytes
+            return
+    elif field_type == 'node':
+        if NODE_ID_PATTERN.match(value):
+            out.append(0)
+            out += int(value[1:], 16).to_bytes(4, 'little')
+            return
+    else:
+        encode_str(value, out)
+        return
+    out.append(1)
+    encode_str(value, out)
+
+
+def decode_field(field_type, data, offset):
+    if field_type == 'str':
+        return decode_str(data, offset)
+    if offset >= len(data):
+        raise SyncProtocolError("Truncated field")
+    tag = data[offset]
+    offset += 1
+    if tag == 1:
+        return decode_str(data, offset)
+    if tag != 0:
+        raise SyncProtocolError(f"Unknown field tag {tag}")
+    if field_type == 'uuid':
+        if offset + 16 > len(data):
+            raise SyncProtocolError("Truncated uuid")
+        try:
+            return str(uuid.UUID(bytes=bytes(data[offset:offset + 16]))), offset + 16
+        except ValueError as e:
+            raise SyncProtocolError(f"Invalid uuid: {e}") from e
+    if offset + 4 > len(data):
+        raise SyncProtocolError("Truncated node id")
+    return f"!{int.from_bytes(data[offset:offset + 4], 'little'):08x}", offset + 4
+
+
+def encode_hello(reply_requested=False):
+    return bytes([PROTOCOL_VERSION, FRAME_HELLO, HELLO_REPLY_REQUESTED if reply_requested else 0])
+
+
+def encode_record(kind, fields):
+    body = bytearray()
+    for field_type, value in zip(RECORD_SCHEMAS[kind], fields):
+        encode_field(field_type, value, body)
+
+    flags = 0
+    if len(body) >= COMPRESSION_THRESHOLD:
+        compressed = zlib.compress(bytes(body), 9)
+        if len(compressed) < len(body):
+            body = compressed
+            flags |= RECORD_COMPRESSED
+    return bytes([PROTOCOL_VERSION, FRAME_RECORD, RECORD_TYPES[kind], flags]) + bytes(body)
+
+
+def encode_digest(table, depth, prefix, buckets):
+    """DIGEST frame: the (count, hash) of each of the DIGEST_FANOUT child buckets under a prefix."""
+    out = bytearray([PROTOCOL_VERSION, FRAME_DIGEST, SYNC_TABLE_CODES[table], depth])
+    encode_varint(prefix, out)
+    for count, digest in buckets:
+        encode_varint(count, out)
+        out += digest.to_bytes(8, 'little')
+    return bytes(out)
+
+
+def encode_ids(table, depth, prefix, entries):
+    """IDS frame: every (unique_id, deleted) the sender holds under a prefix, each id followed by a state byte."""
+    out = bytearray([PROTOCOL_VERSION, FRAME_IDS, SYNC_TABLE_CODES[table], depth])
+    encode_varint(prefix, out)
+    encode_varint(len(entries), out)
+    for unique_id, deleted in entries:
+        encode_field('uuid', unique_id, out)
+        out.append(ID_DELETED if deleted else ID_LIVE)
+    return bytes(out)
+
+
+def encode_want(table, unique_ids):
+    """WANT frame: unique_ids the sender is missing and asks the receiver to push."""
+    out = bytearray([PROTOCOL_VERSION, FRAME_WANT, SYNC_TABLE_CODES[table]])
+    encode_varint(len(unique_ids), out)
+    for unique_id in unique_ids:
+        encode_field('uuid', unique_id, out)
+    return bytes(out)
+
+
+def encode_fragment(msg_id, seq, total, data):
+    return bytes([PROTOCOL_VERSION, FRAME_FRAGMENT]) + msg_id.to_bytes(2, 'little') + bytes([seq, total]) + data
+
+
+def encode_nack(msg_id, missing):
+    """NACK frame: the fragment sequence numbers of a message that never arrived."""
+    out = bytearray([PROTOCOL_VERSION, FRAME_NACK])
+    out += msg_id.to_bytes(2, 'little')
+    encode_varint(len(missing), out)
+    out += bytes(missing)
+    return bytes(out)
+
+
+def broadcast_tag(key, frame):
+    return hmac.new(key, frame, hashlib.sha256).digest()[:BROADCAST_TAG_LEN]
+
+
+def encode_broadcast(key, frame):
+    """BROADCAST frame: a frame for every peer, tagged with an HMAC of the shared sync key."""
+    return bytes([PROTOCOL_VERSION, FRAME_BROADCAST]) + broadcast_tag(key, frame) + frame
+
+
+def record_digest(kind, fields):
+    """Short fingerprint a peer returns in an ACK for a broadcast record."""
+    return hashlib.sha256(format_text_record(kind, fields).encode('utf-8')).digest()[:RECORD_DIGEST_LEN]
+
+
+def encode_ack(digests):
+    out = bytearray([PROTOCOL_VERSION, FRAME_ACK])
+    encode_varint(len(digests), out)
+    for digest in digests:
+        out += digest
+    return bytes(out)
+
+
+def decode_ack(payload):
+    count, offset = decode_varint(payload, 2)
+    if offset + count * RECORD_DIGEST_LEN > len(payload):
+        raise SyncProtocolError("Truncated ACK")
+    return [bytes(payload[start:start + RECORD_DIGEST_LEN])
+            for start in range(offset, offset + count * RECORD_DIGEST_LEN, RECORD_DIGEST_LEN)]
+
+
+def decode_fragment(payload):
+    if len(payload) < FRAGMENT_HEADER_LEN:
+        raise SyncProtocolError("Fragment frame too short")
+    msg_id = int.from_bytes(payload[2:4], 'little')
+    seq, total = payload[4], payload[5]
+    if total == 0 or seq >= total:
+        raise SyncProtocolError(f"Fragment {seq} of {total} is out of range")
+    return msg_id, seq, total, bytes(payload[FRAGMENT_HEADER_LEN:])
+
+
+def decode_nack(payload):
+    if len(payload) < 5:
+        raise SyncProtocolError("NACK frame too short")
+    msg_id = int.from_bytes(payload[2:4], 'little')
+    count, offset = decode_varint(payload, 4)
+    if offset + count > len(payload):
+        raise SyncProtocolError("Truncated NACK")
+    return msg_id, list(payload[offset:offset + count])
+
+
+def decode_table(payload):
+    if len(payload) < 3:
+        raise SyncProtocolError("Reconciliation frame too short")
+    table = SYNC_TABLES.get(payload[2])
+    if table is None:
+        raise SyncProtocolError(f"Unknown sync table {payload[2]}")
+    return table
+
+
+def decode_ids(data, offset):
+    count, offset = decode_varint(data, offset)
+    unique_ids = []
+    for _ in range(count):
+        unique_id, offset = decode_field('uuid', data, offset)
+        unique_ids.append(unique_id)
+    return unique_ids
+
+
+def decode_id_states(data, offset):
+    count, offset = decode_varint(data, offset)
+    entries = []
+    for _ in range(count):
+        unique_id, offset = decode_field('uuid', data, offset)
+        if offset >= len(data):
+            raise SyncProtocolError("Truncated id state")
+        if data[offset] not in (ID_LIVE, ID_DELETED):
+            raise SyncProtocolError(f"Unknown id state {data[offset]}")
+        entries.append((unique_id, data[offset] == ID_DELETED))
+        offset += 1
+    return entries
+
+
+def decode_reconciliation(frame_type, payload):
+    table = decode_table(payload)
+    if frame_type == FRAME_WANT:
+        return table, decode_ids(payload, 3)
+    if len(payload) < 4:
+        raise SyncProtocolError("Reconciliation frame too short")
+    depth = payload[3]
+    prefix, offset = decode_varint(payload, 4)
+    if frame_type == FRAME_IDS:
+        return table, depth, prefix, decode_id_states(payload, offset)
+    buckets = []
+    for _ in range(DIGEST_FANOUT):
+        count, offset = decode_varint(payload, offset)
+        if offset + 8 > len(payload):
+            raise SyncProtocolError("Truncated digest")
+        buckets.append((count, int.from_bytes(payload[offset:offset + 8], 'little')))
+        offset += 8
+    return table, depth, prefix, buckets
+
+
+def decode_frame(payload):
+    """Return (frame_type, version, value) for a frame received on SYNC_PORTNUM.
+
+    The value is the HELLO flags byte, the decoded (kind, fields) record,
+    (table, depth, prefix, buckets) for DIGEST, (table, depth, prefix,
+    [(unique_id, deleted), ...]) for IDS, (table, unique_ids) for WANT,
+    (msg_id, seq, total, data) for a fragment, (msg_id, missing) for a
+    NACK, (tag, frame) for a broadcast or the list of record digests in an
+    ACK.
+    """
+    try:
+        return _decode_frame(payload)
+    except SyncProtocolError:
+        raise
+    except (ValueError, IndexError, zlib.error) as e:
+        # Anything else a malformed frame trips over is still just a malformed frame.
+        raise SyncProtocolError(f"Malformed frame: {e}") from e
+
+
+def _decode_frame(payload):
+    if len(payload) < 2:
+        raise SyncProtocolError("Frame too short")
+    version, frame_type = payload[0], payload[1]
+    if frame_type == FRAME_HELLO:
+        return frame_type, version, payload[2] if len(payload) > 2 else 0
+    if version > PROTOCOL_VERSION:
+        raise SyncProtocolError(f"Unsupported sync protocol version {version}")
+    if frame_type == FRAME_RECORD:
+        return frame_type, version, decode_record(payload)
+    if frame_type in (FRAME_DIGEST, FRAME_IDS, FRAME_WANT):
+        return frame_type, version, decode_reconciliation(frame_type, payload)
+    if frame_type == FRAME_FRAGMENT:
+        return frame_type, version, decode_fragment(payload)
+    if frame_type == FRAME_NACK:
+        return frame_type, version, decode_nack(payload)
+    if frame_type == FRAME_BROADCAST:
+        if len(payload) <= 2 + BROADCAST_TAG_LEN:
+            raise SyncProtocolError("Broadcast frame too short")
+        return frame_type, version, (bytes(payload[2:2 + BROADCAST_TAG_LEN]), bytes(payload[2 + BROADCAST_TAG_LEN:]))
+    if frame_type == FRAME_ACK:
+        return frame_type, version, decode_ack(payload)
+    raise SyncProtocolError(f"Unknown frame type {frame_type}")
+
+
+def decode_record(payload):
+    if len(payload) < 4:
+        raise SyncProtocolError("Record frame too short")
+    kind = RECORD_KINDS.get(payload[2])
+    if kind is None:
+        raise SyncProtocolError(f"Unknown record type {payload[2]}")
+    body = payload[4:]
+    if payload[3] & RECORD_COMPRESSED:
+        decompressor = zlib.decompressobj()
+        try:
+            body = decompressor.decompress(bytes(body), MAX_RECORD_BYTES)
+        except zlib.error as e:
+            raise SyncProtocolError(f"Corrupt compressed record: {e}") from e
+        if len(body) >= MAX_RECORD_BYTES:
+            raise SyncProtocolError(f"Compressed record expands past {MAX_RECORD_BYTES} bytes")
+        if not decompressor.eof:
+            raise SyncProtocolError("Truncated compressed record")
+
+    fields = []
+    offset = 0
+    for field_type in RECORD_SCHEMAS[kind]:
+        value, offset = decode_field(field_type, body, offset)
+        fields.append(value)
+    return kind, tuple(fields)
+
+
+class SyncPeers:
+    """Sync protocol version negotiated with each peer BBS node.
+
+    Peers that have not answered a HELLO are assumed to speak only the
+    original pipe-delimited text format.
+    """
+
+    def __init__(self):
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def update(self, node_id, version):
+        with self.lock:
+            previous = self.versions.get(node_id)
+            self.versions[node_id] = min(version, PROTOCOL_VERSION)
+        return previous
+
+    def version(self, node_id):
+        with self.lock:
+            return self.versions.get(node_id)
+
+    def supports_binary(self, node_id):
+        return self.version(node_id) is not None
+
+
+sync_peers = SyncPeers()
@@ -0,0 +1,163 @@
+import bisect
+import hashlib
+import logging
+import threading
+import time
+
+from db_operations import get_known_unique_ids, get_sync_record
+from packing import MAX_PAYLOAD_BYTES
+from sync_protocol import SYNC_TABLES, encode_digest, encode_ids, encode_want, sync_peers
+from utils import send_sync_frame, send_sync_record
+
+KEY_BITS = 64
+# Each level of the digest tree consumes one hex digit of an id's key.
+MAX_DEPTH = 8
+# An IDS frame has at most ~8 bytes of header and 18 bytes per binary uuid and its state.
+MAX_IDS_PER_FRAME = (MAX_PAYLOAD_BYTES - 8) // 18
+TREE_TTL = 60
+
+trees = {}
+trees_lock = threading.Lock()
+
+
+def id_hash(unique_id, deleted=False):
+    """Return (key, hash) for a unique_id: the key places it in the tree, the hash is XORed into digests.
+
+    The key depends on the id alone, so a record sits in the same bucket
+    on every node; the hash also covers its state, so a bucket where one
+    node holds the record and another its tombstone differs.
+    """
+    encoded = unique_id.encode('utf-8')
+    key = hashlib.sha256(encoded).digest()
+    digest = hashlib.sha256(encoded + (b'\x01' if deleted else b'\x00')).digest()
+    return int.from_bytes(key[:8], 'big'), int.from_bytes(digest[:8], 'big')
+
+
+class DigestTree:
+    """A table's (unique_id, deleted) entries ordered by key, summarised per key prefix.
+
+    A prefix of `depth` hex digits covers a contiguous range of keys, so its
+    ids and its child buckets are found with a bisect and one pass over that
+    range. Each bucket is described by its id count and the XOR of the ids'
+    hashes; equal buckets on two nodes almost certainly hold the same ids.
+    """
+
+    def __init__(self, entries):
+        entries = sorted(id_hash(unique_id, deleted) + ((unique_id, deleted),) for unique_id, deleted in entries)
+        self.keys = [entry[0] for entry in entries]
+        self.hashes = [entry[1] for entry in entries]
+        self.entries = [entry[2] for entry in entries]
+        self.built_at = time.monotonic()
+
+    def _range(self, depth, prefix):
+        shift = KEY_BITS - 4 * depth
+        return (bisect.bisect_left(self.keys, prefix << shift),
+                bisect.bisect_left(self.keys, (prefix + 1) << shift))
+
+    def buckets(self, depth, prefix):
+        start, end = self._range(depth, prefix)
+        shift = KEY_BITS - 4 * (depth + 1)
+        counts = [0] * 16
+        hashes = [0] * 16
+        for index in range(start, end):
+            child = (self.keys[index] >> shift) & 0xF
+            counts[child] += 1
+            hashes[child] ^= self.hashes[index]
+        return list(zip(counts, hashes))
+
+    def ids(self, depth, prefix):
+        """Return the (unique_id, deleted) entries under a prefix."""
+        start, end = self._range(depth, prefix)
+        return self.entries[start:end]
+
+
+def get_digest_tree(table):
+    # Rebuilt at most every TREE_TTL seconds; one reconciliation pass touches a tree many times.
+    with trees_lock:
+        tree = trees.get(table)
+        if tree is None or time.monotonic() - tree.built_at >= TREE_TTL:
+            tree = trees[table] = DigestTree(get_known_unique_ids(table))
+        return tree
+
+
+def start_reconciliation(node_id, interface):
+    logging.info(f"SERVER SYNC: Reconciling with {node_id}")
+    for table in SYNC_TABLES.values():
+        tree = get_digest_tree(table)
+        send_sync_frame(node_id, encode_digest(table, 0, 0, tree.buckets(0, 0)), interface)
+
+
+def handle_digest(node_id, table, depth, prefix, their_buckets, interface):
+    """Answer every bucket that differs: with our ids if there are few, else one level deeper."""
+    if depth >= MAX_DEPTH:
+        logging.error(f"Dropping reconciliation digest from {node_id} at depth {depth}")
+        return
+    tree = get_digest_tree(table)
+    for child, (ours, theirs) in enumerate(zip(tree.buckets(depth, prefix), their_buckets)):
+        if ours == theirs:
+            continue
+        child_prefix = (prefix << 4) | child
+        if ours[0] <= MAX_IDS_PER_FRAME or depth + 1 >= MAX_DEPTH:
+            entries = tree.ids(depth + 1, child_prefix)[:MAX_IDS_PER_FRAME]
+            send_sync_frame(node_id, encode_ids(table, depth + 1, child_prefix, entries), interface)
+        else:
+            send_sync_frame(node_id, encode_digest(table, depth + 1, child_prefix,
+                                                   tree.buckets(depth + 1, child_prefix)), interface)
+
+
+def handle_ids(node_id, table, depth, prefix, their_entries, interface):
+    """Push what the peer lacks under the prefix and ask for what we lack.
+
+    A record one side holds live and the other has deleted counts as
+    missing on the live side, so the tombstone is what gets sent.
+    """
+    ours = dict(get_digest_tree(table).ids(depth, prefix))
+    theirs = dict(their_entries)
+    missing_there = sorted(unique_id for unique_id, deleted in ours.items()
+                           if unique_id not in theirs or (deleted and not theirs[unique_id]))
+    missing_here = sorted(unique_id for unique_id, deleted in theirs.items()
+                          if unique_id not in ours or (deleted and not ours[unique_id]))
+    if missing_there or missing_here:
+        logging.info(f"SERVER SYNC: {table} differs from {node_id}: sending {len(missing_there)}, "
+                     f"requesting {len(missing_here)}")
+    for unique_id in missing_there:
+        push_record(node_id, table, unique_id, interface)
+    for start in range(0, len(missing_here), MAX_IDS_PER_FRAME):
+        send_sync_frame(node_id, encode_want(table, missing_here[start:start + MAX_IDS_PER_FRAME]), interface)
+
+
+def handle_want(node_id, table, unique_ids, interface):
+    for unique_id in unique_ids:
+        push_record(node_id, table, unique_id, interface)
+
+
+def push_record(node_id, table, unique_id, interface):
+    record = get_sync_record(table, unique_id)
+    if record is None:
+        return
+    kind, fields = record
+    send_sync_record(kind, fields, [node_id], interface)
+
+
+class Reconciler:
+    """Periodically starts a reconciliation pass with every peer that speaks the binary protocol.
+
+    Peers on the text protocol cannot exchange digests and keep receiving
+    only the fire-and-forget record pushes.
+    """
+
+    def __init__(self, interface, interval=3600.0):
+        self.interface = interface
+        self.interval = interval
+
+    @classmethod
+    def from_config(cls, interface, config):
+        return cls(interface, interval=config.getfloat('sync', 'reconcile_interval', fallback=3600.0))
+
+    def start(self, core):
+        core.every(self.interval, self.run_pass, 'sync-reconcile')
+
+    def run_pass(self):
+        for node_id in self.interface.bbs_nodes:
+            if sync_peers.supports_binary(node_id):
+                start_reconciliation(node_id, self.interface)
@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from meshtastic import BROADCAST_NUM
+
+from packing import MAX_PAYLOAD_BYTES
+from sync_protocol import (
+    FRAGMENT_HEADER_LEN, MAX_FRAGMENTS, SYNC_PORTNUM, encode_fragment, encode_nack
+)
+from transmit import get_transmit_scheduler
+
+FRAGMENT_DATA_LEN = MAX_PAYLOAD_BYTES - FRAGMENT_HEADER_LEN
+
+
+class PartialMessage:
+    __slots__ = ('total', 'parts', 'size', 'last_seen', 'nacks')
+
+    def __init__(self, total, now):
+        self.total = total
+        self.parts = {}
+        self.size = 0
+        self.last_seen = now
+        self.nacks = 0
+
+    def missing(self):
+        return [seq for seq in range(self.total) if seq not in self.parts]
+
+
+class Reassembler:
+    """Collects the fragments of sync messages until every sequence number is in.
+
+    Buffers are keyed by (sender, msg_id). A buffer that has seen nothing for
+    `nack_after` seconds is NACKed for its missing fragments, at most
+    `max_nacks` times before it is dropped. Together the buffers never hold
+    more than `max_bytes`; the least recently active one is evicted first.
+    """
+
+    def __init__(self, nack_after=120.0, max_nacks=3, max_bytes=256 * 1024, completed_capacity=256):
+        self.nack_after = nack_after
+        self.max_nacks = max_nacks
+        self.max_bytes = max_bytes
+        self.completed_capacity = completed_capacity
+        self.buffers = OrderedDict()
+        self.completed = OrderedDict()
+        self.size = 0
+
+    def add(self, sender, msg_id, seq, total, data, now=None):
+        """Store one fragment; return (payload, missing).
+
+        `payload` is the reassembled message once complete. `missing` lists
+        the gaps to NACK straight away, when the final fragment has arrived
+        but earlier ones have not.
+        """
+        now = time.monotonic() if now is None else now
+        key = (sender, msg_id)
+        if key in self.completed:
+            return None, None
+
+        partial = self.buffers.get(key)
+        if partial is None or partial.total != total:
+            # A different fragment count means the message id has wrapped around.
+            if partial is not None:
+                self._discard(key)
+            partial = self.buffers[key] = PartialMessage(total, now)
+        self.buffers.move_to_end(key)
+        partial.last_seen = now
+        if seq not in partial.parts:
+            partial.parts[seq] = data
+            partial.size += len(data)
+            self.size += len(data)
+
+        if len(partial.parts) == partial.total:
+            self._discard(key)
+            self.completed[key] = True
+            if len(self.completed) > self.completed_capacity:
+                self.completed.popitem(last=False)
+            return b''.join(partial.parts[seq] for seq in range(partial.total)), None
+
+        self._enforce_limit(key)
+        if seq == total - 1 and key in self.buffers:
+            partial.nacks += 1
+            return None, partial.missing()
+        return None, None
+
+    def sweep(self, now=None):
+        """Return (sender, msg_id, missing) for every stalled buffer and drop those out of NACKs."""
+        now = time.monotonic() if now is None else now
+        due = []
+        for key, partial in list(self.buffers.items()):
+            if now - partial.last_seen < self.nack_after:
+                continue
+            if partial.nacks >= self.max_nacks:
+                logging.warning(f"SERVER SYNC: Giving up on sync message {key[1]} from {key[0]} "
+                                f"({len(partial.parts)}/{partial.total} fragments)")
+                self._discard(key)
+                continue
+            partial.nacks += 1
+            partial.last_seen = now
+            due.append((key[0], key[1], partial.missing()))
+        return due
+
+    def _discard(self, key):
+        partial = self.buffers.pop(key)
+        self.size -= partial.size
+
+    def _enforce_limit(self, current):
+        while self.size > self.max_bytes and self.buffers:
+            key = next(iter(self.buffers))
+            if key == current and len(self.buffers) == 1:
+                # A single message larger than the budget can never complete.
+                self._discard(key)
+                return
+            if key == current:
+                self.buffers.move_to_end(key)
+                continue
+            logging.warning(f"SERVER SYNC: Reassembly buffer full, dropping sync message {key[1]} from {key[0]}")
+            self._discard(key)
+
+
+class RetransmitWindow:
+    """Keeps recently sent fragments so a NACK can be answered with just the missing ones."""
+
+    def __init__(self, retention=1800.0, max_bytes=256 * 1024):
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.messages = OrderedDict()
+        self.size = 0
+
+    def store(self, destination, msg_id, fragments, now=None):
+        now = time.monotonic() if now is None else now
+        key = (destination, msg_id)
+        if key in self.messages:
+            self._discard(key)
+        self.messages[key] = (fragments, now)
+        self.size += sum(len(fragment) for fragment in fragments)
+        self._expire(now)
+
+    def get(self, destination, msg_id, seqs, now=None):
+        self._expire(time.monotonic() if now is None else now)
+        entry = self.messages.get((destination, msg_id))
+        if entry is None:
+            return []
+        fragments = entry[0]
+        return [fragments[seq] for seq in seqs if seq < len(fragments)]
+
+    def _discard(self, key):
+        fragments, _ = self.messages.pop(key)
+        self.size -= sum(len(fragment) for fragment in fragments)
+
+    def _expire(self, now):
+        while self.messages:
+            key, (_, sent_at) = next(iter(self.messages.items()))
+            if self.size <= self.max_bytes and now - sent_at < self.retention:
+                return
+            self._discard(key)
+
+
+class SyncTransport:
+    """Splits sync frames that exceed one packet into FRAGMENT frames and reassembles them.
+
+    Missing fragments are NACKed by the receiver and resent from the
+    sender's retransmit window, so a lost packet costs one fragment rather
+    than the whole record. Once started, stalled messages are NACKed every
+    `sweep_interval` seconds.
+    """
+
+    def __init__(self, reassembler=None, window=None, sweep_interval=30.0):
+        self.reassembler = reassembler or Reassembler()
+        self.window = window or RetransmitWindow()
+        self.sweep_interval = sweep_interval
+        self.next_msg_id = 0
+        self.lock = threading.Lock()
+
+    def fragment(self, destination, frame):
+        chunks = [frame[start:start + FRAGMENT_DATA_LEN] for start in range(0, len(frame), FRAGMENT_DATA_LEN)]
+        if len(chunks) > MAX_FRAGMENTS:
+            raise ValueError(f"Sync frame of {len(frame)} bytes needs more than {MAX_FRAGMENTS} fragments")
+        with self.lock:
+            msg_id = self.next_msg_id
+            self.next_msg_id = (self.next_msg_id + 1) & 0xFFFF
+            fragments = [encode_fragment(msg_id, seq, len(chunks), chunk) for seq, chunk in enumerate(chunks)]
+            self.window.store(destination, msg_id, fragments)
+        return fragments
+
+    def receive(self, sender, msg_id, seq, total, data):
+        with self.lock:
+            return self.reassembler.add(sender, msg_id, seq, total, data)
+
+    def retransmit(self, destination, msg_id, missing):
+        """Fragments to resend for a NACK, whether the message went to `destination` or was broadcast."""
+        with self.lock:
+            return self.window.get(destination, msg_id, missing) or self.window.get(BROADCAST_NUM, msg_id, missing)
+
+    def start(self, core, interface):
+        core.every(self.sweep_interval, lambda: self.send_due_nacks(interface), 'sync-transport')
+
+    def send_due_nacks(self, interface):
+        with self.lock:
+            due = self.reassembler.sweep()
+        for sender, msg_id, missing in due:
+            send_nack(sender, msg_id, missing, interface)
+
+
+def send_frame(destination, frame, interface, channel_index=0):
+    if len(frame) > MAX_PAYLOAD_BYTES:
+        packets = sync_transport.fragment(destination, frame)
+        logging.info(f"SERVER SYNC: Sending {len(frame)}-byte sync frame to {destination} in {len(packets)} fragments")
+    else:
+        packets = [frame]
+    get_transmit_scheduler(interface).enqueue(destination, [(packet, SYNC_PORTNUM, channel_index) for packet in packets],
+                                              bulk=True)
+
+
+def send_nack(node_id, msg_id, missing, interface):
+    logging.info(f"SERVER SYNC: Requesting {len(missing)} missing fragment(s) of message {msg_id} from {node_id}")
+    # The seq list is capped so the NACK itself always fits in one packet.
+    send_frame(node_id, encode_nack(msg_id, missing[:MAX_PAYLOAD_BYTES - 8]), interface)
+
+
+sync_transport = SyncTransport()
@@ -0,0 +1,165 @@
+import bisect
+import logging
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from pubsub import pub
+
+from db_connection import get_connection_manager, WriteBehindQueue
+
+telemetry_lock = threading.Lock()
+
+Sample = namedtuple('Sample', ['bucket', 'battery_level', 'voltage', 'channel_utilization'])
+
+
+class TelemetryHistory:
+    """Downsampled battery, voltage and channel utilization history per node.
+
+    Readings are folded into buckets of `interval` seconds (the latest
+    reading in a bucket wins) and each node keeps its last `samples` buckets
+    in a ring buffer. At most `max_nodes` nodes are tracked; the one heard
+    from longest ago is forgotten first. Samples are persisted to the
+    `telemetry_samples` table through a write-behind queue and reloaded at
+    startup.
+
+    A list of (battery_level, node_id) sorted by level is kept alongside, so
+    the nodes below any battery threshold are found with one bisect.
+    """
+
+    def __init__(self, interface, db_path='bulletins.db', samples=48, interval=1800, max_nodes=1000):
+        self.interface = interface
+        self.samples = samples
+        self.interval = interval
+        self.max_nodes = max_nodes
+        self.manager = get_connection_manager(db_path)
+        self.writer = WriteBehindQueue(self.manager)
+        self.history = OrderedDict()
+        self.battery_levels = {}
+        self.battery_index = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, interface, config):
+        section = 'telemetry'
+        return cls(
+            interface,
+            samples=config.getint(section, 'samples', fallback=48),
+            interval=config.getint(section, 'interval', fallback=1800),
+            max_nodes=config.getint(section, 'max_nodes', fallback=1000)
+        )
+
+    def load(self):
+        with self.manager.connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT node_id, bucket, battery_level, voltage, channel_utilization FROM telemetry_samples "
+                      "ORDER BY bucket")
+            rows = c.fetchall()
+        with self.lock:
+            for node_id, *sample in rows:
+                self._append(node_id, Sample(*sample), persist=False)
+        # Seed nodes whose metrics the radio already reported but we have no history for.
+        now = time.time()
+        for node_id, node in list((self.interface.nodes or {}).items()):
+            metrics = node.get('deviceMetrics')
+            if metrics and node_id not in self.history:
+                self.record(node_id, metrics, node.get('lastHeard') or now)
+
+    def record(self, node_id, metrics, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        # Buckets are stored as their start time, so changing the interval keeps old samples meaningful.
+        sample = Sample(
+            int(timestamp // self.interval * self.interval),
+            metrics.get('batteryLevel'),
+            metrics.get('voltage'),
+            metrics.get('channelUtilization')
+        )
+        with self.lock:
+            self._append(node_id, sample)
+
+    def on_telemetry(self, packet, interface):
+        if interface is not self.interface:
+            return
+        try:
+            metrics = packet['decoded']['telemetry'].get('deviceMetrics')
+            node_id = packet['fromId']
+        except (KeyError, AttributeError):
+            return
+        if metrics and node_id:
+            self.record(node_id, metrics, packet.get('rxTime'))
+
+    def _append(self, node_id, sample, persist=True):
+        ring = self.history.get(node_id)
+        if ring is None:
+            ring = self.history[node_id] = deque(maxlen=self.samples)
+            self._evict()
+        self.history.move_to_end(node_id)
+
+        if ring and ring[-1].bucket == sample.bucket:
+            ring[-1] = sample
+        elif ring and sample.bucket < ring[-1].bucket:
+            return
+        else:
+            ring.append(sample)
+        if sample.battery_level is not None:
+            self._index_battery(node_id, sample.battery_level)
+
+        if persist:
+            self.writer.submit(
+                "INSERT OR REPLACE INTO telemetry_samples (node_id, bucket, battery_level, voltage, channel_utilization) "
+                "VALUES (?, ?, ?, ?, ?)", (node_id,) + tuple(sample))
+            if len(ring) == ring.maxlen:
+                self.writer.submit("DELETE FROM telemetry_samples WHERE node_id = ? AND bucket < ?",
+                                   (node_id, ring[0].bucket))
+
+    def _evict(self):
+        while len(self.history) > self.max_nodes:
+            node_id, _ = self.history.popitem(last=False)
+            self._unindex_battery(node_id)
+            self.writer.submit("DELETE FROM telemetry_samples WHERE node_id = ?", (node_id,))
+
+    def _index_battery(self, node_id, level):
+        if self.battery_levels.get(node_id) == level:
+            return
+        self._unindex_battery(node_id)
+        self.battery_levels[node_id] = level
+        bisect.insort(self.battery_index, (level, node_id))
+
+    def _unindex_battery(self, node_id):
+        level = self.battery_levels.pop(node_id, None)
+        if level is None:
+            return
+        position = bisect.bisect_left(self.battery_index, (level, node_id))
+        if position < len(self.battery_index) and self.battery_index[position] == (level, node_id):
+            del self.battery_index[position]
+
+    def low_battery(self, threshold):
+        """Return [(battery_level, node_id)] for every node below `threshold`, lowest first."""
+        with self.lock:
+            return self.battery_index[:bisect.bisect_left(self.battery_index, (threshold,))]
+
+    def node_history(self, node_id):
+        with self.lock:
+            return list(self.history.get(node_id, ()))
+
+    def close(self):
+        self.writer.stop()
+
+
+def get_telemetry_history(interface, config=None):
+    history = getattr(interface, 'telemetry_history', None)
+    if history is None:
+        with telemetry_lock:
+            history = getattr(interface, 'telemetry_history', None)
+            if history is None:
+                if config is not None:
+                    history = TelemetryHistory.from_config(interface, config)
+                else:
+                    history = TelemetryHistory(interface)
+                try:
+                    history.load()
+                except Exception as e:
+                    logging.error(f"Unable to load telemetry history: {e}")
+                pub.subscribe(history.on_telemetry, "meshtastic.receive.telemetry")
+                interface.telemetry_history = history
+    return history
@@ -0,0 +1,40 @@
+import importlib
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def import_configured(tmp_path_factory):
+    """Import a module that reads ./config.ini when imported, against a copy of example_config.ini."""
+    directory = tmp_path_factory.mktemp('config')
+    shutil.copy(os.path.join(ROOT, 'example_config.ini'), directory / 'config.ini')
+
+    def load(name):
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            return importlib.import_module(name)
+        finally:
+            os.chdir(cwd)
+    return load
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A migrated bulletins.db in a temporary directory, used by db_operations and its sync writer."""
+    import db_operations
+    from db_connection import ConnectionManager, WriteBehindQueue
+
+    manager = ConnectionManager(str(tmp_path / 'bulletins.db'))
+    monkeypatch.setattr(db_operations, 'get_db_connection', manager.connection)
+    monkeypatch.setattr(db_operations, 'sync_writer', WriteBehindQueue(manager, max_delay=0.01))
+    db_operations.initialize_database()
+    yield manager
+    db_operations.sync_writer.stop()
+    manager.close()
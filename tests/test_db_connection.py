@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+
+from db_connection import ConnectionManager, WriteBehindQueue, get_connection_manager
+
+
+def test_connections_use_wal_and_are_reused(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'test.db'))
+    with manager.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        with manager.connection() as nested:
+            assert nested is conn
+    with manager.connection() as again:
+        assert again is conn
+    manager.close()
+
+
+def test_pool_is_bounded(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'test.db'), max_connections=2)
+    holding = threading.Barrier(3)
+    release = threading.Event()
+    opened = []
+
+    def hold():
+        with manager.connection() as conn:
+            opened.append(conn)
+            holding.wait()
+            release.wait(5)
+
+    threads = [threading.Thread(target=hold) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    holding.wait()
+    assert not manager.slots.acquire(timeout=0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len({id(conn) for conn in opened}) == 2
+    assert len(manager.idle) == 2
+    manager.close()
+
+
+def test_uncommitted_work_is_rolled_back_on_return(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'test.db'))
+    with manager.connection() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+        conn.commit()
+        conn.execute("INSERT INTO items VALUES ('lost')")
+    with manager.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+    manager.close()
+
+
+def test_managers_are_shared_per_path(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    assert get_connection_manager(path) is get_connection_manager(path)
+
+
+def test_failing_write_is_dropped_after_bounded_retries(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'test.db'))
+    with manager.connection() as conn:
+        conn.execute("CREATE TABLE items (name TEXT UNIQUE)")
+        conn.commit()
+    writer = WriteBehindQueue(manager, max_delay=0.01, max_retries=2)
+    writer.submit("INSERT INTO items (name) VALUES (?)", ('first',))
+    writer.submit("INSERT INTO missing (name) VALUES (?)", ('lost',))
+    writer.submit("INSERT INTO items (name) VALUES (?)", ('first',))
+    writer.submit("INSERT INTO items (name) VALUES (?)", ('second',))
+    try:
+        assert writer.flush(timeout=5)
+    finally:
+        writer.stop()
+        manager.close()
+
+    conn = sqlite3.connect(str(tmp_path / 'test.db'))
+    assert [row[0] for row in conn.execute("SELECT name FROM items ORDER BY name")] == ['first', 'second']
+    conn.close()
+
+
+def items(path):
+    conn = sqlite3.connect(str(path))
+    try:
+        return [row[0] for row in conn.execute("SELECT name FROM items ORDER BY rowid")]
+    finally:
+        conn.close()
+
+
+def make_items(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'test.db'))
+    with manager.connection() as conn:
+        conn.execute("CREATE TABLE items (name TEXT UNIQUE)")
+        conn.commit()
+    return manager
+
+
+def test_writes_are_group_committed_when_the_batch_fills(tmp_path):
+    manager = make_items(tmp_path)
+    writer = WriteBehindQueue(manager, max_batch=5, max_delay=60)
+    for n in range(4):
+        writer.submit("INSERT INTO items (name) VALUES (?)", (f'item-{n}',))
+    time.sleep(0.1)
+    assert items(tmp_path / 'test.db') == []
+    writer.submit("INSERT INTO items (name) VALUES (?)", ('item-4',))
+    with writer.condition:
+        assert writer.condition.wait_for(lambda: not writer.pending and not writer.committing, 5)
+    assert items(tmp_path / 'test.db') == [f'item-{n}' for n in range(5)]
+    writer.stop()
+    manager.close()
+
+
+def test_writes_wait_for_max_delay_then_commit_in_order(tmp_path):
+    manager = make_items(tmp_path)
+    writer = WriteBehindQueue(manager, max_batch=50, max_delay=0.3)
+    writer.submit("INSERT INTO items (name) VALUES (?)", ('a',))
+    writer.submit("INSERT INTO items (name) VALUES (?)", ('b',))
+    assert items(tmp_path / 'test.db') == []
+    with writer.condition:
+        assert writer.condition.wait_for(lambda: not writer.pending and not writer.committing, 5)
+    assert items(tmp_path / 'test.db') == ['a', 'b']
+    writer.stop()
+    manager.close()
+
+
+def test_stop_commits_what_is_queued(tmp_path):
+    manager = make_items(tmp_path)
+    writer = WriteBehindQueue(manager, max_batch=50, max_delay=60)
+    writer.submit("INSERT INTO items (name) VALUES (?)", ('queued',))
+    writer.stop(timeout=5)
+    assert items(tmp_path / 'test.db') == ['queued']
+    manager.close()
@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+import db_migrations
+from db_migrations import MIGRATIONS, get_schema_version, migrate
+
+
+def v0_database(path):
+    """A database as the pre-migration code left it: base tables, no indexes, user_version 0."""
+    conn = sqlite3.connect(str(path))
+    db_migrations.create_base_tables(conn.cursor())
+    conn.executemany("INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) "
+                     "VALUES ('General', 'AAA', '2024-01-01 00:00', ?, 'Body', ?)",
+                     [('first', 'u1'), ('second', 'u2'), ('first again', 'u1')])
+    conn.executemany("INSERT INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) "
+                     "VALUES ('1', 'AAA', '2', '2024-01-01 00:00', ?, 'Body', ?)",
+                     [('hello', 'm1'), ('hello again', 'm1')])
+    conn.execute("INSERT INTO channels (name, url) VALUES ('Chan', 'https://example.com')")
+    conn.commit()
+    return conn
+
+
+def names(conn, kind):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,))}
+
+
+def test_populated_v0_database_is_upgraded(tmp_path):
+    conn = v0_database(tmp_path / 'bulletins.db')
+    assert get_schema_version(conn) == 0
+
+    assert migrate(conn) == len(MIGRATIONS)
+    assert [row[0] for row in conn.execute("SELECT subject FROM bulletins ORDER BY id")] == ['first', 'second']
+    assert [row[0] for row in conn.execute("SELECT subject FROM mail")] == ['hello']
+    assert conn.execute("SELECT COUNT(*) FROM channels").fetchone()[0] == 1
+    assert {'idx_bulletins_unique_id', 'idx_bulletins_board', 'idx_mail_unique_id',
+            'idx_mail_recipient'} <= names(conn, 'index')
+    assert {'sync_tombstones', 'sync_outbox', 'sync_cursors', 'telemetry_samples',
+            'user_sessions'} <= names(conn, 'table')
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) "
+                     "VALUES ('General', 'AAA', 'now', 'dup', 'Body', 'u2')")
+    conn.close()
+
+
+def test_migrate_is_idempotent(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'bulletins.db'))
+    migrate(conn)
+    schema = sorted(conn.execute("SELECT type, name FROM sqlite_master"))
+    assert migrate(conn) == len(MIGRATIONS)
+    assert sorted(conn.execute("SELECT type, name FROM sqlite_master")) == schema
+    conn.close()
+
+
+def test_failed_migration_resumes_from_last_completed_step(tmp_path, monkeypatch):
+    def broken(c):
+        c.execute("CREATE TABLE half_done (id INTEGER)")
+        raise sqlite3.OperationalError("interrupted")
+
+    conn = sqlite3.connect(str(tmp_path / 'bulletins.db'))
+    monkeypatch.setattr(db_migrations, 'MIGRATIONS', MIGRATIONS[:2] + [broken])
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn)
+    assert get_schema_version(conn) == 2
+    assert 'half_done' not in names(conn, 'table')
+
+    monkeypatch.setattr(db_migrations, 'MIGRATIONS', MIGRATIONS)
+    assert migrate(conn) == len(MIGRATIONS)
+    conn.close()
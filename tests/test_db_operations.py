@@ -0,0 +1,81 @@
+import db_operations
+
+FIRST = '11111111-1111-4111-8111-111111111111'
+SECOND = '22222222-2222-4222-8222-222222222222'
+
+
+def bulletin_ids(manager):
+    with manager.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT unique_id FROM bulletins ORDER BY id")]
+
+
+def tombstones(manager):
+    with manager.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT unique_id FROM sync_tombstones WHERE table_name = 'bulletins'")]
+
+
+def test_delete_bulletin_replicates_the_unique_id(database, monkeypatch):
+    sent = []
+    monkeypatch.setattr(db_operations, 'send_delete_bulletin_to_bbs_nodes',
+                        lambda unique_id, bbs_nodes, interface, outbox_id=None: sent.append(unique_id))
+    db_operations.add_bulletin('General', 'AAA', 'One', 'Body', [], None, unique_id=FIRST)
+    db_operations.add_bulletin('General', 'AAA', 'Two', 'Body', [], None, unique_id=SECOND)
+    bulletin_id = db_operations.get_bulletins('General').rows[-1][0]
+
+    db_operations.delete_bulletin(bulletin_id, [], None)
+    assert sent == [SECOND]
+    assert bulletin_ids(database) == [FIRST]
+    assert tombstones(database) == [SECOND]
+
+
+def test_ingested_delete_matches_by_unique_id(database):
+    db_operations.ingest_bulletin('General', 'AAA', 'One', 'Body', FIRST)
+    db_operations.ingest_bulletin('General', 'AAA', 'Two', 'Body', SECOND)
+    db_operations.sync_writer.flush()
+
+    # The deleting peer's row id for SECOND is 1, which is FIRST's id here.
+    db_operations.ingest_delete_bulletin(SECOND)
+    db_operations.sync_writer.flush()
+    assert bulletin_ids(database) == [FIRST]
+    assert tombstones(database) == [SECOND]
+
+
+def add_rows(manager, count, board='General'):
+    with manager.connection() as conn:
+        conn.executemany("INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) "
+                         "VALUES (?, 'AAA', '2024-01-01 00:00', ?, 'Body', ?)",
+                         [(board, f"S{n}", f"{board}-{n}") for n in range(count)])
+        conn.commit()
+
+
+def page(manager, **kwargs):
+    with manager.connection() as conn:
+        result = db_operations.fetch_page(conn, "SELECT id FROM bulletins", "board = ?", ('General',),
+                                          page_size=10, **kwargs)
+    return [row[0] for row in result.rows], result.has_prev, result.has_next
+
+
+def test_keyset_pages_forward_and_back(database):
+    add_rows(database, 25)
+    add_rows(database, 5, board='News')
+    assert page(database) == (list(range(1, 11)), False, True)
+    assert page(database, after_id=10) == (list(range(11, 21)), True, True)
+    assert page(database, after_id=20) == (list(range(21, 26)), True, False)
+    assert page(database, before_id=21) == (list(range(11, 21)), True, True)
+    assert page(database, before_id=11) == (list(range(1, 11)), False, True)
+
+
+def test_keyset_page_edges(database):
+    assert page(database) == ([], False, False)
+    add_rows(database, 10)
+    assert page(database) == (list(range(1, 11)), False, False)
+    assert page(database, after_id=10) == ([], True, False)
+
+
+def test_listing_pages_through_the_public_helpers(database):
+    add_rows(database, 12)
+    first = db_operations.get_bulletins('General')
+    assert (len(first.rows), first.has_prev, first.has_next) == (db_operations.PAGE_SIZE, False, True)
+    second = db_operations.get_bulletins('General', after_id=first.rows[-1][0])
+    assert (len(second.rows), second.has_prev, second.has_next) == (2, True, False)
+    assert db_operations.get_bulletins('General', before_id=second.rows[0][0]).rows == first.rows
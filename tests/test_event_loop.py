@@ -0,0 +1,29 @@
+import gc
+import threading
+
+from pubsub import pub
+
+from event_loop import EventLoopCore
+
+
+def test_bridged_listener_survives_garbage_collection():
+    core = EventLoopCore(workers=1)
+    received = []
+
+    def on_packet(packet, interface):
+        received.append(packet)
+        core.stop()
+
+    pub.subscribe(core.bridge(on_packet), 'test.bridge')
+    gc.collect()
+
+    threading.Timer(0.05, pub.sendMessage, args=('test.bridge',), kwargs={'packet': 1, 'interface': None}).start()
+    watchdog = threading.Timer(5, core.stop)
+    watchdog.start()
+    try:
+        core.run()
+    finally:
+        watchdog.cancel()
+        core.shutdown()
+
+    assert received == [1]
@@ -0,0 +1,51 @@
+import configparser
+import os
+
+import pytest
+
+from fortunes import FortuneFile, FortuneLibrary
+
+
+def write(path, text):
+    path.write_text(text, encoding='utf-8')
+
+
+def test_blank_lines_are_skipped_and_every_line_is_reachable(tmp_path, monkeypatch):
+    path = tmp_path / 'fortunes.txt'
+    write(path, "first\n\n  \nsecond 🍀\nthird without newline")
+    fortunes = FortuneFile(str(path))
+    assert len(fortunes) == 3
+    picks = iter(range(3))
+    monkeypatch.setattr('fortunes.random.randrange', lambda n: next(picks))
+    assert [fortunes.choice() for _ in range(3)] == ['first', 'second 🍀', 'third without newline']
+
+
+def test_index_is_rebuilt_when_the_file_changes(tmp_path):
+    path = tmp_path / 'fortunes.txt'
+    write(path, "old\n")
+    fortunes = FortuneFile(str(path))
+    assert fortunes.choice() == 'old'
+    write(path, "new one\nnew two\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert len(fortunes) == 2
+    assert fortunes.choice().startswith('new')
+
+
+def test_empty_file_has_no_fortune(tmp_path):
+    path = tmp_path / 'fortunes.txt'
+    write(path, "")
+    assert FortuneFile(str(path)).choice() is None
+
+
+def test_library_uses_the_configured_source(tmp_path):
+    write(tmp_path / 'default.txt', "default\n")
+    write(tmp_path / 'ham.txt', "73\n")
+    config = configparser.ConfigParser()
+    config.read_dict({'fortune_files': {'default': str(tmp_path / 'default.txt'), 'ham': str(tmp_path / 'ham.txt')},
+                      'fortune': {'source': 'ham'}})
+    library = FortuneLibrary.from_config(config)
+    assert library.choice() == '73'
+    assert library.choice('default') == 'default'
+    with pytest.raises(KeyError):
+        library.choice('missing')
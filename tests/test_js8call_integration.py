@@ -0,0 +1,153 @@
+import asyncio
+import logging
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def js8call(import_configured):
+    return import_configured('js8call_integration')
+
+
+def test_line_split_across_reads(js8call):
+    framer = js8call.LineFramer()
+    assert framer.feed(b'{"type": "RX.') == []
+    assert framer.feed(b'ACTIVITY"}') == []
+    assert framer.feed(b'\n') == ['{"type": "RX.ACTIVITY"}']
+
+
+def test_lines_merged_in_one_read(js8call):
+    framer = js8call.LineFramer()
+    assert framer.feed(b'first\nsecond\n\nthi') == ['first', 'second']
+    assert framer.feed(b'rd\n') == ['third']
+
+
+def test_oversize_line_is_discarded(js8call):
+    framer = js8call.LineFramer(max_line=8)
+    assert framer.feed(b'0123456789') == []
+    assert framer.feed(b'abcdef\nok\n') == ['ok']
+    assert framer.feed(b'0123456789\nok\n') == ['ok']
+    assert not framer.buffer
+
+
+class FakeClient:
+    """Fails the first `failures` connections with `error`, then connects and stops its supervisor."""
+
+    def __init__(self, failures, error=ConnectionRefusedError("refused"), connect_time=0):
+        self.server = ('localhost', 2442)
+        self.logger = logging.getLogger('js8call')
+        self.failures = failures
+        self.error = error
+        self.connect_time = connect_time
+        self.attempts = 0
+        self.errors = []
+        self.supervisor = None
+
+    async def run(self, on_connected=None):
+        self.attempts += 1
+        self.errors.append(self.supervisor.last_error)
+        await asyncio.sleep(self.connect_time)
+        if self.attempts <= self.failures:
+            raise self.error
+        on_connected()
+        self.supervisor.stopping = True
+
+    def close(self):
+        pass
+
+
+def test_backoff_doubles_up_to_the_cap(js8call):
+    supervisor = js8call.JS8CallSupervisor(None, min_delay=5, max_delay=60)
+    for failures, cap in [(1, 5), (2, 10), (3, 20), (4, 40), (5, 60), (20, 60)]:
+        supervisor.failures = failures
+        assert cap / 2 <= supervisor.backoff() <= cap
+
+
+def test_supervisor_reconnects_after_failures(js8call):
+    client = FakeClient(failures=2)
+    supervisor = client.supervisor = js8call.JS8CallSupervisor(client, min_delay=0.001, max_delay=0.01)
+    asyncio.run(supervisor._run())
+    assert client.attempts == 3
+    assert client.errors == [None, "refused", "refused"]
+    assert supervisor.reconnects == 2
+    assert supervisor.connected_since is None
+
+
+def test_supervisor_survives_unexpected_errors(js8call):
+    client = FakeClient(failures=1, error=AttributeError("'str' object has no attribute 'get'"))
+    supervisor = client.supervisor = js8call.JS8CallSupervisor(client, min_delay=0.001, max_delay=0.01)
+    asyncio.run(supervisor._run())
+    assert client.attempts == 2
+    assert supervisor.reconnects == 1
+
+
+def test_slow_connection_attempts_do_not_reset_backoff(js8call):
+    client = FakeClient(failures=2, connect_time=0.03)
+    supervisor = client.supervisor = js8call.JS8CallSupervisor(client, min_delay=0.001, max_delay=0.02)
+    asyncio.run(supervisor._run())
+    assert supervisor.failures == 2
+
+
+def test_client_skips_messages_it_cannot_process(js8call):
+    processed = []
+
+    async def scenario():
+        async def serve(reader, writer):
+            await reader.readline()
+            writer.write(b'"x"\n[1]\n{"type": "RX.SPOT"}\n')
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(serve, '127.0.0.1', 0)
+        client = js8call.JS8CallClient(None)
+        client.server = server.sockets[0].getsockname()[:2]
+        process = client.process
+        client.process = lambda message: processed.append(process(message) or message)
+        async with server:
+            await client.run()
+        return client
+
+    client = asyncio.run(scenario())
+    assert client.messages_received == 3
+    assert processed == [{'type': 'RX.SPOT'}]
+
+
+@pytest.fixture
+def store(js8call, tmp_path):
+    store = js8call.JS8CallStore()
+    manager = store.open(str(tmp_path / 'js8call.db'))
+    store.create_tables()
+    yield store
+    manager.close()
+
+
+def test_store_indexes_receiver_and_timestamp(store):
+    with store.manager.connection() as conn:
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_messages_receiver_timestamp', 'idx_groups_groupname_timestamp',
+            'idx_urgent_groupname_timestamp'} <= indexes
+
+
+def test_group_names_cache_is_dropped_on_group_insert(store):
+    store.insert('groups', 'K1ABC', '@HB', 'first')
+    assert store.groups() == ['@HB']
+    store.insert('messages', 'K1ABC', 'N0CALL', 'direct')
+    assert store.groups() == ['@HB']
+    store.insert('groups', 'W1AW', '@ALLCALL', 'second')
+    store.insert('groups', 'W1AW', '@HB', 'third')
+    assert store.groups() == ['@ALLCALL', '@HB']
+    assert [(sender, message) for sender, message, _ in store.group_messages('@HB')] == \
+        [('K1ABC', 'first'), ('W1AW', 'third')]
+
+
+def test_store_pages_by_id(store):
+    for n in range(12):
+        store.insert('urgent', 'K1ABC', '@ALLCALL', f'msg {n}')
+    select = "SELECT id, message FROM urgent"
+    first = store.page(select)
+    assert [message for _, message in first.rows] == [f'msg {n}' for n in range(10)]
+    assert first.has_next and not first.has_prev
+    second = store.page(select, after_id=first.rows[-1][0])
+    assert [message for _, message in second.rows] == ['msg 10', 'msg 11']
+    assert second.has_prev and not second.has_next
+    assert store.page(select, before_id=second.rows[0][0]).rows == first.rows
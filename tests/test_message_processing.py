@@ -0,0 +1,63 @@
+import pytest
+
+from utils import RecentIdCache
+
+UNIQUE_ID = '33333333-3333-4333-8333-333333333333'
+URGENT = ("BULLETIN", ("Urgent", "AAA", "Flood", "Move uphill", UNIQUE_ID))
+SENDER = '!00000002'
+
+
+@pytest.fixture
+def processing(import_configured, database, monkeypatch):
+    module = import_configured('message_processing')
+    monkeypatch.setattr(module, 'recent_sync_ids', RecentIdCache())
+    sent = {'messages': [], 'pushed': []}
+    monkeypatch.setattr(module, 'send_message',
+                        lambda message, destination, interface, **kwargs: sent['messages'].append(message))
+    monkeypatch.setattr(module, 'push_record',
+                        lambda node_id, table, unique_id, interface: sent['pushed'].append((node_id, table, unique_id)))
+    monkeypatch.setattr(module, 'sent', sent, raising=False)
+    return module
+
+
+def stored(database):
+    with database.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT unique_id FROM bulletins")]
+
+
+def test_record_is_applied_once(processing, database):
+    import db_operations
+    processing.process_sync_record(*URGENT, None, SENDER)
+    processing.process_sync_record(*URGENT, None, SENDER)
+    db_operations.sync_writer.flush()
+    assert stored(database) == [UNIQUE_ID]
+    assert len(processing.sent['messages']) == 1
+    assert processing.recent_sync_ids.duplicates_suppressed == 1
+
+
+def test_failed_write_lets_the_next_copy_through(processing, database):
+    import db_operations
+    with database.connection() as conn:
+        conn.execute("CREATE TRIGGER refuse BEFORE INSERT ON bulletins BEGIN SELECT RAISE(ABORT, 'refused'); END")
+        conn.commit()
+    processing.process_sync_record(*URGENT, None, SENDER)
+    db_operations.sync_writer.flush()
+    assert stored(database) == []
+
+    with database.connection() as conn:
+        conn.execute("DROP TRIGGER refuse")
+        conn.commit()
+    processing.process_sync_record(*URGENT, None, SENDER)
+    db_operations.sync_writer.flush()
+    assert stored(database) == [UNIQUE_ID]
+
+
+def test_deleted_record_is_answered_with_its_tombstone(processing, database):
+    import db_operations
+    db_operations.ingest_tombstone('bulletins', UNIQUE_ID)
+    db_operations.sync_writer.flush()
+    processing.process_sync_record(*URGENT, None, SENDER)
+    db_operations.sync_writer.flush()
+    assert stored(database) == []
+    assert processing.sent['messages'] == []
+    assert processing.sent['pushed'] == [(SENDER, 'bulletins', UNIQUE_ID)]
@@ -0,0 +1,37 @@
+from node_directory import NodeDirectory
+
+
+class FakeInterface:
+    def __init__(self, nodes):
+        self.nodesByNum = {node['num']: node for node in nodes}
+        self.nodes = {node['user']['id']: node for node in nodes if 'user' in node}
+
+
+def make_node(num, short_name=None):
+    node = {'num': num}
+    if short_name is not None:
+        node['user'] = {'id': f"!{num:08x}", 'shortName': short_name, 'longName': short_name}
+    return node
+
+
+def test_short_name_lookup_does_not_rebuild_for_nodes_without_user():
+    interface = FakeInterface([make_node(1, 'AAA'), make_node(2, 'BBB')])
+    interface.nodes['!00000003'] = make_node(3)
+    directory = NodeDirectory(interface)
+
+    rebuilds = []
+    directory.rebuild = lambda: rebuilds.append(1)
+    assert [node_id for node_id, _ in directory.find_short_name('aaa')] == ['!00000001']
+    assert rebuilds == []
+
+
+def test_in_place_rename_is_reindexed():
+    node = make_node(1, 'AAA')
+    interface = FakeInterface([node])
+    directory = NodeDirectory(interface)
+
+    node['user'] = {'id': '!00000001', 'shortName': 'ZZZ', 'longName': 'Renamed'}
+    directory.on_user_packet({'from': 1}, interface)
+
+    assert directory.find_short_name('aaa') == []
+    assert [node_id for node_id, _ in directory.find_short_name('zzz')] == ['!00000001']
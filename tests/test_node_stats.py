@@ -0,0 +1,60 @@
+import time
+
+from node_stats import HeardWindow, NodeStats, parse_windows, window_label
+
+
+class FakeInterface:
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+
+def node(num, last_heard, hw_model='TBEAM', role='CLIENT'):
+    return {'num': num, 'lastHeard': last_heard,
+            'user': {'id': f'!{num:08x}', 'hwModel': hw_model, 'role': role}}
+
+
+def test_parse_windows_and_labels():
+    assert parse_windows("24h, 8h,90m,30") == [86400, 28800, 5400, 30]
+    assert [window_label(seconds) for seconds in (86400, 3600, 5400, 2 * 86400)] == \
+        ['Last 24 hours', 'Last hour', 'Last 90 minutes', 'Last 2 days']
+
+
+def test_window_counts_out_of_order_updates():
+    window = HeardWindow(100)
+    for node_id, heard in [('a', 950), ('b', 890), ('c', 990), ('d', 800), ('b', 960)]:
+        window.heard(node_id, heard)
+    assert window.count(1000) == 3
+    assert window.count(1055) == 2
+    assert window.count(1061) == 1
+    assert window.count(1200) == 0
+    assert not window.heap
+
+
+def test_window_heap_stays_bounded():
+    window = HeardWindow(10 ** 9)
+    for heard in range(10000):
+        window.heard(f'node-{heard % 10}', heard)
+    assert window.count(10000) == 10
+    assert len(window.heap) <= 2 * 10 + 64
+
+
+def test_node_stats_from_node_database_and_packets():
+    now = int(time.time())
+    interface = FakeInterface({
+        '!00000001': node(1, now - 30),
+        '!00000002': node(2, now - 7200, 'HELTEC_V3', 'ROUTER'),
+        '!00000003': node(3, now - 2 * 86400),
+    })
+    stats = NodeStats(interface, windows=[86400, 3600])
+    assert stats.heard_counts() == [('All time', 3), ('Last 24 hours', 2), ('Last hour', 1)]
+    assert dict(stats.hardware_models()) == {'TBEAM': 2, 'HELTEC_V3': 1}
+
+    stats.on_packet({'fromId': '!00000003', 'rxTime': now}, interface)
+    stats.on_packet({'fromId': '!00000004', 'rxTime': now}, interface)
+    stats.on_packet({'fromId': '!00000005', 'rxTime': now}, object())
+    assert stats.heard_counts() == [('All time', 4), ('Last 24 hours', 4), ('Last hour', 3)]
+
+    stats.update_node(node(4, now, 'RAK4631', 'CLIENT'), interface)
+    stats.update_node(node(2, now - 7200, 'HELTEC_V3', 'CLIENT'), interface)
+    assert dict(stats.hardware_models()) == {'TBEAM': 2, 'HELTEC_V3': 1, 'RAK4631': 1}
+    assert dict(stats.role_counts()) == {'CLIENT': 4}
@@ -0,0 +1,54 @@
+import pytest
+
+from packing import MAX_PAYLOAD_BYTES, is_grapheme_boundary, pack_message
+
+FAMILY = '\U0001F468‍\U0001F469‍\U0001F467'      # man, woman, girl joined by ZWJ
+FLAGS = '\U0001F1FA\U0001F1F8\U0001F1EC\U0001F1E7'         # US, GB
+
+MESSAGES = [
+    '',
+    'short',
+    'word ' * 100,
+    ('line of text\n' * 40).strip(),
+    'é' * 300,
+    'é' * 200,
+    FAMILY * 30,
+    FLAGS * 40,
+    'mixed ' + FAMILY + ' text 👋🏽 and\r\nflags ' + FLAGS * 20,
+]
+
+
+@pytest.mark.parametrize('message', MESSAGES)
+@pytest.mark.parametrize('max_bytes', [MAX_PAYLOAD_BYTES, 40])
+def test_packets_fit_and_join_back(message, max_bytes):
+    packets = pack_message(message, max_bytes)
+    assert ''.join(packets) == message
+    assert all(0 < len(packet.encode('utf-8')) <= max_bytes for packet in packets)
+
+
+@pytest.mark.parametrize('message', [FAMILY * 30, FLAGS * 40, 'é' * 200, 'ab\r\n' * 50])
+def test_graphemes_are_never_split(message):
+    offset = 0
+    for packet in pack_message(message, 40)[:-1]:
+        offset += len(packet)
+        assert is_grapheme_boundary(message, offset)
+
+
+def test_whole_zwj_sequences_per_packet():
+    packets = pack_message(FAMILY * 30, 40)
+    assert all(packet == FAMILY * (len(packet) // len(FAMILY)) for packet in packets)
+
+
+def test_split_after_line_break_then_space():
+    assert pack_message('a' * 150 + '\n' + 'b b ' * 20, 200) == ['a' * 150 + '\n', 'b b ' * 20]
+    assert pack_message('a' * 150 + ' ' + 'b' * 100, 200) == ['a' * 150 + ' ', 'b' * 100]
+
+
+def test_separator_that_leaves_packet_mostly_empty_is_ignored():
+    packets = pack_message('a ' + 'b' * 300, 200)
+    assert packets[0] == 'a ' + 'b' * 198
+
+
+def test_short_message_is_one_packet():
+    assert pack_message('hello') == ['hello']
+    assert pack_message('') == []
@@ -0,0 +1,39 @@
+from packing import MAX_PAYLOAD_BYTES
+from utils import ReplyBuilder
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.sent = []
+
+    def enqueue(self, destination, chunks, bulk=False):
+        self.sent.append((destination, list(chunks), bulk))
+
+
+class FakeInterface:
+    def __init__(self):
+        self.tx_scheduler = FakeScheduler()
+
+
+def test_lines_are_coalesced_into_few_packets():
+    interface = FakeInterface()
+    reply = ReplyBuilder('!00000001', interface)
+    reply.add("Bulletins:")
+    reply.extend([f"[{n}] Subject number {n}" for n in range(30)])
+    reply.flush()
+
+    (destination, packets, bulk), = interface.tx_scheduler.sent
+    assert destination == '!00000001' and not bulk
+    lines = "\n".join(["Bulletins:"] + [f"[{n}] Subject number {n}" for n in range(30)])
+    assert ''.join(packets) == lines
+    assert len(packets) == -(-len(lines.encode('utf-8')) // MAX_PAYLOAD_BYTES)
+
+
+def test_flush_sends_nothing_when_empty_and_resets():
+    interface = FakeInterface()
+    reply = ReplyBuilder('!00000001', interface)
+    reply.flush()
+    reply.add("one")
+    reply.flush()
+    reply.flush()
+    assert [packets for _, packets, _ in interface.tx_scheduler.sent] == [["one"]]
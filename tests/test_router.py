@@ -0,0 +1,88 @@
+import pytest
+
+from router import CommandRouter, PrefixTrie
+
+
+def test_prefix_trie_prefers_the_longest_match():
+    trie = PrefixTrie()
+    trie.insert("c", "c")
+    trie.insert("cb,,", "cb")
+    trie.insert("chp,,", "chp")
+    assert trie.longest_match("cb,,general") == "cb"
+    assert trie.longest_match("cb,") == "c"
+    assert trie.longest_match("chp,,name|url") == "chp"
+    assert trie.longest_match("ch") == "c"
+    assert trie.longest_match("x") is None
+
+
+def recorder():
+    calls = []
+
+    def handler(name):
+        return lambda *args: calls.append((name,) + args[:2])
+    return calls, handler
+
+
+@pytest.fixture
+def router():
+    calls, handler = recorder()
+    router = CommandRouter(handler('help'))
+    router.quick_command("cm", handler('check mail'))
+    router.quick_command("chl", handler('list channels'))
+    router.quick_command("chp,,", handler('post channel'))
+    router.intercept('JS8', handler('js8'))
+    router.default_menu = {'b': handler('bbs menu'), 'c': handler('channels menu')}
+    router.menu('MENU', {'m': handler('mail menu')}, menu='bbs')
+    router.menu('ACTION', {'r': handler('read')}, with_state=True)
+    router.step('MAIL', handler('mail step 1'), step=1)
+    router.step('MAIL', handler('mail any step'))
+    router.step('DONE', handler('unused'), step=1)
+    router.calls = calls
+    return router
+
+
+@pytest.mark.parametrize('message, state, route', [
+    ("chl", None, "quick:chl"),
+    ("CHP,,Name|url", {'command': 'MAIL', 'step': 1}, "quick:chp,,"),
+    ("ch", None, "help"),
+    ("c", None, "menu:c"),
+    ("cx", None, "menu:c"),
+    ("cm", {'command': 'JS8', 'step': 1}, "quick:cm"),
+    ("b", {'command': 'JS8', 'step': 1}, "JS8"),
+    ("m", {'command': 'MENU', 'menu': 'bbs'}, "menu:m"),
+    ("b", {'command': 'MENU', 'menu': 'bbs'}, "help"),
+    ("x", {'command': 'MENU', 'menu': 'bbs'}, "exit"),
+    ("r", {'command': 'ACTION', 'step': 2}, "menu:r"),
+    ("hello", {'command': 'MAIL', 'step': 1}, "MAIL:1"),
+    ("hello", {'command': 'MAIL', 'step': 3}, "MAIL:3"),
+    ("hello", {'command': 'DONE', 'step': 2}, "DONE:2"),
+    ("hello", {'command': 'UNKNOWN'}, "help"),
+])
+def test_resolve(router, message, state, route):
+    assert router.resolve('!a', message, state, None, [])[0] == route
+
+
+def test_dispatch_calls_the_handler_and_records_timings(router):
+    router.dispatch('!a', 'hello', {'command': 'MAIL', 'step': 3}, None, [])
+    router.dispatch('!a', 'hello', {'command': 'MAIL', 'step': 1}, None, [])
+    router.dispatch('!a', 'r', {'command': 'ACTION', 'step': 2}, 'iface', [])
+    assert router.calls == [('mail any step', '!a', 'hello'), ('mail step 1', '!a', 'hello'), ('read', '!a', 'iface')]
+    timings = router.timings()
+    assert timings['MAIL:3'][0] == 1 and timings['menu:r'][0] == 1
+
+
+def test_known_command_at_a_step_without_input_is_a_no_op(router):
+    router.dispatch('!a', 'hello', {'command': 'DONE', 'step': 2}, None, [])
+    assert router.calls == []
+
+
+def test_application_routes(import_configured):
+    processing = import_configured('message_processing')
+    router = processing.router
+    assert router.resolve('!a', 'sm,,@abc,Subject,Body', None, None, [])[0] == 'quick:sm,,'
+    assert router.resolve('!a', 'cb,,general', None, None, [])[0] == 'quick:cb,,'
+    assert router.resolve('!a', 'chl', None, None, [])[0] == 'quick:chl'
+    assert router.resolve('!a', 'hello', None, None, [])[0] == 'help'
+    assert router.resolve('!a', '1', {'command': 'CHECK_MAIL', 'step': 2}, None, [])[0] == 'CHECK_MAIL:2'
+    assert router.resolve('!a', 'text', {'command': 'BULLETIN_POST_CONTENT', 'step': 5}, None, [])[0] == \
+        'BULLETIN_POST_CONTENT:5'
@@ -0,0 +1,75 @@
+import configparser
+
+import pytest
+
+import session_store
+from db_connection import get_connection_manager
+from db_migrations import migrate
+from session_store import Session, SessionStore
+
+
+def test_session_behaves_like_the_state_dict():
+    session = Session({'command': 'MAIL', 'step': 1, 'subject': 'Hi'})
+    session['content'] = 'Body'
+    assert session['command'] == 'MAIL'
+    assert session.get('board') is None
+    assert 'subject' in session and 'board' not in session
+    assert session.to_dict() == {'command': 'MAIL', 'step': 1, 'subject': 'Hi', 'content': 'Body'}
+    with pytest.raises(KeyError):
+        session['mail_rows'] = []
+    with pytest.raises(KeyError):
+        session['last_seen']
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_store.time, 'time', lambda: now[0])
+    return now
+
+
+def test_idle_sessions_expire(clock):
+    store = SessionStore(ttl=60)
+    store.set(1, {'command': 'MAIL', 'step': 1})
+    store.set(2, {'command': 'STATS', 'step': 1})
+    clock[0] += 40
+    assert store.get(1)['command'] == 'MAIL'
+    clock[0] += 30
+    store.expire()
+    assert store.get(2) is None
+    assert store.get(1) is not None
+    assert len(store) == 1
+
+
+def test_least_recently_used_session_is_evicted(clock):
+    store = SessionStore(max_sessions=2)
+    for user_id in (1, 2):
+        store.set(user_id, {'command': 'MAIL', 'step': user_id})
+    store.get(1)
+    store.set(3, {'command': 'MAIL', 'step': 3})
+    assert store.get(2) is None
+    assert store.get(1)['step'] == 1 and store.get(3)['step'] == 3
+    store.set(3, None)
+    assert store.get(3) is None
+
+
+def test_persisted_sessions_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'bulletins.db')
+    with get_connection_manager(path).connection() as conn:
+        migrate(conn)
+    config = configparser.ConfigParser()
+    config.read_dict({'sessions': {'persist': 'yes', 'ttl': '600'}})
+
+    store = SessionStore()
+    store.configure(config, db_path=path)
+    store.set(1, {'command': 'MAIL', 'step': 2, 'recipient_id': 42})
+    store.set(2, {'command': 'STATS', 'step': 1})
+    store.set(2, None)
+    store.close()
+
+    restarted = SessionStore()
+    restarted.configure(config, db_path=path)
+    assert restarted.get(1).to_dict() == {'command': 'MAIL', 'step': 2, 'recipient_id': 42}
+    assert restarted.get(2) is None
+    restarted.close()
+    get_connection_manager(path).close()
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+from meshtastic import BROADCAST_NUM
+
+import sync_fanout
+from sync_fanout import SyncFanout
+from sync_protocol import FRAME_ACK, FRAME_BROADCAST, decode_frame, encode_ack, encode_record, record_digest
+
+RECORD = ("CHANNEL", ("Name", "https://example.com"))
+PEERS = ['!00000002', '!00000003']
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    frames = []
+    monkeypatch.setattr(sync_fanout, 'send_frame',
+                        lambda destination, frame, interface, channel_index=0: frames.append((destination, frame)))
+    return frames
+
+
+def test_broadcast_opens_only_with_the_same_key(sent):
+    frame = encode_record(*RECORD)
+    SyncFanout(key='secret').broadcast(*RECORD, frame, PEERS, None)
+    destination, packet = sent[0]
+    assert destination == BROADCAST_NUM
+    frame_type, _, (tag, inner) = decode_frame(packet)
+    assert frame_type == FRAME_BROADCAST
+    assert SyncFanout(key='secret').open('!00000001', tag, inner) == frame
+    assert SyncFanout(key='other').open('!00000001', tag, inner) is None
+    assert SyncFanout().open('!00000001', tag, inner) is None
+
+
+def test_unacked_peer_gets_a_unicast_copy(sent):
+    fanout = SyncFanout(key='secret', ack_timeout=10)
+    frame = encode_record(*RECORD)
+    fanout.broadcast(*RECORD, frame, PEERS, None)
+    frame_type, _, digests = decode_frame(encode_ack([record_digest(*RECORD)]))
+    assert frame_type == FRAME_ACK
+    fanout.handle_ack(PEERS[0], digests)
+    sent.clear()
+
+    fanout.resend_overdue(None, now=time.monotonic())
+    assert sent == []
+    fanout.resend_overdue(None, now=time.monotonic() + 10)
+    assert sent == [(PEERS[1], frame)]
+    assert not fanout.pending
+
+
+def test_fully_acked_record_is_forgotten(sent):
+    fanout = SyncFanout(key='secret')
+    fanout.broadcast(*RECORD, encode_record(*RECORD), PEERS, None)
+    for peer in PEERS:
+        fanout.handle_ack(peer, [record_digest(*RECORD)])
+    assert not fanout.pending
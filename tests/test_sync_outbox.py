@@ -0,0 +1,89 @@
+import pytest
+
+from db_connection import get_connection_manager
+from db_migrations import migrate
+from sync_outbox import SyncOutbox, record_operation
+from sync_protocol import record_digest
+
+PEER = '!00000002'
+OTHER = '!00000003'
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'bulletins.db')
+    manager = get_connection_manager(path)
+    with manager.connection() as conn:
+        migrate(conn)
+    yield path
+    manager.close()
+
+
+def record(db_path, *operations):
+    with get_connection_manager(db_path).connection() as conn:
+        c = conn.cursor()
+        ids = [record_operation(c, kind, fields) for kind, fields in operations]
+        conn.commit()
+    return ids
+
+
+def send_batch(outbox, node_id, restart=False):
+    batch = outbox.next_batch(node_id, restart=restart)
+    for outbox_id, kind, fields in batch:
+        outbox.track(node_id, outbox_id, kind, fields)
+    return batch
+
+
+OPERATIONS = [("CHANNEL", (f"Chan{n}", f"https://example.com/{n}")) for n in range(5)]
+
+
+def test_cursor_resumes_after_restart(db_path):
+    outbox = SyncOutbox(db_path)
+    outbox.register_peers([PEER])
+    ids = record(db_path, *OPERATIONS[:3])
+
+    batch = send_batch(outbox, PEER, restart=True)
+    assert [outbox_id for outbox_id, _, _ in batch] == ids
+    outbox.handle_ack(PEER, [record_digest(kind, fields) for _, kind, fields in batch[:2]])
+
+    restarted = SyncOutbox(db_path)
+    restarted.register_peers([PEER])
+    assert restarted.cursors[PEER] == ids[1]
+    assert restarted.next_batch(PEER, restart=True) == [(ids[2], "CHANNEL", OPERATIONS[2][1])]
+
+
+def test_cursor_does_not_skip_a_gap(db_path):
+    outbox = SyncOutbox(db_path)
+    outbox.register_peers([PEER])
+    ids = record(db_path, *OPERATIONS[:3])
+    batch = send_batch(outbox, PEER, restart=True)
+
+    outbox.handle_ack(PEER, [record_digest(kind, fields) for _, kind, fields in batch[1:]])
+    assert outbox.cursors[PEER] == 0
+    assert outbox.handle_ack(PEER, [record_digest(*OPERATIONS[0])])
+    assert outbox.cursors[PEER] == ids[2]
+
+
+def test_replay_goes_out_in_batches(db_path):
+    outbox = SyncOutbox(db_path, batch_size=2)
+    outbox.register_peers([PEER])
+    ids = record(db_path, *OPERATIONS)
+
+    first = send_batch(outbox, PEER, restart=True)
+    assert [row[0] for row in first] == ids[:2]
+    assert outbox.handle_ack(PEER, [record_digest(kind, fields) for _, kind, fields in first])
+    assert [row[0] for row in send_batch(outbox, PEER)] == ids[2:4]
+
+
+def test_new_peers_start_at_the_end_and_prune_follows_the_slowest(db_path):
+    outbox = SyncOutbox(db_path)
+    outbox.register_peers([PEER])
+    ids = record(db_path, *OPERATIONS[:2])
+    outbox.register_peers([PEER, OTHER])
+    assert outbox.cursors == {PEER: 0, OTHER: ids[1]}
+    assert outbox.next_batch(OTHER, restart=True) == []
+
+    outbox.mark_sent(PEER, ids[0])
+    outbox.prune()
+    with get_connection_manager(db_path).connection() as conn:
+        assert [row[0] for row in conn.execute("SELECT id FROM sync_outbox")] == [ids[1]]
@@ -0,0 +1,54 @@
+import zlib
+
+import pytest
+
+from sync_protocol import (
+    FRAME_RECORD, MAX_RECORD_BYTES, RECORD_COMPRESSED, RECORD_TYPES, SyncProtocolError,
+    decode_frame, encode_record, format_text_record, parse_text_record
+)
+
+UNIQUE_ID = '9a3e4c1e-3f64-4c1a-9a2e-1234567890ab'
+
+RECORDS = [
+    ("BULLETIN", ("General", "AAA", "Subject", "Body with | a pipe", UNIQUE_ID)),
+    ("BULLETIN", ("General", "AAA", "Long", "x" * 500, UNIQUE_ID)),
+    ("MAIL", ("!00000001", "AAA", "!00000002", "Hi", "Hello 👋", UNIQUE_ID)),
+    ("MAIL", ("sender", "AAA", "recipient", "Hi", "Odd ids", "not-a-uuid")),
+    ("DELETE_BULLETIN", (UNIQUE_ID,)),
+    ("DELETE_MAIL", (UNIQUE_ID,)),
+    ("CHANNEL", ("Name", "https://example.com")),
+    ("TOMBSTONE", ("mail", UNIQUE_ID)),
+]
+
+
+@pytest.mark.parametrize("kind, fields", RECORDS)
+def test_record_round_trip(kind, fields):
+    frame_type, _, record = decode_frame(encode_record(kind, fields))
+    assert frame_type == FRAME_RECORD
+    assert record == (kind, fields)
+
+
+@pytest.mark.parametrize("kind, fields", RECORDS)
+def test_text_record_round_trip(kind, fields):
+    assert parse_text_record(format_text_record(kind, fields)) == (kind, fields)
+
+
+def record_frame(kind, body, flags=0):
+    return bytes([1, FRAME_RECORD, RECORD_TYPES[kind], flags]) + body
+
+
+@pytest.mark.parametrize("frame", [
+    b"",
+    b"\x01",
+    bytes([1, FRAME_RECORD, 99, 0]),
+    bytes([1, 99]),
+    bytes([1, 2, 5, 0, 2, 0xff, 0xfe, 1, 0x41]),
+    record_frame("CHANNEL", b"\x05abc"),
+    record_frame("MAIL", b"\x07"),
+    record_frame("CHANNEL", b"not zlib", RECORD_COMPRESSED),
+    record_frame("CHANNEL", zlib.compress(b"\x01a\x01b")[:-3], RECORD_COMPRESSED),
+    record_frame("CHANNEL", zlib.compress(b"\x00" * (MAX_RECORD_BYTES + 1)), RECORD_COMPRESSED),
+])
+def test_malformed_frames_raise_protocol_error(frame):
+    with pytest.raises(SyncProtocolError):
+        decode_frame(frame)
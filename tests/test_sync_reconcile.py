@@ -0,0 +1,74 @@
+import pytest
+
+import sync_reconcile
+from sync_protocol import FRAME_IDS, FRAME_WANT, decode_frame, encode_ids
+from sync_reconcile import DigestTree
+
+IDS = [f'00000000-0000-4000-8000-{n:012x}' for n in range(40)]
+
+
+def live(unique_ids):
+    return [(unique_id, False) for unique_id in unique_ids]
+
+
+def test_equal_sets_have_equal_digests():
+    ours = DigestTree(live(IDS))
+    theirs = DigestTree(live(reversed(IDS)))
+    assert ours.buckets(0, 0) == theirs.buckets(0, 0)
+
+
+def test_missing_id_changes_digest():
+    ours = DigestTree(live(IDS))
+    theirs = DigestTree(live(IDS[1:]))
+    assert ours.buckets(0, 0) != theirs.buckets(0, 0)
+
+
+def test_tombstone_changes_digest():
+    ours = DigestTree(live(IDS))
+    theirs = DigestTree(live(IDS[1:]) + [(IDS[0], True)])
+    differing = [(a, b) for a, b in zip(ours.buckets(0, 0), theirs.buckets(0, 0)) if a != b]
+    assert len(differing) == 1
+    (our_count, our_hash), (their_count, their_hash) = differing[0]
+    assert our_count == their_count
+    assert our_hash != their_hash
+
+
+def test_ids_frame_round_trip():
+    entries = [(IDS[0], False), (IDS[1], True)]
+    frame_type, _, value = decode_frame(encode_ids('mail', 1, 3, entries))
+    assert frame_type == FRAME_IDS
+    assert value == ('mail', 1, 3, entries)
+
+
+@pytest.fixture
+def reconcile(monkeypatch):
+    """Run handle_ids against a local tree, collecting pushed records and sent frames."""
+    sent = {'pushed': [], 'frames': []}
+
+    def run(ours, theirs):
+        monkeypatch.setattr(sync_reconcile, 'get_digest_tree', lambda table: DigestTree(ours))
+        monkeypatch.setattr(sync_reconcile, 'push_record',
+                            lambda node_id, table, unique_id, interface: sent['pushed'].append(unique_id))
+        monkeypatch.setattr(sync_reconcile, 'send_sync_frame',
+                            lambda node_id, frame, interface: sent['frames'].append(decode_frame(frame)))
+        sync_reconcile.handle_ids('!00000002', 'mail', 0, 0, theirs, None)
+        return sent
+    return run
+
+
+def test_live_peer_receives_tombstone(reconcile):
+    sent = reconcile([(IDS[0], True), (IDS[1], False)], [(IDS[0], False), (IDS[1], False)])
+    assert sent['pushed'] == [IDS[0]]
+    assert sent['frames'] == []
+
+
+def test_tombstone_is_requested_from_peer(reconcile):
+    sent = reconcile([(IDS[0], False)], [(IDS[0], True), (IDS[2], False)])
+    assert sent['pushed'] == []
+    assert sent['frames'] == [(FRAME_WANT, 1, ('mail', [IDS[0], IDS[2]]))]
+
+
+def test_matching_states_send_nothing(reconcile):
+    sent = reconcile([(IDS[0], True), (IDS[1], False)], [(IDS[0], True), (IDS[1], False)])
+    assert sent['pushed'] == []
+    assert sent['frames'] == []
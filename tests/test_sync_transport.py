@@ -0,0 +1,55 @@
+import os
+
+import sync_transport
+from sync_protocol import FRAME_FRAGMENT, decode_frame
+from sync_transport import Reassembler, SyncTransport
+
+SENDER = '!00000002'
+
+
+def fragments_of(transport, frame):
+    decoded = [decode_frame(packet) for packet in transport.fragment(SENDER, frame)]
+    assert all(frame_type == FRAME_FRAGMENT for frame_type, _, _ in decoded)
+    return [value for _, _, value in decoded]
+
+
+def test_missing_fragment_is_nacked_and_resent():
+    frame = os.urandom(1000)
+    sender_side, receiver_side = SyncTransport(), SyncTransport()
+    fragments = fragments_of(sender_side, frame)
+    assert len(fragments) > 2
+
+    for msg_id, seq, total, data in fragments:
+        if seq == 1:
+            continue
+        payload, missing = receiver_side.receive(SENDER, msg_id, seq, total, data)
+        assert payload is None
+    assert missing == [1]
+
+    msg_id = fragments[0][0]
+    resent = [decode_frame(packet)[2] for packet in sender_side.retransmit(SENDER, msg_id, missing)]
+    assert [value[1] for value in resent] == [1]
+    payload, missing = receiver_side.receive(SENDER, *resent[0])
+    assert payload == frame
+    assert missing is None
+
+
+def test_stalled_message_is_nacked_until_given_up():
+    reassembler = Reassembler(nack_after=10, max_nacks=2)
+    assert reassembler.add(SENDER, 7, 0, 3, b'a', now=0) == (None, None)
+    assert reassembler.sweep(now=5) == []
+    assert reassembler.sweep(now=10) == [(SENDER, 7, [1, 2])]
+    assert reassembler.sweep(now=20) == [(SENDER, 7, [1, 2])]
+    assert reassembler.sweep(now=30) == []
+    assert not reassembler.buffers
+    assert reassembler.size == 0
+
+
+def test_send_due_nacks(monkeypatch):
+    sent = []
+    monkeypatch.setattr(sync_transport, 'send_nack',
+                        lambda node_id, msg_id, missing, interface: sent.append((node_id, msg_id, missing)))
+    transport = SyncTransport(reassembler=Reassembler(nack_after=0))
+    transport.receive(SENDER, 3, 1, 2, b'b')
+    transport.send_due_nacks(None)
+    assert sent == [(SENDER, 3, [0])]
@@ -0,0 +1,84 @@
+import pytest
+
+from db_connection import get_connection_manager
+from db_migrations import migrate
+from telemetry_store import TelemetryHistory
+
+
+class FakeInterface:
+    def __init__(self, nodes=None):
+        self.nodes = nodes or {}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'bulletins.db')
+    manager = get_connection_manager(path)
+    with manager.connection() as conn:
+        migrate(conn)
+    yield path
+    manager.close()
+
+
+def history(db_path, interface=None, **kwargs):
+    return TelemetryHistory(interface or FakeInterface(), db_path=db_path, interval=100, **kwargs)
+
+
+def test_readings_are_bucketed_and_ring_bounded(db_path):
+    store = history(db_path, samples=3)
+    for timestamp, level in [(0, 90), (50, 80), (150, 70), (250, 60), (350, 50), (120, 99)]:
+        store.record('!a', {'batteryLevel': level}, timestamp)
+    assert [(sample.bucket, sample.battery_level) for sample in store.node_history('!a')] == \
+        [(100, 70), (200, 60), (300, 50)]
+    store.close()
+
+
+def test_low_battery_index_follows_the_latest_level(db_path):
+    store = history(db_path)
+    store.record('!a', {'batteryLevel': 15}, 0)
+    store.record('!b', {'batteryLevel': 5}, 0)
+    store.record('!c', {'batteryLevel': 80}, 0)
+    assert store.low_battery(20) == [(5, '!b'), (15, '!a')]
+    store.record('!a', {'batteryLevel': 60}, 100)
+    store.record('!c', {'voltage': 3.1}, 100)
+    assert store.low_battery(20) == [(5, '!b')]
+    assert store.low_battery(101) == [(5, '!b'), (60, '!a'), (80, '!c')]
+    store.close()
+
+
+def test_least_recently_heard_node_is_evicted(db_path):
+    store = history(db_path, max_nodes=2)
+    store.record('!a', {'batteryLevel': 10}, 0)
+    store.record('!b', {'batteryLevel': 20}, 0)
+    store.record('!a', {'batteryLevel': 11}, 100)
+    store.record('!c', {'batteryLevel': 30}, 100)
+    assert list(store.history) == ['!a', '!c']
+    assert store.low_battery(100) == [(11, '!a'), (30, '!c')]
+    store.close()
+
+
+def test_history_is_persisted_and_reloaded(db_path):
+    store = history(db_path)
+    store.record('!a', {'batteryLevel': 40, 'voltage': 3.7, 'channelUtilization': 12.5}, 0)
+    store.record('!a', {'batteryLevel': 35}, 100)
+    store.close()
+
+    interface = FakeInterface({'!b': {'deviceMetrics': {'batteryLevel': 3}, 'lastHeard': 100}})
+    reloaded = history(db_path, interface)
+    reloaded.load()
+    assert [sample.battery_level for sample in reloaded.node_history('!a')] == [40, 35]
+    assert reloaded.node_history('!a')[0].voltage == 3.7
+    assert reloaded.low_battery(50) == [(3, '!b'), (35, '!a')]
+    reloaded.close()
+
+
+def test_telemetry_packets_from_other_interfaces_are_ignored(db_path):
+    interface = FakeInterface()
+    store = history(db_path, interface)
+    packet = {'fromId': '!a', 'rxTime': 0, 'decoded': {'telemetry': {'deviceMetrics': {'batteryLevel': 7}}}}
+    store.on_telemetry(packet, object())
+    store.on_telemetry({'fromId': '!a', 'decoded': {}}, interface)
+    assert store.low_battery(100) == []
+    store.on_telemetry(packet, interface)
+    assert store.low_battery(100) == [(7, '!a')]
+    store.close()
@@ -0,0 +1,131 @@
+from types import SimpleNamespace
+
+from transmit import ChannelThrottle, TransmitScheduler
+
+
+class FakeInterface:
+    def __init__(self):
+        self.sent = []
+        self.nodes = {}
+
+    def sendText(self, text, destinationId, wantAck, wantResponse):
+        self.sent.append((destinationId, text))
+        return SimpleNamespace(id=len(self.sent))
+
+    def sendData(self, payload, destinationId, portNum, wantAck, wantResponse, channelIndex):
+        self.sent.append((destinationId, payload, portNum, channelIndex))
+        return SimpleNamespace(id=len(self.sent))
+
+
+def scheduler(interface):
+    return TransmitScheduler(interface, ChannelThrottle(interface, base_pace=0, refresh_interval=0))
+
+
+def test_destinations_are_served_round_robin():
+    interface = FakeInterface()
+    tx = scheduler(interface)
+    tx.enqueue('!a', ['a1', 'a2', 'a3'])
+    tx.enqueue('!b', ['b1'])
+    tx.enqueue('!c', ['c1', 'c2'])
+    tx.start()
+    assert tx.flush(timeout=5)
+    tx.stop()
+    assert [text for _, text in interface.sent] == ['a1', 'b1', 'c1', 'a2', 'c2', 'a3']
+
+
+def test_replies_go_before_bulk_and_binary_chunks_keep_their_port():
+    interface = FakeInterface()
+    tx = scheduler(interface)
+    tx.enqueue('!peer', [(b'frame', 256, 1)], bulk=True)
+    tx.enqueue('!user', ['reply'])
+    assert tx.pending() == 2
+    tx.start()
+    assert tx.flush(timeout=5)
+    tx.stop()
+    assert interface.sent == [('!user', 'reply'), ('!peer', b'frame', 256, 1)]
+
+
+def test_failed_send_does_not_stop_the_worker():
+    interface = FakeInterface()
+    calls = []
+
+    def flaky(**kwargs):
+        calls.append(kwargs['text'])
+        if len(calls) == 1:
+            raise OSError("radio busy")
+        return SimpleNamespace(id=len(calls))
+    interface.sendText = flaky
+    tx = scheduler(interface)
+    tx.enqueue('!a', ['one', 'two'])
+    tx.start()
+    assert tx.flush(timeout=5)
+    tx.stop()
+    assert calls == ['one', 'two']
+
+
+class MetricsInterface(FakeInterface):
+    def __init__(self, channel_utilization=None, air_util_tx=None):
+        super().__init__()
+        self.myInfo = SimpleNamespace(my_node_num=1)
+        self.set(channel_utilization, air_util_tx)
+
+    def set(self, channel_utilization, air_util_tx=None):
+        metrics = {}
+        if channel_utilization is not None:
+            metrics['channelUtilization'] = channel_utilization
+        if air_util_tx is not None:
+            metrics['airUtilTx'] = air_util_tx
+        self.nodes = {'!00000001': {'deviceMetrics': metrics}}
+
+
+def throttle_for(channel_utilization, air_util_tx=None):
+    throttle = ChannelThrottle(MetricsInterface(channel_utilization, air_util_tx))
+    throttle.refresh(force=True)
+    return throttle
+
+
+def test_pace_follows_channel_utilization():
+    assert (throttle_for(None).level, throttle_for(None).pace) == ('normal', 2.0)
+    assert (throttle_for(5).level, throttle_for(5).pace) == ('idle', 1.0)
+    assert (throttle_for(15).level, throttle_for(15).pace) == ('normal', 2.0)
+    assert throttle_for(25).level == 'busy'
+    assert throttle_for(25).pace < throttle_for(35).pace < 8.0
+    congested = throttle_for(45)
+    assert (congested.level, congested.pace, congested.defer_bulk()) == ('congested', 8.0, True)
+
+
+def test_airtime_alone_makes_the_channel_busy():
+    throttle = throttle_for(5, air_util_tx=9)
+    assert throttle.level == 'busy'
+    assert throttle.pace == 5.0
+    assert not throttle.defer_bulk()
+
+
+def test_metrics_are_read_once_per_refresh_interval():
+    interface = MetricsInterface(5)
+    throttle = ChannelThrottle(interface, refresh_interval=60)
+    throttle.refresh()
+    interface.set(45)
+    throttle.refresh()
+    assert throttle.level == 'idle'
+    throttle.refresh(force=True)
+    assert throttle.level == 'congested'
+
+
+def test_congestion_defers_bulk_but_not_replies():
+    interface = MetricsInterface(45)
+    tx = TransmitScheduler(interface, ChannelThrottle(interface, min_pace=0, base_pace=0, max_pace=0,
+                                                      refresh_interval=0))
+    tx.enqueue('!peer', [(b'frame', 256)], bulk=True)
+    tx.enqueue('!user', ['reply'])
+    tx.start()
+    assert not tx.flush(timeout=0.2)
+    assert interface.sent == [('!user', 'reply')]
+    assert tx.throttle_state()['pending_bulk'] == 1
+
+    interface.set(5)
+    with tx.condition:
+        tx.condition.notify_all()
+    assert tx.flush(timeout=5)
+    tx.stop()
+    assert interface.sent[-1] == ('!peer', b'frame', 256, 0)
@@ -0,0 +1,66 @@
+import threading
+
+from worker_pool import OrderedWorkerPool
+
+
+def test_tasks_run_in_order_per_key():
+    pool = OrderedWorkerPool(workers=4, max_pending=1000, max_per_key=1000)
+    pool.start()
+    done = threading.Event()
+    seen = {key: [] for key in range(5)}
+    remaining = [5 * 50]
+    lock = threading.Lock()
+
+    def task(key, n):
+        def run():
+            seen[key].append(n)
+            with lock:
+                remaining[0] -= 1
+                if not remaining[0]:
+                    done.set()
+        return run
+
+    for n in range(50):
+        for key in seen:
+            assert pool.submit(key, task(key, n))
+    assert done.wait(5)
+    pool.stop()
+    assert all(values == list(range(50)) for values in seen.values())
+
+
+def test_busy_sender_is_shed():
+    pool = OrderedWorkerPool(workers=1, max_pending=10, max_per_key=2)
+    pool.start()
+    release = threading.Event()
+    started = threading.Event()
+    shed = []
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    assert pool.submit('a', block)
+    assert started.wait(5)
+    assert pool.submit('a', lambda: None)
+    assert pool.submit('a', lambda: None)
+    assert not pool.submit('a', lambda: None, on_shed=lambda: shed.append('a'))
+    assert pool.submit('b', lambda: None)
+    assert shed == ['a']
+    assert pool.stats()['shed'] == 1
+    release.set()
+    pool.stop()
+
+
+def test_pool_is_bounded_across_senders():
+    pool = OrderedWorkerPool(workers=1, max_pending=2, max_per_key=10)
+    assert not pool.submit('a', lambda: None)
+    pool.start()
+    release = threading.Event()
+    started = threading.Event()
+    pool.submit('a', lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)
+    assert pool.submit('b', lambda: None)
+    assert pool.submit('c', lambda: None)
+    assert not pool.submit('d', lambda: None)
+    release.set()
+    pool.stop()
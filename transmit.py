@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+scheduler_lock = threading.Lock()
+
+
+def get_local_device_metrics(interface):
+    my_info = getattr(interface, 'myInfo', None)
+    if my_info is None:
+        return {}
+    node = interface.nodes.get(f"!{my_info.my_node_num:08x}")
+    if not node:
+        return {}
+    return node.get('deviceMetrics', {})
+
+
+class ChannelThrottle:
+    """Derives the transmit pace from the local node's channel metrics.
+
+    `channelUtilization` and `airUtilTx` are read from the local node's
+    `deviceMetrics` at most once every `refresh_interval` seconds. Below half
+    of the busy thresholds the channel is considered idle and packets go out
+    at `min_pace`; above them the pace stretches linearly towards `max_pace`,
+    and past `congested_threshold` bulk traffic is deferred entirely.
+    """
+
+    def __init__(self, interface, base_pace=2.0, min_pace=1.0, max_pace=8.0, busy_threshold=25.0,
+                 congested_threshold=40.0, airtime_threshold=8.0, refresh_interval=30.0):
+        self.interface = interface
+        self.base_pace = base_pace
+        self.min_pace = min_pace
+        self.max_pace = max_pace
+        self.busy_threshold = busy_threshold
+        self.congested_threshold = congested_threshold
+        self.airtime_threshold = airtime_threshold
+        self.refresh_interval = refresh_interval
+
+        self.channel_utilization = None
+        self.air_util_tx = None
+        self.level = 'normal'
+        self.pace = base_pace
+        self.last_refresh = None
+
+    @classmethod
+    def from_config(cls, interface, config):
+        section = 'transmit'
+        return cls(
+            interface,
+            base_pace=config.getfloat(section, 'pace', fallback=2.0),
+            min_pace=config.getfloat(section, 'min_pace', fallback=1.0),
+            max_pace=config.getfloat(section, 'max_pace', fallback=8.0),
+            busy_threshold=config.getfloat(section, 'busy_threshold', fallback=25.0),
+            congested_threshold=config.getfloat(section, 'congested_threshold', fallback=40.0),
+            airtime_threshold=config.getfloat(section, 'airtime_threshold', fallback=8.0),
+            refresh_interval=config.getfloat(section, 'refresh_interval', fallback=30.0)
+        )
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self.last_refresh is not None and now - self.last_refresh < self.refresh_interval:
+            return
+        self.last_refresh = now
+
+        try:
+            metrics = get_local_device_metrics(self.interface)
+        except Exception as e:
+            logging.error(f"Unable to read local device metrics: {e}")
+            metrics = {}
+        self.channel_utilization = metrics.get('channelUtilization')
+        self.air_util_tx = metrics.get('airUtilTx')
+
+        level, pace = self._evaluate()
+        if level != self.level:
+            logging.info(f"TX THROTTLE {self.level} -> {level} (channelUtilization={self.channel_utilization}, "
+                         f"airUtilTx={self.air_util_tx}, pace={pace:.1f}s)")
+        self.level = level
+        self.pace = pace
+
+    def _evaluate(self):
+        if self.channel_utilization is None and self.air_util_tx is None:
+            return 'normal', self.base_pace
+
+        channel_utilization = self.channel_utilization or 0.0
+        air_util_tx = self.air_util_tx or 0.0
+
+        if channel_utilization >= self.congested_threshold:
+            return 'congested', self.max_pace
+
+        # The busier of the two metrics, as a fraction of its threshold, drives the pace.
+        load = max(channel_utilization / self.busy_threshold, air_util_tx / self.airtime_threshold)
+        if load >= 1.0:
+            span = max(self.congested_threshold - self.busy_threshold, 1.0)
+            fraction = min(max(channel_utilization - self.busy_threshold, 0.0) / span, 1.0)
+            if air_util_tx >= self.airtime_threshold:
+                fraction = max(fraction, 0.5)
+            return 'busy', self.base_pace + (self.max_pace - self.base_pace) * fraction
+        if load < 0.5:
+            return 'idle', self.min_pace
+        return 'normal', self.base_pace
+
+    def defer_bulk(self):
+        return self.level == 'congested'
+
+    def state(self):
+        return {
+            'level': self.level,
+            'pace': self.pace,
+            'channel_utilization': self.channel_utilization,
+            'air_util_tx': self.air_util_tx,
+            'bulk_deferred': self.defer_bulk()
+        }
+
+
+class TransmitScheduler:
+    """Paces outbound packets from a single background worker.
+
+    Every destination gets its own FIFO queue and the worker serves the queues
+    round-robin, one packet at a time, so a long reply to one node never holds
+    up short replies to others. Callers enqueue and return immediately.
+
+    Interactive replies and bulk traffic (BBS sync) are queued separately;
+    bulk packets only go out when no reply is waiting and the throttle does
+    not consider the channel congested.
+
+    Started with an EventLoopCore, the worker is a task on the event loop
+    that paces with asyncio sleeps and hands each write to the core's
+    executor, instead of a thread of its own.
+    """
+
+    def __init__(self, interface, throttle=None):
+        self.interface = interface
+        self.throttle = throttle or ChannelThrottle(interface)
+        self.queues = OrderedDict()
+        self.bulk_queues = OrderedDict()
+        self.condition = threading.Condition()
+        self.running = False
+        self.sending = False
+        self.thread = None
+        self.core = None
+        self.wakeup = asyncio.Event()
+
+    def start(self, core=None):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        if core is not None:
+            self.core = core
+            core.spawn(self._run_async(), name='tx-scheduler')
+            return
+        self.thread = threading.Thread(target=self._run, name='tx-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self._wake()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def _wake(self):
+        if self.core is not None and not self.core.loop.is_closed():
+            self.core.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def flush(self, timeout=None):
+        """Block until every queued packet has been handed to the radio."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self._busy() and self.running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return not self._busy()
+
+    def enqueue(self, destination, chunks, bulk=False):
+        """Queue text packets, or (payload, portnum[, channel_index]) tuples for binary packets."""
+        queues = self.bulk_queues if bulk else self.queues
+        with self.condition:
+            queue = queues.get(destination)
+            if queue is None:
+                queue = queues[destination] = deque()
+            queue.extend(chunks)
+            self.condition.notify_all()
+        self._wake()
+
+    def pending(self):
+        with self.condition:
+            return sum(len(queue) for queue in self.queues.values()) + \
+                sum(len(queue) for queue in self.bulk_queues.values())
+
+    def throttle_state(self):
+        with self.condition:
+            state = self.throttle.state()
+            state['pending'] = sum(len(queue) for queue in self.queues.values())
+            state['pending_bulk'] = sum(len(queue) for queue in self.bulk_queues.values())
+        return state
+
+    def _busy(self):
+        return bool(self.queues or self.bulk_queues or self.sending)
+
+    def _ready_queues(self):
+        if self.queues:
+            return self.queues
+        if self.bulk_queues:
+            self.throttle.refresh()
+            if not self.throttle.defer_bulk():
+                return self.bulk_queues
+        return None
+
+    @staticmethod
+    def _next_packet(queues):
+        # Pop from the head queue, then rotate that destination to the back.
+        destination, queue = queues.popitem(last=False)
+        chunk = queue.popleft()
+        if queue:
+            queues[destination] = queue
+        return destination, chunk
+
+    def _run(self):
+        while True:
+            with self.condition:
+                queues = self._ready_queues()
+                while self.running and queues is None:
+                    # Deferred bulk traffic is re-checked once the metrics are due for a refresh.
+                    self.condition.wait(self.throttle.refresh_interval if self.bulk_queues else None)
+                    queues = self._ready_queues()
+                if not self.running:
+                    return
+                destination, chunk = self._next_packet(queues)
+                self.sending = True
+
+            self._transmit(destination, chunk)
+
+            with self.condition:
+                self.sending = False
+                self.throttle.refresh()
+                pace = self.throttle.pace
+                self.condition.notify_all()
+                if self.running:
+                    self.condition.wait_for(lambda: not self.running, pace)
+
+    async def _run_async(self):
+        while True:
+            self.wakeup.clear()
+            with self.condition:
+                if not self.running:
+                    return
+                queues = self._ready_queues()
+                if queues is None:
+                    timeout = self.throttle.refresh_interval if self.bulk_queues else None
+                else:
+                    destination, chunk = self._next_packet(queues)
+                    self.sending = True
+
+            if queues is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.core.run_blocking(self._transmit, destination, chunk)
+            finally:
+                with self.condition:
+                    self.sending = False
+                    self.throttle.refresh()
+                    pace = self.throttle.pace
+                    self.condition.notify_all()
+            await asyncio.sleep(pace)
+
+    def _transmit(self, destination, chunk):
+        try:
+            if isinstance(chunk, tuple):
+                payload, port_num = chunk[:2]
+                d = self.interface.sendData(
+                    payload,
+                    destinationId=destination,
+                    portNum=port_num,
+                    wantAck=False,
+                    wantResponse=False,
+                    channelIndex=chunk[2] if len(chunk) > 2 else 0
+                )
+                logging.info(f"DATA SEND ID={d.id} PORT={port_num} BYTES={len(payload)}")
+            else:
+                d = self.interface.sendText(
+                    text=chunk,
+                    destinationId=destination,
+                    wantAck=False,
+                    wantResponse=False
+                )
+                logging.info(f"REPLY SEND ID={d.id}")
+        except Exception as e:
+            logging.info(f"REPLY SEND ERROR {e}")
+
+
+def get_transmit_scheduler(interface, config=None, core=None):
+    scheduler = getattr(interface, 'tx_scheduler', None)
+    if scheduler is None:
+        with scheduler_lock:
+            scheduler = getattr(interface, 'tx_scheduler', None)
+            if scheduler is None:
+                throttle = ChannelThrottle.from_config(interface, config) if config is not None else None
+                scheduler = TransmitScheduler(interface, throttle)
+                scheduler.start(core)
+                interface.tx_scheduler = scheduler
+    return scheduler
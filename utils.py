@@ -1,85 +1,179 @@
 import logging
-import time
+import threading
+from collections import OrderedDict
 
-user_states = {}
+from node_directory import get_node_directory
+from packing import pack_message
+from session_store import user_sessions
+from sync_protocol import encode_hello, encode_record, format_text_record, sync_peers
+from sync_fanout import sync_fanout
+from sync_outbox import sync_outbox
+from sync_transport import send_frame
+from transmit import get_transmit_scheduler
 
 
 def update_user_state(user_id, state):
-    user_states[user_id] = state
+    user_sessions.set(user_id, state)
 
 
 def get_user_state(user_id):
-    return user_states.get(user_id, None)
+    return user_sessions.get(user_id)
 
 
-def send_message(message, destination, interface):
-    max_payload_size = 200
-    for i in range(0, len(message), max_payload_size):
-        chunk = message[i:i + max_payload_size]
-        try:
-            d = interface.sendText(
-                text=chunk,
-                destinationId=destination,
-                wantAck=False,
-                wantResponse=False
-            )
-            logging.info(f"REPLY SEND ID={d.id}")
-        except Exception as e:
-            logging.info(f"REPLY SEND ERROR {e.message}")
+def send_message(message, destination, interface, bulk=False):
+    packets = pack_message(message)
+    logging.info(f"REPLY QUEUED {len(packets)} packet(s) for {destination}")
+    get_transmit_scheduler(interface).enqueue(destination, packets, bulk=bulk)
 
-        
-        time.sleep(2)
+
+class ReplyBuilder:
+    """Collects the lines of a reply and sends them as the fewest packets possible."""
+
+    def __init__(self, destination, interface):
+        self.destination = destination
+        self.interface = interface
+        self.lines = []
+
+    def add(self, line):
+        self.lines.append(line)
+
+    def extend(self, lines):
+        self.lines.extend(lines)
+
+    def flush(self):
+        if self.lines:
+            send_message("\n".join(self.lines), self.destination, self.interface)
+            self.lines = []
+
+
+class RecentIdCache:
+    """Bounded LRU set of recently seen keys, counting how many repeats it caught."""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.keys = OrderedDict()
+        self.lock = threading.Lock()
+        self.duplicates_suppressed = 0
+
+    def check_and_add(self, key):
+        """Remember `key` and return True if it had already been seen."""
+        with self.lock:
+            if key in self.keys:
+                self.keys.move_to_end(key)
+                self.duplicates_suppressed += 1
+                return True
+            self.keys[key] = None
+            if len(self.keys) > self.capacity:
+                self.keys.popitem(last=False)
+            return False
+
+    def discard(self, key):
+        """Forget `key`, so its next copy is processed again."""
+        with self.lock:
+            self.keys.pop(key, None)
+
+    def count_duplicate(self):
+        with self.lock:
+            self.duplicates_suppressed += 1
 
 
 def get_node_info(interface, short_name):
-    nodes = [{'num': node_id, 'shortName': node['user']['shortName'], 'longName': node['user']['longName']}
-             for node_id, node in interface.nodes.items()
-             if node['user']['shortName'].lower() == short_name]
-    return nodes
+    return [{'num': node_id, 'shortName': node['user']['shortName'], 'longName': node['user']['longName']}
+            for node_id, node in get_node_directory(interface).find_short_name(short_name)]
 
 
 def get_node_id_from_num(node_num, interface):
-    for node_id, node in interface.nodes.items():
-        if node['num'] == node_num:
-            return node_id
-    return None
+    return get_node_directory(interface).id_from_num(node_num)
 
 
 def get_node_short_name(node_id, interface):
-    node_info = interface.nodes.get(node_id)
-    if node_info:
+    node_info = get_node_directory(interface).get(node_id)
+    if node_info and 'user' in node_info:
         return node_info['user']['shortName']
     return None
 
 
-def send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface):
-    message = f"BULLETIN|{board}|{sender_short_name}|{subject}|{content}|{unique_id}"
+def send_sync_record(kind, fields, bbs_nodes, interface, outbox_id=None):
+    """Replicate one record to every peer, in binary where the peer has negotiated it.
+
+    Text-only peers get the pipe-delimited record split across as many text
+    packets as it takes, which they cannot reassemble; binary peers get it
+    fragmented by the sync transport. With a shared sync key configured,
+    binary peers get a single broadcast instead of one copy each.
+
+    `outbox_id` ties the record to its sync outbox entry, so each peer's
+    delivery cursor can follow it.
+    """
+    fields = tuple(str(value) for value in fields)
+    binary_peers = [node_id for node_id in bbs_nodes if sync_peers.supports_binary(node_id)]
+    if binary_peers:
+        frame = encode_record(kind, fields)
+        if sync_fanout.enabled(binary_peers):
+            sync_fanout.broadcast(kind, fields, frame, binary_peers, interface)
+        else:
+            for node_id in binary_peers:
+                send_sync_frame(node_id, frame, interface)
+        if outbox_id is not None:
+            for node_id in binary_peers:
+                sync_outbox.track(node_id, outbox_id, kind, fields)
+
+    text = None
     for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+        if node_id in binary_peers:
+            continue
+        if text is None:
+            text = format_text_record(kind, fields)
+        send_message(text, node_id, interface, bulk=True)
+        if outbox_id is not None:
+            sync_outbox.mark_sent(node_id, outbox_id)
+
+
+def replay_outbox(node_id, interface, restart=False):
+    """Send a peer the outbox operations after its cursor.
+
+    Binary peers get one batch now and the next once it has been ACKed;
+    text-only peers cannot ACK, so they get every batch straight away.
+    """
+    batch = sync_outbox.next_batch(node_id, restart)
+    if batch and restart:
+        logging.info(f"SERVER SYNC: Replaying sync outbox to {node_id} from operation {batch[0][0]}")
+    while batch:
+        for outbox_id, kind, fields in batch:
+            send_sync_record(kind, fields, [node_id], interface, outbox_id)
+        if sync_peers.supports_binary(node_id):
+            return
+        batch = sync_outbox.next_batch(node_id)
+
+
+def send_sync_frame(node_id, frame, interface):
+    send_frame(node_id, frame, interface)
+
+
+def send_sync_hello(node_id, interface, reply_requested=False):
+    send_sync_frame(node_id, encode_hello(reply_requested), interface)
+
+
+def send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface,
+                               outbox_id=None):
+    send_sync_record("BULLETIN", (board, sender_short_name, subject, content, unique_id), bbs_nodes, interface,
+                     outbox_id)
 
 
 def send_mail_to_bbs_nodes(sender_id, sender_short_name, recipient_id, subject, content, unique_id, bbs_nodes,
-                           interface):
-    message = f"MAIL|{sender_id}|{sender_short_name}|{recipient_id}|{subject}|{content}|{unique_id}"
+                           interface, outbox_id=None):
     logging.info(f"SERVER SYNC: Syncing new mail message {subject} sent from {sender_short_name} to other BBS systems.")
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    send_sync_record("MAIL", (sender_id, sender_short_name, recipient_id, subject, content, unique_id), bbs_nodes,
+                     interface, outbox_id)
 
 
-def send_delete_bulletin_to_bbs_nodes(bulletin_id, bbs_nodes, interface):
-    message = f"DELETE_BULLETIN|{bulletin_id}"
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+def send_delete_bulletin_to_bbs_nodes(unique_id, bbs_nodes, interface, outbox_id=None):
+    send_sync_record("DELETE_BULLETIN", (unique_id,), bbs_nodes, interface, outbox_id)
 
 
-def send_delete_mail_to_bbs_nodes(unique_id, bbs_nodes, interface):
-    message = f"DELETE_MAIL|{unique_id}"
+def send_delete_mail_to_bbs_nodes(unique_id, bbs_nodes, interface, outbox_id=None):
     logging.info(f"SERVER SYNC: Sending delete mail sync message with unique_id: {unique_id}")
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    send_sync_record("DELETE_MAIL", (unique_id,), bbs_nodes, interface, outbox_id)
 
 
-def send_channel_to_bbs_nodes(name, url, bbs_nodes, interface):
-    message = f"CHANNEL|{name}|{url}"
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+def send_channel_to_bbs_nodes(name, url, bbs_nodes, interface, outbox_id=None):
+    send_sync_record("CHANNEL", (name, url), bbs_nodes, interface, outbox_id)
@@ -0,0 +1,125 @@
+import logging
+import threading
+from collections import deque
+
+pool_lock = threading.Lock()
+
+
+class OrderedWorkerPool:
+    """Runs inbound work on a fixed set of threads, in order per key and in parallel across keys.
+
+    Each key (the sending node) has its own queue and is handled by at most
+    one worker at a time, so a user's messages reach the menu state machine
+    in the order they arrived. A worker runs one task for a key and then puts
+    the key at the back of the ready list, so a busy sender cannot starve
+    the others.
+
+    Work is shed rather than queued without bound: a task is refused once
+    its key has `max_per_key` tasks waiting or the pool has `max_pending`,
+    and its `on_shed` callback (if any) is called instead.
+    """
+
+    def __init__(self, workers=4, max_pending=200, max_per_key=10):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_key = max_per_key
+        self.queues = {}
+        self.ready = deque()
+        self.active = set()
+        self.pending = 0
+        self.shed = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.threads = []
+
+    @classmethod
+    def from_config(cls, config):
+        section = 'workers'
+        return cls(
+            workers=config.getint(section, 'threads', fallback=4),
+            max_pending=config.getint(section, 'max_pending', fallback=200),
+            max_per_key=config.getint(section, 'max_per_sender', fallback=10)
+        )
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.threads = [threading.Thread(target=self._run, name=f'worker-{i}', daemon=True)
+                        for i in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Stop taking work and wait for the tasks already running; queued tasks are dropped."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def submit(self, key, task, on_shed=None):
+        """Queue `task()` behind earlier tasks for `key`. Returns False if it was shed."""
+        with self.condition:
+            queue = self.queues.get(key)
+            if not self.running or self.pending >= self.max_pending or (queue and len(queue) >= self.max_per_key):
+                self.shed += 1
+                accepted = False
+            else:
+                if queue is None:
+                    queue = self.queues[key] = deque()
+                    if key not in self.active:
+                        self.ready.append(key)
+                queue.append(task)
+                self.pending += 1
+                self.condition.notify()
+                accepted = True
+        if not accepted:
+            logging.warning(f"Worker pool busy, shedding a task from {key}")
+            if on_shed is not None:
+                on_shed()
+        return accepted
+
+    def stats(self):
+        with self.condition:
+            return {'pending': self.pending, 'active': len(self.active), 'senders': len(self.queues),
+                    'shed': self.shed}
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.ready:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                key = self.ready.popleft()
+                queue = self.queues[key]
+                task = queue.popleft()
+                if not queue:
+                    del self.queues[key]
+                self.pending -= 1
+                self.active.add(key)
+
+            try:
+                task()
+            except Exception as e:
+                logging.error(f"Error processing message from {key}: {e}")
+
+            with self.condition:
+                self.active.discard(key)
+                if key in self.queues:
+                    self.ready.append(key)
+                    self.condition.notify()
+
+
+def get_worker_pool(interface, config=None):
+    pool = getattr(interface, 'worker_pool', None)
+    if pool is None:
+        with pool_lock:
+            pool = getattr(interface, 'worker_pool', None)
+            if pool is None:
+                pool = OrderedWorkerPool.from_config(config) if config is not None else OrderedWorkerPool()
+                pool.start()
+                interface.worker_pool = pool
+    return pool